@@ -1,8 +1,15 @@
 import streamlit as st
-from services.speech_service import SpeechService
-from services.translation_service import TranslationService
+import os
+import time
+from components import streamlit_adapter
 from components.audio_input import AudioInput
+from components.conversacion_en_vivo import ConversacionNavegador
 from components.history_manager import HistoryManager
+from components.language_selector import LanguageSelector
+from services.job_queue import ColaTrabajos, iniciar_workers, SUBIENDO, PENDIENTE, EN_PROCESO
+from services.paquete import crear_paquete_zip
+from utils.audio import normalizar_en_segundo_plano, tipo_audio
+from utils.metrics import servir_metricas
 
 # Configuración de la página
 st.set_page_config(
@@ -11,22 +18,37 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def iniciar_servidor_metricas():
+    """Expone /metrics y /metrics.json si METRICS_PORT está definido (en METRICS_HOST)"""
+    puerto = os.environ.get("METRICS_PORT")
+    return servir_metricas(int(puerto)) if puerto else None
+
 def main():
+    iniciar_servidor_metricas()
     st.title("🎙️ Traductor Multilingüe con Voz")
     st.markdown("**Voz → Texto → Traducción → Voz**")
     st.markdown("---")
     
-    # Inicializar servicios
-    speech_service = SpeechService()
-    translation_service = TranslationService()
+    # Inicializar servicios (una instancia por proceso, claves desde entorno o st.secrets)
+    speech_service, translation_service = streamlit_adapter.obtener_servicios()
     history_manager = HistoryManager()
     
     # Configuración de idiomas
     col1, col2 = st.columns(2)
     with col1:
-        config_origen = translation_service.configurar_idioma_origen()
+        config_origen = LanguageSelector.configurar_idioma_origen()
     with col2:
-        config_destino = translation_service.configurar_idioma_destino()
+        config_destino = LanguageSelector.configurar_idioma_destino(translation_service)
+    
+    # Conversación en vivo (ampliación): micrófono continuo, una traducción por frase
+    if ConversacionNavegador.disponible() and st.toggle(
+        "🗣️ Conversación en vivo",
+        help="Traduce y reproduce cada frase en cuanto haces una pausa, sin pulsar ningún botón"
+    ):
+        ConversacionNavegador.mostrar(config_origen, config_destino)
+        history_manager.mostrar_historial()
+        return
     
     # Entrada de audio
     st.subheader("🎤 Entrada de Audio")
@@ -34,16 +56,120 @@ def main():
     
     # Procesamiento principal
     if audio_bytes:
-        procesar_traduccion(
-            audio_bytes, audio_nombre,
-            config_origen, config_destino,
-            speech_service, translation_service,
-            history_manager
+        preproceso = preprocesar_audio(audio_bytes)
+        if not preproceso.done():
+            # La sesión no se bloquea mientras el pool normaliza: se sondea como los trabajos
+            st.info("⏳ Preparando audio...")
+            time.sleep(0.5)
+            st.rerun()
+        audio_bytes = preproceso.result()
+        if config_destino.get('destinos'):
+            procesar_varios_destinos(
+                audio_bytes, audio_nombre,
+                config_origen, config_destino,
+                history_manager
+            )
+            history_manager.mostrar_historial()
+            return
+        
+        en_segundo_plano = st.checkbox(
+            "⏳ Procesar en segundo plano",
+            value=True,
+            help="El trabajo continúa aunque la página se recargue o cambies otras opciones"
         )
+        if en_segundo_plano:
+            procesar_en_segundo_plano(
+                audio_bytes, audio_nombre,
+                config_origen, config_destino,
+                history_manager
+            )
+        else:
+            procesar_traduccion(
+                audio_bytes, audio_nombre,
+                config_origen, config_destino,
+                speech_service, translation_service,
+                history_manager
+            )
     
     # Mostrar historial
     history_manager.mostrar_historial()
 
+# cache_resource y no cache_data: el Future (y el AudioTemporal normalizado) se
+# comparte tal cual entre sesiones en lugar de serializarse y copiarse en cada una
+@st.cache_resource(ttl=3600, max_entries=32, show_spinner=False, hash_funcs=streamlit_adapter.HASH_AUDIO)
+def preprocesar_audio(audio_bytes):
+    """Encola la normalización (mono, 16 kHz, sin silencios) en el pool de preproceso y devuelve el Future"""
+    return normalizar_en_segundo_plano(audio_bytes)
+
+@st.cache_resource
+def obtener_cola_trabajos():
+    """Cola compartida por todas las sesiones; los workers pueden ir en otro proceso"""
+    cola = ColaTrabajos()
+    if os.environ.get("JOBS_WORKERS_EXTERNOS") != "1":
+        iniciar_workers(cola)
+    return cola
+
+def esperar_trabajo(etiqueta, audio_bytes, audio_nombre, config_origen, config_destino):
+    """
+    Envía el audio a la cola al pulsar el botón y sondea su estado en cada rerun
+
+    Devuelve (id, resultado) cuando el trabajo de este audio ha terminado y
+    (None, None) mientras no haya ninguno o siga en curso.
+    """
+    cola = obtener_cola_trabajos()
+    varios_destinos = bool(config_destino.get('destinos'))
+    
+    if st.button(etiqueta, type="primary", use_container_width=True):
+        st.session_state.trabajo_actual = {
+            # El audio ya viene normalizado por preprocesar_audio
+            'id': cola.enviar(audio_bytes, audio_nombre, config_origen, config_destino, normalizado=True),
+            'audio_nombre': audio_nombre,
+            'varios_destinos': varios_destinos
+        }
+    
+    trabajo = st.session_state.get('trabajo_actual')
+    if (not trabajo or trabajo['audio_nombre'] != audio_nombre
+            or trabajo.get('varios_destinos', False) != varios_destinos):
+        return None, None
+    
+    estado = cola.estado(trabajo['id'])
+    if estado is None:
+        return None, None
+    if estado['estado'] in (SUBIENDO, PENDIENTE, EN_PROCESO):
+        st.info(f"⏳ Procesando en segundo plano ({estado['estado']})...")
+        time.sleep(1)
+        st.rerun()
+    
+    return trabajo['id'], cola.resultado(trabajo['id'])
+
+def procesar_en_segundo_plano(audio_bytes, audio_nombre, config_origen,
+                              config_destino, history_manager):
+    trabajo_id, resultado = esperar_trabajo(
+        "🚀 Ejecutar Traducción Completa", audio_bytes, audio_nombre, config_origen, config_destino
+    )
+    if resultado is None:
+        return
+    if resultado['error']:
+        st.error(f"❌ {resultado['error']}")
+        return
+    
+    st.success(f"✅ **Texto transcrito:** {resultado['texto_original']}")
+    st.success(f"✅ **Texto traducido:** {resultado['texto_traducido']}")
+    st.success("🎉 **Traducción completada!**")
+    mostrar_resultados_finales(
+        audio_nombre, resultado['texto_original'], resultado['texto_traducido'],
+        resultado['config_origen'], resultado['config_destino'], resultado['audio_resultado']
+    )
+    
+    # Guardar en historial una sola vez por trabajo (ampliación)
+    guardados = st.session_state.setdefault('trabajos_guardados', set())
+    if trabajo_id not in guardados:
+        history_manager.guardar_traduccion(
+            audio_nombre, resultado['texto_original'], resultado['texto_traducido'],
+            resultado['config_origen'], resultado['config_destino']
+        )
+        guardados.add(trabajo_id)
+
 def procesar_traduccion(audio_bytes, audio_nombre, config_origen, 
                        config_destino, speech_service, 
                        translation_service, history_manager):
@@ -51,23 +177,31 @@ def procesar_traduccion(audio_bytes, audio_nombre, config_origen,
     if st.button("🚀 Ejecutar Traducción Completa", type="primary", use_container_width=True):
         with st.spinner("Procesando flujo completo..."):
             
+            # Detección automática de idioma (ampliación): con un prefijo del audio,
+            # antes de transcribir, para subir el audio completo una sola vez
+            texto_original = None
+            if config_origen['deteccion_automatica']:
+                texto_original, config_origen = LanguageSelector.detectar_idioma_audio(
+                    audio_bytes, config_origen, translation_service, speech_service
+                )
+            
             # PASO 1: Transcripción
-            texto_original = speech_service.transcribir_audio(
-                audio_bytes, config_origen['idioma_stt']
-            )
+            if texto_original is None:
+                if speech_service.es_audio_largo(audio_bytes):
+                    texto_original = transcribir_audio_largo(
+                        speech_service, audio_bytes, config_origen['idioma_stt']
+                    )
+                else:
+                    texto_original = streamlit_adapter.transcribir_audio(
+                        speech_service, audio_bytes, config_origen['idioma_stt']
+                    )
             
             if texto_original and not texto_original.startswith("Error"):
                 st.success(f"✅ **Texto transcrito:** {texto_original}")
                 
-                # Detección automática de idioma (ampliación)
-                if config_origen['deteccion_automatica']:
-                    texto_original, config_origen = translation_service.detectar_y_mejorar_idioma(
-                        audio_bytes, texto_original, config_origen
-                    )
-                
                 # PASO 2: Traducción
-                texto_traducido = translation_service.traducir_texto(
-                    texto_original, 
+                texto_traducido = streamlit_adapter.traducir_texto(
+                    translation_service, texto_original, 
                     config_origen['idioma_traduccion'], 
                     config_destino['idioma']
                 )
@@ -75,10 +209,17 @@ def procesar_traduccion(audio_bytes, audio_nombre, config_origen,
                 if texto_traducido and not texto_traducido.startswith("Error"):
                     st.success(f"✅ **Texto traducido:** {texto_traducido}")
                     
-                    # PASO 3: Síntesis de voz
-                    audio_resultado = speech_service.sintetizar_voz(
-                        texto_traducido, config_destino['voz']
-                    )
+                    # PASO 3: Síntesis de voz (por frases solo si el formato se puede concatenar)
+                    formato = speech_service.formato_azure(config_destino.get('formato'))
+                    if len(speech_service.segmentar_texto(texto_traducido)) > 1 and \
+                            speech_service.admite_segmentos(formato):
+                        audio_resultado = sintetizar_voz_por_frases(
+                            speech_service, texto_traducido, config_destino['voz'], formato
+                        )
+                    else:
+                        audio_resultado = streamlit_adapter.sintetizar_voz(
+                            speech_service, texto_traducido, config_destino['voz'], formato
+                        )
                     
                     if audio_resultado:
                         st.success("🎉 **Traducción completada!**")
@@ -101,6 +242,79 @@ def procesar_traduccion(audio_bytes, audio_nombre, config_origen,
             else:
                 st.error("❌ Error en transcripción")
 
+def procesar_varios_destinos(audio_bytes, audio_nombre, config_origen,
+                             config_destino, history_manager):
+    """Una transcripción, una traducción a todos los idiomas y las voces en paralelo (en la cola de trabajos)"""
+    idiomas = ", ".join(d['idioma'] for d in config_destino['destinos'])
+    trabajo_id, resultado = esperar_trabajo(
+        f"🚀 Traducir a {idiomas}", audio_bytes, audio_nombre, config_origen, config_destino
+    )
+    if resultado is None:
+        return
+    if not resultado['texto_original']:
+        st.error(f"❌ {resultado['error'] or 'Error en transcripción'}")
+        return
+    
+    config_origen = resultado['config_origen']
+    if config_origen.get('idioma_detectado'):
+        st.success(f"🌐 Idioma detectado: **{config_origen['idioma_detectado']}**")
+        st.session_state['idioma_stt_previo'] = config_origen['idioma_stt']
+    st.success(f"✅ **Texto transcrito:** {resultado['texto_original']}")
+    
+    guardados = st.session_state.setdefault('trabajos_guardados', set())
+    for traduccion in resultado.get('traducciones') or []:
+        with st.expander(f"🌍 {traduccion['idioma']} · {traduccion['voz']}", expanded=True):
+            if traduccion['error']:
+                st.error(f"❌ {traduccion['error']}")
+                continue
+            st.write(traduccion['texto'])
+            st.audio(traduccion['audio'], format=tipo_audio(traduccion['audio'])[0])
+            
+            # Guardar en historial (ampliación): una fila por idioma y una sola vez por trabajo
+            if trabajo_id not in guardados:
+                history_manager.guardar_traduccion(
+                    audio_nombre, resultado['texto_original'], traduccion['texto'],
+                    config_origen, {'idioma': traduccion['idioma'], 'voz': traduccion['voz']}
+                )
+    guardados.add(trabajo_id)
+    
+    st.download_button(
+        "📦 Descargar todo (ZIP)",
+        crear_paquete_zip(resultado),
+        f"traducciones_{os.path.splitext(audio_nombre)[0]}.zip",
+        "application/zip",
+        use_container_width=True
+    )
+
+def transcribir_audio_largo(speech_service, audio_bytes, idioma):
+    """Transcribe por fragmentos mostrando el texto parcial según llega"""
+    st.write("**📝 Audio largo: transcribiendo por fragmentos...**")
+    parcial = st.empty()
+    textos = []
+    for texto in speech_service.transcribir_audio_streaming(audio_bytes, idioma):
+        if texto and texto.startswith("Error"):
+            return texto
+        textos.append(texto)
+        parcial.info(" ".join(t for t in textos if t))
+    parcial.empty()
+    return " ".join(t for t in textos if t)
+
+def sintetizar_voz_por_frases(speech_service, texto, voz, formato=None):
+    """Sintetiza frase a frase reproduciendo el primer segmento en cuanto está listo"""
+    vista_previa = st.empty()
+    segmentos = []
+    for segmento in speech_service.sintetizar_voz_streaming(texto, voz, formato):
+        if segmento is None:
+            vista_previa.empty()
+            return None
+        if not segmentos:
+            with vista_previa.container():
+                st.write("**🔊 Primera frase:**")
+                st.audio(segmento, format=tipo_audio(segmento)[0])
+        segmentos.append(segmento)
+    vista_previa.empty()
+    return b"".join(segmentos)
+
 def mostrar_resultados_finales(audio_nombre, texto_original, texto_traducido,
                              config_origen, config_destino, audio_resultado):
     
@@ -118,12 +332,13 @@ def mostrar_resultados_finales(audio_nombre, texto_original, texto_traducido,
     
     with col2:
         st.write("**🔊 Audio Resultante:**")
-        st.audio(audio_resultado, format="audio/mp3")
+        tipo_mime, extension = tipo_audio(audio_resultado)
+        st.audio(audio_resultado, format=tipo_mime)
         st.download_button(
             "📥 Descargar Audio",
             audio_resultado,
-            f"traduccion_{config_destino['idioma']}.mp3",
-            "audio/mp3",
+            f"traduccion_{config_destino['idioma']}.{extension}",
+            tipo_mime,
             use_container_width=True
         )
 
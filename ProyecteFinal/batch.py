@@ -0,0 +1,302 @@
+"""
+Modo batch (sin interfaz): traduce directorios de audios y ficheros de texto
+
+Uso:
+    python batch.py grabaciones/ --salida resultados/ --destino en --paralelismo 16
+    python batch.py manifiesto.csv --salida resultados/ --destino fr --parquet
+    python batch.py grabaciones/ --destino en,fr,de   # varios idiomas: una transcripción por fichero
+    python batch.py grabaciones/ --formato-tts opus-24k  # voz en Opus a 24 kbit/s en lugar de MP3
+
+El manifiesto CSV admite las columnas: ruta (obligatoria), origen, destino, voz.
+Los resultados se escriben en <salida>/resultados.csv a medida que terminan;
+si se relanza el mismo comando, los ficheros ya completados (y sin cambios)
+se saltan y los demás sustituyen sus filas anteriores.
+"""
+import os
+import csv
+import asyncio
+import hashlib
+import argparse
+import functools
+
+from services.historial import crear_registro
+from services.pipeline import PipelineTraduccion
+from services.speech_service import SpeechService
+from services.translation_batcher import TraductorPorLotes
+from services.translation_service import TranslationService
+from utils.audio import tipo_audio
+from utils.audio_temporal import AudioTemporal, TAMAÑO_BLOQUE_AUDIO
+
+EXTENSIONES_AUDIO = (".wav", ".webm", ".mp3", ".ogg", ".opus")
+EXTENSIONES_TEXTO = (".txt",)
+COLUMNAS_RESULTADOS = [
+    "archivo", "huella", "estado", "error", "timestamp", "audio_original", "idioma_origen",
+    "texto_original", "idioma_destino", "texto_traducido", "voz_destino", "mp3"
+]
+
+
+def listar_entradas(entrada, origen, destino, voz, excluir=None):
+    """Devuelve (ruta, origen, destino, voz) para un directorio o un manifiesto CSV"""
+    if os.path.isdir(entrada):
+        excluir = os.path.abspath(excluir) if excluir else None
+        for raiz, directorios, ficheros in os.walk(entrada):
+            # No releer las salidas si el directorio de salida está dentro de la entrada
+            directorios[:] = [d for d in directorios if os.path.abspath(os.path.join(raiz, d)) != excluir]
+            for fichero in sorted(ficheros):
+                if fichero.lower().endswith(EXTENSIONES_AUDIO + EXTENSIONES_TEXTO):
+                    yield os.path.join(raiz, fichero), origen, destino, voz
+        return
+
+    base = os.path.dirname(os.path.abspath(entrada))
+    with open(entrada, newline="", encoding="utf-8") as f:
+        for fila in csv.DictReader(f):
+            ruta = fila["ruta"] if os.path.isabs(fila["ruta"]) else os.path.join(base, fila["ruta"])
+            yield ruta, fila.get("origen") or origen, fila.get("destino") or destino, fila.get("voz") or voz
+
+
+def huella_fichero(ruta):
+    """SHA-256 del contenido del fichero (la misma que la huella de su AudioTemporal)"""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(functools.partial(f.read, TAMAÑO_BLOQUE_AUDIO), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def preparar_resultados(ruta_resultados, rutas):
+    """
+    Ficheros ya procesados con éxito en una ejecución anterior (checkpoint)
+
+    Un fichero cuenta como completado si salió bien y su huella no ha cambiado
+    (las filas sin huella, de versiones anteriores, se comparan solo por ruta).
+    Las filas de los ficheros de esta entrada que se van a repetir (fallidos o
+    modificados) se quitan de resultados.csv para que no queden duplicadas.
+    """
+    if not os.path.exists(ruta_resultados):
+        return set()
+    with open(ruta_resultados, newline="", encoding="utf-8") as f:
+        filas = list(csv.DictReader(f))
+
+    correctos = {fila["archivo"]: fila.get("huella") for fila in filas if fila["estado"] == "ok"}
+    completados = {
+        ruta for ruta in rutas
+        if ruta in correctos and os.path.exists(ruta)
+        and (not correctos[ruta] or correctos[ruta] == huella_fichero(ruta))
+    }
+    repetir = set(rutas) - completados
+
+    temporal = ruta_resultados + ".tmp"
+    with open(temporal, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUMNAS_RESULTADOS, restval="", extrasaction="ignore")
+        escritor.writeheader()
+        escritor.writerows(fila for fila in filas if fila["archivo"] not in repetir)
+    os.replace(temporal, ruta_resultados)
+    return completados
+
+
+def crear_configuracion(origen, destino, voz, translation_service, formato=None):
+    if origen == "auto":
+        config_origen = {
+            'deteccion_automatica': True,
+            'idioma_stt': "es-ES",
+            'idioma_traduccion': "es",
+            'idioma_detectado': None
+        }
+    else:
+        idioma_stt = translation_service.mapeo_idiomas_stt.get(origen, origen)
+        config_origen = {
+            'deteccion_automatica': False,
+            'idioma_stt': idioma_stt,
+            'idioma_traduccion': idioma_stt.split('-')[0],
+            'idioma_detectado': None
+        }
+    idiomas = [idioma.strip() for idioma in destino.split(",") if idioma.strip()]
+    destinos = [
+        {'idioma': idioma, 'voz': translation_service.voces_por_idioma.get(idioma, ["es-ES-ElviraNeural"])[0]}
+        for idioma in idiomas
+    ]
+    if voz and len(destinos) == 1:
+        destinos[0]['voz'] = voz
+    config_destino = dict(destinos[0])
+    if formato:
+        config_destino['formato'] = formato
+    if len(destinos) > 1:
+        config_destino['destinos'] = destinos
+    return config_origen, config_destino
+
+
+async def generar_trabajos(entradas, completados, translation_service, formato=None, audios=None,
+                           huellas=None):
+    """
+    Lee cada fichero solo cuando la pipeline tiene hueco para él (a un temporal, por bloques)
+
+    Los temporales abiertos quedan en audios (id del trabajo → AudioTemporal)
+    para cerrarlos en cuanto llega su resultado, y la huella de cada fichero
+    en huellas (id del trabajo → SHA-256) para el checkpoint.
+    """
+    for ruta, origen, destino, voz in entradas:
+        if ruta in completados:
+            continue
+        config_origen, config_destino = crear_configuracion(origen, destino, voz, translation_service, formato)
+        trabajo = {
+            "id": ruta,
+            "audio_nombre": os.path.basename(ruta),
+            "config_origen": config_origen,
+            "config_destino": config_destino
+        }
+        if ruta.lower().endswith(EXTENSIONES_TEXTO):
+            with open(ruta, encoding="utf-8") as f:
+                trabajo["texto"] = f.read().strip()
+            huella = huella_fichero(ruta)
+        else:
+            with open(ruta, "rb") as f:
+                trabajo["audio_bytes"] = await asyncio.to_thread(
+                    AudioTemporal.desde_fichero, f, trabajo["audio_nombre"]
+                )
+            huella = trabajo["audio_bytes"].huella
+            if audios is not None:
+                audios[ruta] = trabajo["audio_bytes"]
+        if huellas is not None:
+            huellas[ruta] = huella
+        yield trabajo
+
+
+def salidas_por_destino(resultado):
+    """(config_destino, texto_traducido, audio, error) de cada idioma destino del resultado"""
+    if "traducciones" in resultado:
+        return [
+            ({'idioma': t["idioma"], 'voz': t["voz"]}, t["texto"], t["audio"], t["error"])
+            for t in resultado["traducciones"]
+        ]
+    return [(resultado["config_destino"], resultado["texto_traducido"],
+             resultado["audio_resultado"], resultado["error"])]
+
+
+def guardar_salidas(resultado, entrada, salida):
+    """
+    Escribe transcripción, traducción y audio junto a la ruta relativa del original
+
+    Con varios destinos cada idioma lleva su sufijo (.en.traduccion.txt, .en.mp3).
+    La extensión del audio sigue su formato (.mp3, .ogg, .webm).
+    Devuelve {idioma_destino: ruta del audio}.
+    """
+    ruta = resultado["id"]
+    relativa = os.path.relpath(ruta, entrada if os.path.isdir(entrada) else os.path.dirname(os.path.abspath(entrada)))
+    base = os.path.join(salida, os.path.splitext(relativa)[0])
+    os.makedirs(os.path.dirname(base) or salida, exist_ok=True)
+
+    if resultado["texto_original"]:
+        with open(base + ".transcripcion.txt", "w", encoding="utf-8") as f:
+            f.write(resultado["texto_original"])
+    mp3s = {}
+    for config_destino, texto_traducido, audio, _ in salidas_por_destino(resultado):
+        prefijo = f"{base}.{config_destino['idioma']}" if "traducciones" in resultado else base
+        if texto_traducido and not texto_traducido.startswith("Error"):
+            with open(prefijo + ".traduccion.txt", "w", encoding="utf-8") as f:
+                f.write(texto_traducido)
+        if audio:
+            ruta_audio = f"{prefijo}.{tipo_audio(audio)[1]}"
+            with open(ruta_audio, "wb") as f:
+                f.write(audio)
+            mp3s[config_destino['idioma']] = ruta_audio
+    return mp3s
+
+
+async def ejecutar(args):
+    speech_service = SpeechService()
+    translation_service = TranslationService()
+    traductor_lotes = TraductorPorLotes(translation_service)
+    pipeline = PipelineTraduccion(
+        speech_service, translation_service,
+        limites={"stt": args.paralelismo, "tts": args.paralelismo, "traduccion": args.paralelismo},
+        max_en_vuelo=args.paralelismo * 4,
+        traductor_lotes=traductor_lotes
+    )
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta_resultados = os.path.join(args.salida, "resultados.csv")
+    entradas = list(listar_entradas(args.entrada, args.origen, args.destino, args.voz, excluir=args.salida))
+    completados = preparar_resultados(ruta_resultados, [ruta for ruta, *_ in entradas])
+    if completados:
+        print(f"↩️  Reanudando: {len(completados)} ficheros ya completados")
+
+    nuevo = not os.path.exists(ruta_resultados)
+    correctos = fallidos = 0
+    with open(ruta_resultados, "a", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUMNAS_RESULTADOS)
+        if nuevo:
+            escritor.writeheader()
+
+        audios, huellas = {}, {}
+        trabajos = generar_trabajos(entradas, completados, translation_service, args.formato_tts, audios, huellas)
+        try:
+            async for resultado in pipeline.procesar_flujo(trabajos):
+                # La pipeline ya terminó con el audio: se cierra su temporal
+                audio = audios.pop(resultado["id"], None)
+                if audio is not None:
+                    audio.cerrar()
+                mp3s = await asyncio.to_thread(guardar_salidas, resultado, args.entrada, args.salida)
+                salidas = salidas_por_destino(resultado)
+                # Un fichero solo cuenta como completado si todos sus destinos salieron bien
+                error_fichero = resultado["error"] or next((error for *_, error in salidas if error), None)
+                for config_destino, texto_traducido, _, error in salidas:
+                    fila = crear_registro(
+                        resultado["audio_nombre"], resultado["texto_original"], texto_traducido,
+                        resultado["config_origen"], config_destino
+                    )
+                    fila.update({
+                        "archivo": resultado["id"],
+                        "huella": huellas.get(resultado["id"], ""),
+                        "estado": "error" if error_fichero else "ok",
+                        "error": error or resultado["error"] or "",
+                        "mp3": mp3s.get(config_destino['idioma'], "")
+                    })
+                    escritor.writerow(fila)
+                f.flush()  # checkpoint: las filas quedan escritas al terminar su fichero
+                huellas.pop(resultado["id"], None)
+
+                if error_fichero:
+                    fallidos += 1
+                    print(f"❌ {resultado['id']}: {error_fichero}")
+                else:
+                    correctos += 1
+                    print(f"✅ {resultado['id']}")
+        finally:
+            for audio in audios.values():
+                audio.cerrar()
+
+    traductor_lotes.cerrar()
+    print(f"🎉 Completados: {correctos} · Errores: {fallidos} · Resultados: {ruta_resultados}")
+    return ruta_resultados
+
+
+def exportar_parquet(ruta_resultados):
+    try:
+        import pandas as pd
+        destino = os.path.splitext(ruta_resultados)[0] + ".parquet"
+        pd.read_csv(ruta_resultados).to_parquet(destino, index=False)
+        print(f"📦 Parquet: {destino}")
+    except ImportError:
+        print("⚠️  Para exportar a Parquet instala pyarrow: pip install pyarrow")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traducción por lotes de audios y textos (sin Streamlit)")
+    parser.add_argument("entrada", help="Directorio con audios/textos o manifiesto CSV")
+    parser.add_argument("--salida", default="resultados_batch", help="Directorio de salida")
+    parser.add_argument("--origen", default="auto", help="Idioma origen (es, en...) o 'auto'")
+    parser.add_argument("--destino", default="en", help="Idioma destino (es, en, fr, de, it, pt, ja) o varios separados por comas")
+    parser.add_argument("--voz", default=None, help="Voz TTS (por defecto la primera del idioma destino)")
+    parser.add_argument("--formato-tts", default=None,
+                        help="Formato de la voz: mp3, mp3-32k, opus, opus-24k o un formato de Azure")
+    parser.add_argument("--paralelismo", type=int, default=8, help="Llamadas simultáneas por etapa")
+    parser.add_argument("--parquet", action="store_true", help="Exportar también resultados.parquet")
+    args = parser.parse_args()
+
+    ruta_resultados = asyncio.run(ejecutar(args))
+    if args.parquet:
+        exportar_parquet(ruta_resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark de arranque de un worker: tiempo de importación y memoria
+
+Cada medición se hace en un proceso nuevo. Se compara el núcleo de servicios
+(lo que importa un worker de la cola o el modo batch) con el mismo núcleo más
+Streamlit, que es lo que cargaba un worker cuando los servicios lo importaban.
+
+Uso:
+    python benchmarks/arranque_workers.py --repeticiones 10
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_NUCLEO = [
+    "services.job_queue",
+    "services.pipeline",
+    "services.speech_service",
+    "services.translation_service",
+    "services.translation_batcher",
+]
+
+# Se ejecuta en el proceso hijo: importa, crea los servicios y mide
+_SCRIPT = """
+import sys, time, json, resource, importlib
+inicio = time.perf_counter()
+for modulo in {modulos!r}:
+    importlib.import_module(modulo)
+from services.speech_service import SpeechService
+from services.translation_service import TranslationService
+SpeechService(speech_key="x", region="westeurope")
+TranslationService(translator_key="x", region="westeurope")
+segundos = time.perf_counter() - inicio
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"segundos": segundos, "rss_mb": rss_kb / 1024, "streamlit": "streamlit" in sys.modules}}))
+"""
+
+
+def medir(modulos, repeticiones):
+    muestras = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", _SCRIPT.format(modulos=modulos)],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+            env={**os.environ, "CACHE_BACKEND": "ninguno"}
+        ).stdout
+        muestras.append(json.loads(salida.strip().splitlines()[-1]))
+    return {
+        "segundos_mediana": statistics.median(m["segundos"] for m in muestras),
+        "rss_mb_mediana": statistics.median(m["rss_mb"] for m in muestras),
+        "streamlit_cargado": muestras[0]["streamlit"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque y memoria de un worker")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    escenarios = {
+        "nucleo": MODULOS_NUCLEO,
+        "nucleo + streamlit": ["streamlit"] + MODULOS_NUCLEO,
+    }
+    resultados = {}
+    for nombre, modulos in escenarios.items():
+        resultados[nombre] = r = medir(modulos, args.repeticiones)
+        print(f"⏱️  {nombre:<20} {r['segundos_mediana'] * 1000:8.1f} ms  "
+              f"{r['rss_mb_mediana']:7.1f} MB  streamlit={r['streamlit_cargado']}")
+
+    base, nucleo = resultados["nucleo + streamlit"], resultados["nucleo"]
+    print(f"🎉 Arranque {base['segundos_mediana'] / nucleo['segundos_mediana']:.1f}x más rápido, "
+          f"{base['rss_mb_mediana'] - nucleo['rss_mb_mediana']:.0f} MB menos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Prueba de carga de la pipeline completa Voz → Texto → Traducción → Voz
+
+Lanza N trabajos de audio por PipelineTraduccion (las mismas etapas que
+procesar_traduccion en la interfaz) con la concurrencia indicada y muestra el
+rendimiento, los percentiles p50/p95/p99 por etapa y los reintentos HTTP.
+
+Por defecto usa el servidor simulado (benchmarks/mock_azure.py) en un puerto
+libre; con --real se usan los endpoints y claves del entorno.
+
+Uso:
+    python benchmarks/carga.py --trabajos 200 --concurrencia 50 --tasa-429 0.02
+    python benchmarks/carga.py --trabajos 50 --destinos en,fr,de --json resultado.json
+    python benchmarks/carga.py --subida-kbps 256 --formato-stt wav   # comparar con opus
+
+Los límites de tasa del cliente (RATE_LIMIT_STT, RATE_LIMIT_TTS,
+RATE_LIMIT_TRANSLATOR) se aplican también contra el simulador.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.mock_azure import añadir_argumentos, crear_desde_argumentos
+
+ETAPAS = ["preproceso", "identificacion_idioma", "stt", "deteccion", "traduccion", "traduccion_lote", "tts",
+          "trabajo_completo"]
+
+
+def generar_audio(segundos: float, semilla: int) -> bytes:
+    """WAV 16 kHz mono con ráfagas de tono y ruido separadas por silencios (distinto por semilla)"""
+    from utils.audio import FRECUENCIA_STT, escribir_wav, float_a_pcm16
+
+    rng = np.random.default_rng(semilla)
+    t = np.arange(int(segundos * FRECUENCIA_STT)) / FRECUENCIA_STT
+    señal = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) + 0.05 * rng.standard_normal(t.size)
+    # 0.4 s de silencio cada 2.5 s para que el troceado encuentre cortes
+    señal[(t % 2.9) > 2.5] = 0.0
+    return escribir_wav(float_a_pcm16(señal.astype(np.float32)), 1, 2, FRECUENCIA_STT)
+
+
+def crear_trabajos(args):
+    idiomas = args.destinos.split(",")
+    config_destino = {'idioma': idiomas[0], 'voz': f"{idiomas[0]}-XX-SimuladaNeural", 'formato': args.formato_tts}
+    if len(idiomas) > 1:
+        config_destino['destinos'] = [{'idioma': i, 'voz': f"{i}-XX-SimuladaNeural"} for i in idiomas]
+    audio_comun = generar_audio(args.duracion_audio, 0)
+    for i in range(args.trabajos):
+        yield {
+            "id": i,
+            "audio_nombre": f"carga_{i}.wav",
+            # Con --repetidos todos los trabajos envían el mismo audio (caché, single-flight...)
+            "audio_bytes": audio_comun if args.repetidos else generar_audio(args.duracion_audio, i + 1),
+            "config_origen": {
+                'deteccion_automatica': args.deteccion,
+                'idioma_stt': "es-ES",
+                'idioma_traduccion': "es",
+                'idioma_detectado': None
+            },
+            "config_destino": config_destino
+        }
+
+
+def resumir(metricas_json, segundos, resultados):
+    errores = [r for r in resultados if r["error"]]
+    resumen = {
+        "trabajos": len(resultados),
+        "errores": len(errores),
+        "segundos": segundos,
+        "trabajos_por_segundo": len(resultados) / segundos if segundos else 0.0,
+        "etapas": {},
+        "http": {},
+        "bytes": {},
+        "contadores": {}
+    }
+    for h in metricas_json["histogramas"]:
+        if h["nombre"] == "etapa_segundos":
+            resumen["etapas"][h["etiquetas"]["etapa"]] = {k: h[k] for k in ("total", "p50", "p95", "p99")}
+        elif h["nombre"] == "http_peticion_segundos":
+            resumen["http"][h["etiquetas"]["endpoint"]] = {k: h[k] for k in ("total", "p50", "p95", "p99")}
+        elif h["nombre"] in ("http_peticion_bytes", "http_respuesta_bytes") and h["total"]:
+            sentido = "subida" if h["nombre"] == "http_peticion_bytes" else "bajada"
+            resumen["bytes"][f"{h['etiquetas']['endpoint']}:{sentido}"] = h["suma"] / h["total"]
+    for c in metricas_json["contadores"]:
+        etiqueta = ",".join(f"{k}={v}" for k, v in sorted(c["etiquetas"].items()))
+        resumen["contadores"][f"{c['nombre']}{{{etiqueta}}}"] = c["valor"]
+    return resumen
+
+
+def imprimir(resumen):
+    print(f"\n📊 {resumen['trabajos']} trabajos en {resumen['segundos']:.2f} s "
+          f"→ {resumen['trabajos_por_segundo']:.2f} trabajos/s · errores: {resumen['errores']}")
+    print(f"\n{'etapa':<24}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    filas = sorted(resumen["etapas"].items(), key=lambda e: ETAPAS.index(e[0]) if e[0] in ETAPAS else len(ETAPAS))
+    filas += [(f"http:{endpoint}", datos) for endpoint, datos in sorted(resumen["http"].items())]
+    for nombre, datos in filas:
+        print(f"{nombre:<24}{datos['total']:>7}" + "".join(
+            f"{(datos[p] or 0) * 1000:>10.0f}" for p in ("p50", "p95", "p99")
+        ))
+    print()
+    for nombre, media in sorted(resumen["bytes"].items()):
+        print(f"📦 {nombre:<22} media {media / 1024:8.1f} KB por petición")
+    print()
+    for nombre, valor in sorted(resumen["contadores"].items()):
+        if nombre.startswith(("stt_subida", "http_reintentos", "http_agotados", "http_circuito", "cache_", "memoria_", "coalescencia_")):
+            print(f"🔁 {nombre} = {valor:g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la pipeline de traducción")
+    parser.add_argument("--trabajos", type=int, default=100)
+    parser.add_argument("--concurrencia", type=int, default=50, help="Trabajos en vuelo a la vez")
+    parser.add_argument("--duracion-audio", type=float, default=6.0, help="Segundos de cada audio")
+    parser.add_argument("--destinos", default="en", help="Idioma(s) destino separados por comas")
+    parser.add_argument("--deteccion", action="store_true", help="Detección automática de idioma")
+    parser.add_argument("--repetidos", action="store_true", help="Todos los trabajos con el mismo audio")
+    parser.add_argument("--formato-stt", choices=["opus", "wav"], default="opus",
+                        help="Subida al STT (opus necesita ffmpeg; si no, se envía WAV)")
+    parser.add_argument("--formato-tts", default="mp3", help="Formato de la voz sintetizada")
+    parser.add_argument("--lotes", action="store_true", help="Agrupar traducciones con TraductorPorLotes")
+    parser.add_argument("--cache", action="store_true", help="Usar la caché persistente (por defecto desactivada)")
+    parser.add_argument("--memoria", action="store_true", help="Usar la memoria de traducción")
+    parser.add_argument("--real", action="store_true", help="Usar los endpoints reales de Azure del entorno")
+    parser.add_argument("--json", default=None, help="Guardar el resumen en este fichero")
+    añadir_argumentos(parser)
+    args = parser.parse_args()
+
+    # La configuración se lee al importar los servicios: preparar el entorno antes
+    servidor = None
+    if not args.real:
+        servidor = crear_desde_argumentos(args).iniciar()
+        os.environ.update(servidor.variables_entorno())
+        print(f"🧪 Azure simulado en {servidor.url}")
+    if not args.cache:
+        os.environ["CACHE_BACKEND"] = "ninguno"
+    if not args.memoria:
+        os.environ["TM_ENABLED"] = "0"
+    os.environ["STT_FORMATO"] = args.formato_stt
+
+    from services.pipeline import PipelineTraduccion
+    from services.speech_service import SpeechService
+    from services.translation_batcher import TraductorPorLotes
+    from services.translation_service import TranslationService
+    from utils.metrics import metricas
+
+    translation_service = TranslationService()
+    traductor_lotes = TraductorPorLotes(translation_service) if args.lotes else None
+    pipeline = PipelineTraduccion(SpeechService(), translation_service,
+                                  max_en_vuelo=args.concurrencia, traductor_lotes=traductor_lotes)
+
+    trabajos = list(crear_trabajos(args))
+    metricas.reiniciar()
+    inicio = time.perf_counter()
+    resultados = pipeline.procesar_lote(trabajos)
+    segundos = time.perf_counter() - inicio
+
+    if traductor_lotes:
+        traductor_lotes.cerrar()
+    if servidor:
+        servidor.detener()
+
+    resumen = resumir(metricas.snapshot(), segundos, resultados)
+    imprimir(resumen)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2)
+        print(f"💾 Resumen guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Simulación del modo conversación con WAVs como si fueran el micrófono
+
+Alimenta ConversacionEnVivo con bloques de 20 ms al ritmo real (o más rápido
+con --ritmo) y mide, para cada enunciado, la latencia desde que termina la
+voz hasta que están listos el texto traducido y el audio sintetizado.
+
+Por defecto usa el servidor simulado (benchmarks/mock_azure.py); sin WAVs
+genera un audio sintético con ráfagas de voz separadas por pausas.
+
+Uso:
+    python benchmarks/conversacion.py grabacion.wav --destino en --voz en-US-JennyNeural
+    python benchmarks/conversacion.py --duracion-audio 30 --hablantes 2 --ritmo 2
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.carga import generar_audio
+from benchmarks.mock_azure import añadir_argumentos, crear_desde_argumentos
+
+
+async def simular(pipeline, audios, args):
+    """Una conversación por audio, todas a la vez (como varios hablantes)"""
+    from services.conversacion import ConversacionEnVivo, bloques_desde_wav, configuracion_desde_parametros
+    from utils.segmentador import SegmentadorVoz
+
+    config_origen, config_destino = configuracion_desde_parametros({
+        "origen": [args.origen], "destino": [args.destino], "voz": [args.voz],
+        "deteccion": ["1" if args.deteccion else "0"]
+    })
+
+    async def hablar(hablante, audio):
+        segmentador = SegmentadorVoz(silencio_fin_ms=args.silencio_fin_ms)
+        conversacion = ConversacionEnVivo(pipeline, config_origen, config_destino, segmentador=segmentador)
+        resultados = []
+        async for evento in conversacion.procesar(bloques_desde_wav(audio, ritmo=args.ritmo)):
+            if evento["tipo"] != "resultado":
+                continue
+            resultados.append(evento)
+            estado = f"❌ {evento['error']}" if evento["error"] else f"✅ {evento['texto_traducido']}"
+            print(f"[{hablante}#{evento['id']} {evento['inicio']:6.2f}-{evento['fin']:6.2f} s] "
+                  f"{evento['latencia'] * 1000:6.0f} ms {estado}")
+        return resultados
+
+    return await asyncio.gather(*(hablar(i, audio) for i, audio in enumerate(audios)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación del modo conversación en vivo")
+    parser.add_argument("wavs", nargs="*", help="WAVs a usar como micrófono (uno por hablante)")
+    parser.add_argument("--hablantes", type=int, default=1, help="Conversaciones simultáneas sin WAVs")
+    parser.add_argument("--duracion-audio", type=float, default=20.0, help="Segundos del audio sintético")
+    parser.add_argument("--ritmo", type=float, default=1.0, help="1 = tiempo real, 0 = sin esperas (la latencia solo es realista con 1)")
+    parser.add_argument("--origen", default="es-ES")
+    parser.add_argument("--destino", default="en")
+    parser.add_argument("--voz", default="en-US-JennyNeural")
+    parser.add_argument("--deteccion", action="store_true", help="Detección automática de idioma")
+    parser.add_argument("--silencio-fin-ms", type=int, default=300, help="Pausa que cierra un enunciado")
+    parser.add_argument("--real", action="store_true", help="Usar los endpoints reales de Azure del entorno")
+    añadir_argumentos(parser)
+    args = parser.parse_args()
+
+    servidor = None
+    if not args.real:
+        servidor = crear_desde_argumentos(args).iniciar()
+        os.environ.update(servidor.variables_entorno())
+        print(f"🧪 Azure simulado en {servidor.url}")
+    # Sin caché ni memoria de traducción: cada enunciado paga la latencia completa
+    os.environ["CACHE_BACKEND"] = "ninguno"
+    os.environ["TM_ENABLED"] = "0"
+
+    from services.pipeline import PipelineTraduccion
+    from services.speech_service import SpeechService
+    from services.translation_service import TranslationService
+
+    if args.wavs:
+        audios = []
+        for ruta in args.wavs:
+            with open(ruta, "rb") as f:
+                audios.append(f.read())
+    else:
+        audios = [generar_audio(args.duracion_audio, i + 1) for i in range(args.hablantes)]
+
+    pipeline = PipelineTraduccion(SpeechService(), TranslationService(), normalizar=False)
+    inicio = time.perf_counter()
+    resultados = asyncio.run(simular(pipeline, audios, args))
+    segundos = time.perf_counter() - inicio
+    if servidor:
+        servidor.detener()
+
+    latencias = np.array([r["latencia"] for hablante in resultados for r in hablante if not r["error"]])
+    errores = sum(1 for hablante in resultados for r in hablante if r["error"])
+    print(f"\n📊 {sum(map(len, resultados))} enunciados en {segundos:.1f} s · errores: {errores}")
+    if latencias.size:
+        p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1000
+        print(f"⏱️  latencia fin de voz → traducción y audio: p50 {p50:.0f} ms · p95 {p95:.0f} ms · p99 {p99:.0f} ms")
+        print(f"🎯 bajo 1 s: {np.mean(latencias < 1.0) * 100:.0f} %")
+
+    from utils.metrics import metricas
+    for h in metricas.snapshot()["histogramas"]:
+        if h["nombre"] == "etapa_segundos" and h["total"]:
+            print(f"   {h['etiquetas']['etapa']:<24} p50 {h['p50'] * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Servidor local que imita los endpoints de Azure usados por los servicios
+
+Emula STT (audio corto REST, WAV u Ogg/Opus), Translator /detect y /translate
+y TTS con latencias configurables, inyección de 429/5xx y coste por tamaño de
+la carga. Con --subida-kbps se simula además el enlace de subida del cliente
+(p. ej. 256 kbit/s en una conexión móvil), que es donde pesa enviar PCM.
+Es determinista: con la misma semilla, la misma petición (y su n-ésimo
+reintento) obtiene siempre la misma latencia y el mismo código.
+
+Uso:
+    python benchmarks/mock_azure.py --puerto 8765 --latencia-stt 0.6 --tasa-429 0.02
+
+y en otra terminal:
+    AZURE_STT_ENDPOINT=http://127.0.0.1:8765 AZURE_TTS_ENDPOINT=http://127.0.0.1:8765 \\
+    AZURE_TRANSLATOR_ENDPOINT=http://127.0.0.1:8765 python batch.py grabaciones/
+"""
+import os
+import sys
+import json
+import math
+import time
+import re
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.audio import duracion_ogg_opus, duracion_wav
+
+# Latencia = lognormal(mediana, sigma) + unidades * por_unidad + bytes / bytes_por_segundo
+# Unidades: segundos de audio (stt) o caracteres (translator, tts)
+PERFILES_POR_DEFECTO = {
+    "stt": {"mediana": 0.4, "sigma": 0.3, "por_unidad": 0.05, "bytes_por_segundo": 5_000_000},
+    "detect": {"mediana": 0.05, "sigma": 0.2, "por_unidad": 0.0, "bytes_por_segundo": 5_000_000},
+    "translate": {"mediana": 0.1, "sigma": 0.3, "por_unidad": 0.0002, "bytes_por_segundo": 5_000_000},
+    "tts": {"mediana": 0.3, "sigma": 0.3, "por_unidad": 0.002, "bytes_por_segundo": 5_000_000},
+}
+
+# ~15 caracteres por segundo de voz; tamaño de la respuesta según la tasa de bits del formato
+CARACTERES_POR_SEGUNDO = 15
+KBPS_POR_DEFECTO = {"mp3": 128, "opus": 32}
+# Cabecera de cada contenedor para que el cliente reconozca el formato
+CABECERAS_AUDIO = {"ogg": b"OggS", "webm": b"\x1aE\xdf\xa3", "riff": b"RIFF", "audio": b"ID3"}
+
+
+class ServidorSimulado:
+    """Servidor HTTP/1.1 (keep-alive) en un hilo aparte con el comportamiento simulado"""
+
+    def __init__(self, puerto: int = 0, host: str = "127.0.0.1", perfiles=None,
+                 tasa_429: float = 0.0, tasa_5xx: float = 0.0, retry_after: float = 1.0,
+                 idioma_detectado: str = "es", semilla: int = 0, subida_kbps: float = None):
+        self.perfiles = {nombre: {**perfil, **(perfiles or {}).get(nombre, {})}
+                         for nombre, perfil in PERFILES_POR_DEFECTO.items()}
+        self.tasa_429 = tasa_429
+        self.tasa_5xx = tasa_5xx
+        self.retry_after = retry_after
+        self.idioma_detectado = idioma_detectado
+        self.semilla = semilla
+        self.subida_kbps = subida_kbps
+        self.peticiones = {nombre: 0 for nombre in self.perfiles}
+        self._vistas = {}
+        self._lock = threading.Lock()
+
+        servidor = self
+        class Manejador(_ManejadorSimulado):
+            simulado = servidor
+        self._http = ThreadingHTTPServer((host, puerto), Manejador)
+        self._http.daemon_threads = True
+        self.url = f"http://{host}:{self._http.server_address[1]}"
+
+    def iniciar(self) -> "ServidorSimulado":
+        threading.Thread(target=self._http.serve_forever, daemon=True, name="mock-azure").start()
+        return self
+
+    def detener(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def variables_entorno(self) -> dict:
+        """Variables para que SpeechService y TranslationService apunten a este servidor"""
+        return {
+            "AZURE_STT_ENDPOINT": self.url,
+            "AZURE_TTS_ENDPOINT": self.url,
+            "AZURE_TRANSLATOR_ENDPOINT": self.url,
+            "AZURE_SPEECH_KEY": "simulada",
+            "AZURE_TRANSLATOR_KEY": "simulada",
+            "AZURE_REGION": "local"
+        }
+
+    def generador(self, operacion: str, cuerpo: bytes) -> random.Random:
+        """RNG determinista por (semilla, operación, contenido, nº de vez que se ve)"""
+        huella = hashlib.sha256(cuerpo).hexdigest()
+        with self._lock:
+            self.peticiones[operacion] += 1
+            vez = self._vistas.get((operacion, huella), 0)
+            self._vistas[(operacion, huella)] = vez + 1
+        semilla = hashlib.sha256(f"{self.semilla}:{operacion}:{huella}:{vez}".encode()).digest()
+        return random.Random(int.from_bytes(semilla[:8], "big"))
+
+    def latencia(self, operacion: str, rng: random.Random, unidades: float, bytes_totales: int) -> float:
+        perfil = self.perfiles[operacion]
+        base = rng.lognormvariate(math.log(perfil["mediana"]), perfil["sigma"]) if perfil["mediana"] > 0 else 0.0
+        return base + unidades * perfil["por_unidad"] + bytes_totales / perfil["bytes_por_segundo"]
+
+    def tiempo_subida(self, bytes_subidos: int) -> float:
+        """Segundos que tarda el cliente en subir la petición por su enlace simulado"""
+        return bytes_subidos * 8 / (self.subida_kbps * 1000) if self.subida_kbps else 0.0
+
+
+class _ManejadorSimulado(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    simulado: ServidorSimulado = None
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parametros = parse_qs(url.query)
+        cuerpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        if url.path.startswith("/speech/recognition"):
+            operacion, unidades = "stt", duracion_wav(cuerpo) or duracion_ogg_opus(cuerpo) or len(cuerpo) / 32000
+            respuesta = self._stt(unidades)
+        elif url.path == "/detect":
+            textos = json.loads(cuerpo or b"[]")
+            operacion, unidades = "detect", sum(len(t["text"]) for t in textos)
+            respuesta = [{"language": self.simulado.idioma_detectado, "score": 0.95} for _ in textos]
+        elif url.path == "/translate":
+            textos = json.loads(cuerpo or b"[]")
+            destinos = parametros.get("to", ["en"])
+            operacion, unidades = "translate", sum(len(t["text"]) for t in textos) * len(destinos)
+            respuesta = [
+                {"translations": [{"text": f"[{d}] {t['text']}", "to": d} for d in destinos]}
+                for t in textos
+            ]
+        elif url.path == "/cognitiveservices/v1":
+            texto = cuerpo.decode("utf-8", "replace")
+            operacion, unidades = "tts", len(texto)
+            respuesta = self._audio_sintetizado(texto, self.headers.get("X-Microsoft-OutputFormat", "mp3"))
+        else:
+            self._enviar(404, b"{}")
+            return
+
+        # La subida por el enlace del cliente ocurre antes de cualquier respuesta
+        time.sleep(self.simulado.tiempo_subida(len(cuerpo)))
+        rng = self.simulado.generador(operacion, cuerpo)
+        tirada = rng.random()
+        if tirada < self.simulado.tasa_429:
+            time.sleep(self.simulado.latencia(operacion, rng, 0, len(cuerpo)) * 0.1)
+            self._enviar(429, b'{"error": "throttled"}', {"Retry-After": str(self.simulado.retry_after)})
+            return
+        if tirada < self.simulado.tasa_429 + self.simulado.tasa_5xx:
+            time.sleep(self.simulado.latencia(operacion, rng, 0, len(cuerpo)))
+            self._enviar(rng.choice((500, 502, 503)), b'{"error": "simulated"}')
+            return
+
+        datos = respuesta if isinstance(respuesta, bytes) else json.dumps(respuesta).encode("utf-8")
+        time.sleep(self.simulado.latencia(operacion, rng, unidades, len(cuerpo) + len(datos)))
+        self._enviar(200, datos, {"Content-Type": "audio/mpeg" if operacion == "tts" else "application/json"})
+
+    @staticmethod
+    def _audio_sintetizado(texto, formato):
+        """Audio de relleno con la cabecera del contenedor y el tamaño de su tasa de bits"""
+        tasa = re.search(r"(\d+)(?:kbitrate|kbps)", formato)
+        kbps = int(tasa.group(1)) if tasa else KBPS_POR_DEFECTO["opus" if "opus" in formato else "mp3"]
+        cabecera = CABECERAS_AUDIO.get(formato.split("-")[0], b"ID3")
+        bytes_por_caracter = kbps * 1000 // 8 // CARACTERES_POR_SEGUNDO
+        return cabecera + bytes(max(1000, len(texto) * bytes_por_caracter))
+
+    @staticmethod
+    def _stt(segundos):
+        # Una frase simulada por cada ~3 segundos de audio
+        frases = max(1, round(segundos / 3))
+        return {
+            "RecognitionStatus": "Success",
+            "DisplayText": " ".join(f"Frase simulada número {i + 1}." for i in range(frases))
+        }
+
+    def _enviar(self, codigo, datos, cabeceras=None):
+        self.send_response(codigo)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *args):
+        pass
+
+
+def añadir_argumentos(parser: argparse.ArgumentParser):
+    """Opciones del servidor simulado (compartidas con benchmarks/carga.py)"""
+    grupo = parser.add_argument_group("servidor simulado")
+    for operacion in PERFILES_POR_DEFECTO:
+        grupo.add_argument(f"--latencia-{operacion}", type=float, default=None,
+                           help=f"Mediana de latencia de {operacion} en segundos")
+    grupo.add_argument("--sigma", type=float, default=None, help="Dispersión lognormal de todas las latencias")
+    grupo.add_argument("--tasa-429", type=float, default=0.0, help="Fracción de respuestas 429")
+    grupo.add_argument("--tasa-5xx", type=float, default=0.0, help="Fracción de respuestas 500/502/503")
+    grupo.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de los 429 (segundos)")
+    grupo.add_argument("--subida-kbps", type=float, default=None,
+                       help="Enlace de subida del cliente en kbit/s (sin límite por defecto)")
+    grupo.add_argument("--semilla", type=int, default=0)
+
+
+def crear_desde_argumentos(args, puerto: int = 0) -> ServidorSimulado:
+    perfiles = {}
+    for operacion in PERFILES_POR_DEFECTO:
+        perfil = {}
+        latencia = getattr(args, f"latencia_{operacion}")
+        if latencia is not None:
+            perfil["mediana"] = latencia
+        if args.sigma is not None:
+            perfil["sigma"] = args.sigma
+        perfiles[operacion] = perfil
+    return ServidorSimulado(puerto, perfiles=perfiles, tasa_429=args.tasa_429, tasa_5xx=args.tasa_5xx,
+                            retry_after=args.retry_after, semilla=args.semilla, subida_kbps=args.subida_kbps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor simulado de Azure Speech/Translator")
+    parser.add_argument("--puerto", type=int, default=8765)
+    añadir_argumentos(parser)
+    args = parser.parse_args()
+
+    servidor = crear_desde_argumentos(args, args.puerto).iniciar()
+    print(f"🧪 Azure simulado en {servidor.url}")
+    for nombre, valor in servidor.variables_entorno().items():
+        print(f"   {nombre}={valor}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.detener()
@@ -1,4 +1,6 @@
 import streamlit as st
+from utils.audio import liberar_audio, tipo_audio
+from utils.audio_temporal import AudioTemporal
 
 class AudioInput:
     @staticmethod
@@ -25,41 +27,69 @@ class AudioInput:
         """Maneja la subida de archivos de audio"""
         with st.expander("ℹ️ Formatos soportados"):
             st.write("""
-            **WAV** (recomendado), **WEBM**, **MP3**
-            - Frecuencia: 16kHz
-            - Canales: Mono
-            - Duración: < 60 segundos
+            **WAV** (recomendado), **WEBM**, **MP3**, **OGG/Opus**
+            - Frecuencia y canales: cualquiera (se convierte a 16kHz mono)
+            - Duración: sin límite (los WAV largos se transcriben por fragmentos)
             """)
 
         archivo = st.file_uploader(
             "Selecciona archivo de audio", 
-            type=['wav', 'webm', 'mp3'],
-            help="Formatos: WAV, WEBM, MP3"
+            type=['wav', 'webm', 'mp3', 'ogg', 'opus'],
+            help="Formatos: WAV, WEBM, MP3, OGG/Opus"
         )
 
         if archivo is not None:
-            audio_bytes = archivo.read()
-            st.audio(audio_bytes, format=f"audio/{archivo.name.split('.')[-1]}")
-            st.write(f"**Archivo:** {archivo.name} ({len(audio_bytes) / 1024:.1f} KB)")
-            return audio_bytes, archivo.name
+            audio = AudioInput._a_temporal(archivo, archivo.name, 'audio_subido')
+            AudioInput._vista_previa(audio)
+            st.write(f"**Archivo:** {archivo.name} ({len(audio) / 1024:.1f} KB)")
+            return audio, archivo.name
 
         return None, "audio_procesado.wav"
 
     @staticmethod
     def _grabar_audio():
         """Maneja la grabación directa de audio"""
-        st.write("**Presiona para grabar (máximo 60 segundos):**")
+        st.write("**Presiona para grabar:**")
 
         try:
             grabacion = st.audio_input("Grabar audio")
             if grabacion is not None:
-                audio_bytes = grabacion.read()
-                st.audio(audio_bytes, format="audio/wav")
+                audio = AudioInput._a_temporal(grabacion, "audio_grabado.wav", 'audio_grabado')
+                AudioInput._vista_previa(audio)
                 st.success("✅ Audio grabado correctamente")
-                st.write(f"**Tamaño:** {len(audio_bytes) / 1024:.1f} KB")
-                return audio_bytes, "audio_grabado.wav"
+                st.write(f"**Tamaño:** {len(audio) / 1024:.1f} KB")
+                return audio, "audio_grabado.wav"
         except Exception as e:
             st.warning("⚠️ Grabación no disponible")
             st.info("Usa la opción 'Subir archivo'")
 
-        return None, "audio_grabado.wav"
\ No newline at end of file
+        return None, "audio_grabado.wav"
+
+    @staticmethod
+    def _a_temporal(archivo, nombre, clave_sesion):
+        """
+        Copia el audio de Streamlit a un AudioTemporal por bloques, una vez por fichero
+
+        Se guarda en la sesión para que los reruns no vuelvan a copiarlo; la
+        interfaz nunca tiene el audio entero en un objeto bytes. Al cambiar de
+        fichero se libera el temporal del anterior.
+        """
+        identificador = getattr(archivo, "file_id", None) or (archivo.name, archivo.size)
+        guardado = st.session_state.get(clave_sesion)
+        if guardado and guardado[0] == identificador:
+            return guardado[1]
+        if guardado:
+            liberar_audio(guardado[1])
+
+        archivo.seek(0)
+        audio = AudioTemporal.desde_fichero(archivo, nombre)
+        st.session_state[clave_sesion] = (identificador, audio)
+        return audio
+
+    @staticmethod
+    def _vista_previa(audio):
+        """Reproductor solo para audios pequeños: st.audio copia el audio entero en memoria"""
+        if audio.en_disco:
+            st.caption("🔇 Sin vista previa: el audio es grande y se procesa desde disco")
+        else:
+            st.audio(audio.leer(), format=tipo_audio(audio)[0])
\ No newline at end of file
@@ -0,0 +1,188 @@
+import os
+import json
+from urllib.parse import urlencode
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from components import streamlit_adapter
+from components.history_manager import obtener_historial
+from services.conversacion import CONVERSACION_PORT, emitir_token, iniciar_servidor_conversacion
+
+# URL pública del websocket si el navegador no llega al puerto directamente (proxy, https...)
+CONVERSACION_URL = os.environ.get("CONVERSACION_URL")
+
+@st.cache_resource
+def obtener_servidor_conversacion():
+    """Un servidor websocket por proceso, con los mismos servicios que la interfaz"""
+    speech_service, translation_service = streamlit_adapter.obtener_servicios()
+    return iniciar_servidor_conversacion(
+        int(CONVERSACION_PORT), obtener_historial(), speech_service, translation_service
+    )
+
+class ConversacionNavegador:
+    @staticmethod
+    def disponible():
+        """El modo conversación solo se ofrece si CONVERSACION_PORT está definido"""
+        return bool(CONVERSACION_PORT)
+
+    @staticmethod
+    def mostrar(config_origen, config_destino):
+        """Micrófono en directo: cada enunciado se traduce y se reproduce al terminar"""
+        obtener_servidor_conversacion()
+        st.info("🗣️ Habla con normalidad: cada frase se traduce en cuanto haces una pausa")
+
+        sesion = st.session_state.get('sesion_historial', "")
+        parametros = {
+            'origen': config_origen['idioma_stt'],
+            'destino': config_destino['idioma'],
+            'voz': config_destino['voz'],
+            'formato': config_destino.get('formato') or "",
+            'deteccion': "1" if config_origen['deteccion_automatica'] else "0",
+            'sesion': sesion,
+            # Sin un token de esta sesión el servidor rechaza la conexión
+            'token': emitir_token(sesion)
+        }
+        html = _PLANTILLA.replace("__CONFIG__", json.dumps({
+            'url': CONVERSACION_URL,
+            'puerto': int(CONVERSACION_PORT),
+            'parametros': urlencode(parametros)
+        }))
+        components.html(html, height=460, scrolling=True)
+        st.caption("Para una conversación a dos bandas, el interlocutor abre la app con los idiomas invertidos")
+
+_PLANTILLA = """
+<div style="font-family: sans-serif">
+  <button id="boton" style="padding: 0.5em 1em; font-size: 1em">▶️ Empezar conversación</button>
+  <label style="margin-left: 1em">
+    <input type="checkbox" id="silenciar" checked> Silenciar el micrófono mientras suena la traducción
+  </label>
+  <p id="estado">🎙️ Pulsa para empezar</p>
+  <div id="registro"></div>
+</div>
+<script>
+const CONFIG = __CONFIG__;
+const FRECUENCIA = 16000;
+const MUESTRAS_BLOQUE = 320;          // 20 ms a 16 kHz
+const MAX_BYTES_PENDIENTES = 64000;   // si el servidor no da abasto se descartan bloques
+
+const WORKLET = `class Captura extends AudioWorkletProcessor {
+  process(entradas) {
+    const canal = entradas[0][0];
+    if (canal) this.port.postMessage(canal.slice(0));
+    return true;
+  }
+}
+registerProcessor("captura", Captura);`;
+
+let ws = null, contexto = null, flujo = null, reproduciendo = false, descartados = 0;
+const colaAudio = [];
+const boton = document.getElementById("boton");
+const estado = document.getElementById("estado");
+const registro = document.getElementById("registro");
+
+function urlServidor() {
+  if (CONFIG.url) return CONFIG.url + "?" + CONFIG.parametros;
+  let host = "localhost", protocolo = "ws";
+  try {
+    host = window.parent.location.hostname || host;
+    if (window.parent.location.protocol === "https:") protocolo = "wss";
+  } catch (e) {}
+  return `${protocolo}://${host}:${CONFIG.puerto}/?${CONFIG.parametros}`;
+}
+
+function crearDiezmador(frecuenciaEntrada) {
+  // Media por grupos (filtro de caja) con paso fraccionario: 44.1/48 kHz -> 16 kHz
+  const paso = frecuenciaEntrada / FRECUENCIA;
+  let suma = 0, cuenta = 0, fase = 0;
+  let bloque = new Int16Array(MUESTRAS_BLOQUE), llenas = 0;
+  return function (entrada, enviar) {
+    for (let i = 0; i < entrada.length; i++) {
+      suma += entrada[i]; cuenta++; fase += 1;
+      if (fase >= paso) {
+        fase -= paso;
+        const m = Math.max(-1, Math.min(1, suma / cuenta));
+        bloque[llenas++] = m * 32767;
+        suma = 0; cuenta = 0;
+        if (llenas === MUESTRAS_BLOQUE) {
+          enviar(bloque.buffer);
+          bloque = new Int16Array(MUESTRAS_BLOQUE); llenas = 0;
+        }
+      }
+    }
+  };
+}
+
+function reproducirSiguiente() {
+  if (reproduciendo || colaAudio.length === 0) return;
+  reproduciendo = true;
+  const siguiente = colaAudio.shift();
+  const audio = new Audio(`data:${siguiente.mime};base64,${siguiente.audio}`);
+  audio.onended = audio.onerror = () => { reproduciendo = false; reproducirSiguiente(); };
+  audio.play().catch(() => { reproduciendo = false; reproducirSiguiente(); });
+}
+
+function mostrarEvento(evento) {
+  if (evento.tipo === "enunciado") {
+    estado.textContent = `⏳ Traduciendo frase ${evento.id + 1}...`;
+    return;
+  }
+  const linea = document.createElement("p");
+  if (evento.error) {
+    linea.textContent = `❌ ${evento.error}`;
+  } else {
+    const original = document.createElement("div");
+    original.textContent = `🗣️ ${evento.texto_original}`;
+    const traducido = document.createElement("div");
+    traducido.textContent = `🌐 ${evento.texto_traducido}  (${Math.round(evento.latencia * 1000)} ms)`;
+    linea.append(original, traducido);
+    if (evento.audio) { colaAudio.push(evento); reproducirSiguiente(); }
+  }
+  registro.prepend(linea);
+  estado.textContent = "🎙️ Escuchando...";
+}
+
+async function empezar() {
+  flujo = await navigator.mediaDevices.getUserMedia({
+    audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+  });
+  contexto = new AudioContext();
+  await contexto.audioWorklet.addModule(URL.createObjectURL(new Blob([WORKLET], { type: "text/javascript" })));
+  const captura = new AudioWorkletNode(contexto, "captura");
+  const diezmar = crearDiezmador(contexto.sampleRate);
+
+  ws = new WebSocket(urlServidor());
+  ws.binaryType = "arraybuffer";
+  ws.onmessage = (mensaje) => mostrarEvento(JSON.parse(mensaje.data));
+  ws.onclose = () => { parar(false); estado.textContent = "⏹️ Conversación terminada"; };
+  ws.onerror = () => { estado.textContent = "❌ No se pudo conectar con el servidor de conversación"; };
+
+  captura.port.onmessage = (mensaje) => {
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    if (reproduciendo && document.getElementById("silenciar").checked) return;
+    diezmar(mensaje.data, (bloque) => {
+      if (ws.bufferedAmount > MAX_BYTES_PENDIENTES) { descartados++; return; }
+      ws.send(bloque);
+    });
+  };
+  contexto.createMediaStreamSource(flujo).connect(captura);
+  boton.textContent = "⏹️ Terminar";
+  estado.textContent = "🎙️ Escuchando...";
+}
+
+function parar(avisarServidor) {
+  if (flujo) flujo.getTracks().forEach((pista) => pista.stop());
+  if (contexto) contexto.close();
+  flujo = null; contexto = null;
+  // "fin": el servidor procesa la última frase y cierra la conexión
+  if (avisarServidor && ws && ws.readyState === WebSocket.OPEN) ws.send("fin");
+  boton.textContent = "▶️ Empezar conversación";
+  if (descartados) estado.textContent = `⚠️ ${descartados} bloques de audio descartados por saturación`;
+}
+
+boton.onclick = () => {
+  if (flujo) { parar(true); return; }
+  empezar().catch((e) => { estado.textContent = "❌ " + e.message; });
+};
+</script>
+"""
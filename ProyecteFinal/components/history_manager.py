@@ -1,46 +1,114 @@
+import io
+import os
+import uuid
+import tempfile
+import importlib.util
 import streamlit as st
-import pandas as pd
 from datetime import datetime
+from services.historial import HistorialSQLite, crear_registro
+
+# Filas por página en la tabla del historial
+FILAS_POR_PAGINA = 20
+
+# Extensión y tipo MIME de cada formato de exportación
+FORMATOS_EXPORTACION = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet")
+}
+
+# Con HISTORY_COMPARTIDO=1 se muestra el historial de todas las sesiones (equipo)
+HISTORIAL_COMPARTIDO = os.environ.get("HISTORY_COMPARTIDO") == "1"
+
+@st.cache_resource
+def obtener_historial():
+    """Un único almacén de historial por proceso, compartido por las sesiones"""
+    return HistorialSQLite()
+
+@st.cache_data(ttl=600, max_entries=4, show_spinner="Preparando descarga...")
+def _exportacion(_historial, formato, sesion, total):
+    """
+    Exportación del historial en bytes, escrita por lotes sobre un temporal
+
+    total (filas del historial) forma parte de la clave: al guardar otra
+    traducción se regenera en lugar de servir una exportación antigua.
+    """
+    with tempfile.TemporaryFile() as destino:
+        if formato == "Parquet":
+            _historial.exportar_parquet(destino, sesion=sesion)
+        else:
+            texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+            _historial.exportar_csv(texto, sesion=sesion)
+            texto.flush()
+            texto.detach()
+        destino.seek(0)
+        return destino.read()
 
 class HistoryManager:
-    def __init__(self):
-        if 'historial_traducciones' not in st.session_state:
-            st.session_state.historial_traducciones = []
+    def __init__(self, historial=None):
+        self.historial = historial or obtener_historial()
+        # En la sesión solo se guarda su identificador, no las filas
+        if 'sesion_historial' not in st.session_state:
+            st.session_state.sesion_historial = uuid.uuid4().hex
 
     def guardar_traduccion(self, audio_nombre, texto_original, texto_traducido,
                          config_origen, config_destino):
         """Guarda una traducción en el historial (AMPLIACIÓN)"""
-        traduccion_info = {
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'audio_original': audio_nombre,
-            'idioma_origen': config_origen.get('idioma_detectado', config_origen['idioma_stt']),
-            'texto_original': texto_original,
-            'idioma_destino': config_destino['idioma'],
-            'texto_traducido': texto_traducido,
-            'voz_destino': config_destino['voz']
-        }
-        
-        st.session_state.historial_traducciones.append(traduccion_info)
+        traduccion_info = self.crear_registro(
+            audio_nombre, texto_original, texto_traducido,
+            config_origen, config_destino
+        )
+
+        self.historial.guardar(traduccion_info, sesion=st.session_state.sesion_historial)
+
+    # Fila del historial (también la usa el modo batch, sin Streamlit)
+    crear_registro = staticmethod(crear_registro)
 
     def mostrar_historial(self):
-        """Muestra el historial y opción de descarga CSV (AMPLIACIÓN)"""
-        if st.session_state.historial_traducciones:
+        """Muestra el historial paginado y opción de descarga CSV/Parquet (AMPLIACIÓN)"""
+        sesion = None if HISTORIAL_COMPARTIDO else st.session_state.sesion_historial
+        total = self.historial.contar(sesion=sesion)
+        if total:
             st.markdown("---")
             st.subheader("📊 Historial de Traducciones")
-            
-            # Mostrar tabla resumida
-            historial_df = pd.DataFrame(st.session_state.historial_traducciones[::-1])
+
+            # Mostrar tabla resumida (solo la página visible)
+            paginas = (total + FILAS_POR_PAGINA - 1) // FILAS_POR_PAGINA
+            pagina = 1
+            if paginas > 1:
+                pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1)
+            registros = self.historial.pagina(pagina - 1, FILAS_POR_PAGINA, sesion=sesion)
             st.dataframe(
-                historial_df[['timestamp', 'idioma_origen', 'idioma_destino', 'texto_original']],
+                [
+                    {
+                        'timestamp': r.timestamp,
+                        'idioma_origen': r.idioma_origen,
+                        'idioma_destino': r.idioma_destino,
+                        'texto_original': r.texto_original
+                    }
+                    for r in registros
+                ],
                 use_container_width=True
             )
-            
-            # Botón descarga CSV
-            csv = historial_df.to_csv(index=False)
-            st.download_button(
-                "📥 Descargar Historial (CSV)",
-                csv,
-                f"historial_traducciones_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                "text/csv",
-                use_container_width=True
-            )
\ No newline at end of file
+            st.caption(f"{total} traducciones")
+
+            # La exportación se genera bajo demanda y por lotes; en la sesión solo
+            # se guarda el formato pedido, los datos quedan en la caché de Streamlit
+            col1, col2 = st.columns([1, 2])
+            with col1:
+                formato = st.selectbox("Formato", list(FORMATOS_EXPORTACION), label_visibility="collapsed")
+            extension, mime = FORMATOS_EXPORTACION[formato]
+            with col2:
+                if formato == "Parquet" and importlib.util.find_spec("pyarrow") is None:
+                    st.warning("⚠️ Para exportar a Parquet instala pyarrow: pip install pyarrow")
+                    return
+                if st.button("📦 Preparar descarga", use_container_width=True):
+                    st.session_state.formato_exportacion = formato
+
+            if st.session_state.get('formato_exportacion') == formato:
+                st.download_button(
+                    f"📥 Descargar Historial ({extension.upper()})",
+                    _exportacion(self.historial, formato, sesion, total),
+                    f"historial_traducciones_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}",
+                    mime,
+                    use_container_width=True
+                )
@@ -0,0 +1,129 @@
+import streamlit as st
+from services.speech_service import FORMATOS_TTS
+from services.translation_service import CONFIANZA_MINIMA_DETECCION, IDIOMAS_DESTINO, IDIOMAS_STT
+from utils.config import obtener_config
+
+DESCRIPCION_FORMATOS = {
+    "mp3": "MP3 128 kbit/s (máxima compatibilidad)",
+    "mp3-32k": "MP3 32 kbit/s",
+    "opus": "Opus (Ogg, 16 kHz)",
+    "opus-24k": "Opus 24 kbit/s (WebM, para conexiones lentas)"
+}
+
+class LanguageSelector:
+    @staticmethod
+    def configurar_idioma_origen():
+        """Configuración del idioma de origen con detección automática"""
+        st.subheader("🎤 Configuración Entrada")
+
+        deteccion_automatica = st.checkbox(
+            "🔍 Detectar idioma automáticamente",
+            value=True,
+            help="El sistema detectará automáticamente el idioma del audio"
+        )
+
+        if deteccion_automatica:
+            st.info("🌐 El idioma se detectará automáticamente")
+            # Se parte del último idioma detectado en la sesión (por defecto español)
+            idioma_stt = st.session_state.get('idioma_stt_previo', "es-ES")
+            idioma_traduccion = idioma_stt.split('-')[0]
+        else:
+            idioma_stt = st.selectbox(
+                "Idioma del audio original:",
+                IDIOMAS_STT
+            )
+            # Extraer código simple para traducción (es-ES → es)
+            idioma_traduccion = idioma_stt.split('-')[0]
+
+        return {
+            'deteccion_automatica': deteccion_automatica,
+            'idioma_stt': idioma_stt,
+            'idioma_traduccion': idioma_traduccion,
+            'idioma_detectado': None
+        }
+
+    @staticmethod
+    def configurar_idioma_destino(translation_service):
+        """Configuración del idioma de destino"""
+        st.subheader("🌍 Configuración Salida")
+
+        if st.checkbox("🌐 Traducir a varios idiomas", help="Se transcribe una vez y se genera voz en cada idioma"):
+            return LanguageSelector._configurar_varios_destinos(translation_service)
+
+        idioma_destino = st.selectbox(
+            "Idioma de destino:",
+            IDIOMAS_DESTINO
+        )
+
+        voz = st.selectbox(
+            "Voz para audio:",
+            translation_service.voces_por_idioma.get(idioma_destino, ["es-ES-ElviraNeural"])
+        )
+
+        return {
+            'idioma': idioma_destino,
+            'voz': voz,
+            'formato': LanguageSelector._seleccionar_formato()
+        }
+
+    @staticmethod
+    def _seleccionar_formato():
+        """Formato y tasa de bits del audio traducido (Opus pesa mucho menos que MP3)"""
+        formatos = list(FORMATOS_TTS)
+        por_defecto = obtener_config("TTS_FORMATO", "mp3")
+        return st.selectbox(
+            "🎧 Formato del audio:",
+            formatos,
+            index=formatos.index(por_defecto) if por_defecto in formatos else 0,
+            format_func=lambda formato: DESCRIPCION_FORMATOS.get(formato, formato)
+        )
+
+    @staticmethod
+    def _configurar_varios_destinos(translation_service):
+        """Varios idiomas destino, cada uno con su voz"""
+        idiomas = st.multiselect("Idiomas de destino:", IDIOMAS_DESTINO, default=["en", "fr", "de"])
+        destinos = []
+        with st.expander("🔊 Voces"):
+            for idioma in idiomas:
+                voz = st.selectbox(
+                    f"Voz ({idioma}):",
+                    translation_service.voces_por_idioma.get(idioma, ["es-ES-ElviraNeural"]),
+                    key=f"voz_destino_{idioma}"
+                )
+                destinos.append({'idioma': idioma, 'voz': voz})
+
+        if not destinos:
+            st.warning("⚠️ Selecciona al menos un idioma")
+            destinos = [{'idioma': "en", 'voz': translation_service.voces_por_idioma["en"][0]}]
+
+        # El primer destino rellena idioma/voz para el resto de la aplicación
+        return {
+            'idioma': destinos[0]['idioma'],
+            'voz': destinos[0]['voz'],
+            'formato': LanguageSelector._seleccionar_formato(),
+            'destinos': destinos
+        }
+
+    @staticmethod
+    def detectar_idioma_audio(audio_bytes, config_origen, translation_service, speech_service):
+        """
+        Detecta el idioma del audio antes de la transcripción completa
+
+        Solo se transcribe un prefijo corto del audio, así el audio completo se
+        sube una única vez ya con el idioma correcto.
+
+        Returns:
+            (texto, config_origen): texto es la transcripción completa si el prefijo
+            ya cubría todo el audio, o None si falta transcribirlo
+        """
+        st.write("**🔍 Detectando idioma...**")
+        idioma_stt, idioma_detectado, confianza, texto = translation_service.identificar_idioma_audio(
+            audio_bytes, speech_service, config_origen['idioma_stt']
+        )
+
+        if idioma_detectado and confianza > CONFIANZA_MINIMA_DETECCION:
+            st.success(f"🌐 Idioma detectado: **{idioma_detectado}** ({confianza:.1%})")
+            # Recordar el idioma como punto de partida para la siguiente grabación
+            st.session_state['idioma_stt_previo'] = idioma_stt
+
+        return texto, translation_service.aplicar_idioma(config_origen, idioma_stt, idioma_detectado)
@@ -0,0 +1,43 @@
+"""
+Capa fina entre la interfaz Streamlit y los servicios
+
+Los servicios (services/, utils/) no importan Streamlit: reciben la
+configuración por parámetro o la leen con utils.config, y cachean con
+cache_persistente. Aquí se conecta lo propio de la interfaz: st.secrets como
+fuente de claves, una instancia de cada servicio por proceso y la caché de
+sesión de Streamlit con sus spinners.
+"""
+import streamlit as st
+from services.speech_service import SpeechService
+from services.translation_service import TranslationService
+from utils.audio_temporal import AudioTemporal
+from utils.config import registrar_fuente_config
+
+# Streamlit identifica los audios en disco por su huella en lugar de leer y hashear su contenido
+HASH_AUDIO = {AudioTemporal: lambda audio: audio.huella}
+
+
+def _leer_secreto(nombre):
+    return st.secrets.get(nombre)
+
+
+@st.cache_resource
+def obtener_servicios():
+    """Registra st.secrets como fuente de claves y crea los servicios una sola vez"""
+    registrar_fuente_config(_leer_secreto)
+    return SpeechService(), TranslationService()
+
+
+@st.cache_data(ttl=3600, show_spinner="Transcribiendo audio...", hash_funcs=HASH_AUDIO)
+def transcribir_audio(_speech_service, audio_bytes, idioma):
+    return _speech_service.transcribir_audio(audio_bytes, idioma)
+
+
+@st.cache_data(ttl=3600, show_spinner="Traduciendo texto...")
+def traducir_texto(_translation_service, texto, idioma_origen, idioma_destino):
+    return _translation_service.traducir_texto(texto, idioma_origen, idioma_destino)
+
+
+@st.cache_data(ttl=3600, show_spinner="Generando audio...")
+def sintetizar_voz(_speech_service, texto, voz, formato=None):
+    return _speech_service.sintetizar_voz(texto, voz, formato)
@@ -0,0 +1,375 @@
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+import argparse
+import threading
+from http import HTTPStatus
+from typing import AsyncIterable, AsyncIterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+from utils.audio import FRECUENCIA_STT, decodificar_audio, float_a_pcm16, leer_wav, remuestrear, tipo_audio
+from utils.metrics import metricas, servir_metricas
+from utils.segmentador import SegmentadorVoz
+
+CONVERSACION_PORT = os.environ.get("CONVERSACION_PORT")
+# Por defecto solo se escucha en local; para otros equipos (Docker, proxy) CONVERSACION_HOST=0.0.0.0
+CONVERSACION_HOST = os.environ.get("CONVERSACION_HOST", "127.0.0.1")
+# Orígenes web admitidos, separados por comas (por defecto, el mismo host que el websocket)
+CONVERSACION_ORIGENES = {
+    origen.strip().rstrip("/") for origen in os.environ.get("CONVERSACION_ORIGENES", "").split(",") if origen.strip()
+}
+# Validez de los tokens con los que la interfaz autoriza cada conexión
+CONVERSACION_TOKEN_TTL = int(os.environ.get("CONVERSACION_TOKEN_TTL", "3600"))
+# Secreto con el que se firman los tokens; solo hace falta fijarlo si el servidor corre en otro proceso
+_SECRETO = (os.environ.get("CONVERSACION_SECRETO") or secrets.token_hex(32)).encode()
+
+# Bloques de audio del micrófono: PCM 16 bits mono a 16 kHz, ~20 ms cada uno
+BLOQUE_MS = 20
+# Tamaño máximo de un mensaje del websocket (un bloque son 640 bytes)
+MAX_BYTES_MENSAJE = 64 * 1024
+
+
+class ConversacionEnVivo:
+    """
+    Modo conversación: traduce cada enunciado en cuanto el hablante hace una pausa
+
+    Consume un flujo de bloques PCM (micrófono por websocket o un WAV simulado),
+    los pasa por el SegmentadorVoz y envía cada enunciado terminado a la
+    PipelineTraduccion sin esperar a que acabe el flujo. Los resultados se
+    entregan en el orden en que se habló.
+
+    Como mucho hay max_en_vuelo enunciados entre el corte y la entrega; si se
+    alcanza ese límite deja de leerse audio, de modo que la presión llega hasta
+    el cliente en lugar de acumularse en memoria.
+
+    Eventos que produce procesar():
+        {"tipo": "enunciado", "id", "inicio", "fin"} al detectar el fin de un enunciado
+        {"tipo": "resultado", "id", "inicio", "fin", "texto_original", "texto_traducido",
+         "audio_resultado", "traducciones", "error", "latencia"} al terminar de procesarlo
+    """
+
+    def __init__(self, pipeline, config_origen: dict, config_destino: dict,
+                 max_en_vuelo: int = 4, segmentador: Optional[SegmentadorVoz] = None):
+        self.pipeline = pipeline
+        self.config_origen = config_origen
+        self.config_destino = config_destino
+        self.max_en_vuelo = max_en_vuelo
+        self.segmentador = segmentador or SegmentadorVoz()
+
+    async def procesar(self, bloques: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+        semaforos = self.pipeline.crear_semaforos()
+        en_vuelo = asyncio.Semaphore(self.max_en_vuelo)
+        eventos = asyncio.Queue()
+        productor = asyncio.create_task(self._producir(bloques, semaforos, en_vuelo, eventos))
+
+        pendientes = {}
+        siguiente = 0
+        try:
+            while True:
+                evento = await eventos.get()
+                if evento is None:
+                    break
+                if evento["tipo"] != "resultado":
+                    yield evento
+                    continue
+
+                # Entrega en orden: un enunciado corto no adelanta a uno largo anterior
+                pendientes[evento["id"]] = evento
+                while siguiente in pendientes:
+                    yield pendientes.pop(siguiente)
+                    siguiente += 1
+                    en_vuelo.release()
+            await productor
+        finally:
+            productor.cancel()
+
+    async def _producir(self, bloques, semaforos, en_vuelo, eventos):
+        """Lee el audio, corta enunciados y lanza su procesamiento"""
+        tareas = set()
+        contador = 0
+        try:
+            async for bloque in bloques:
+                for enunciado in self.segmentador.añadir(bloque):
+                    await en_vuelo.acquire()
+                    tarea = self._lanzar(contador, enunciado, semaforos, eventos)
+                    tareas.add(tarea)
+                    tarea.add_done_callback(tareas.discard)
+                    contador += 1
+            for enunciado in self.segmentador.terminar():
+                await en_vuelo.acquire()
+                tareas.add(self._lanzar(contador, enunciado, semaforos, eventos))
+                contador += 1
+            await asyncio.gather(*tareas)
+        finally:
+            for tarea in list(tareas):
+                tarea.cancel()
+            eventos.put_nowait(None)
+
+    def _lanzar(self, id_enunciado, enunciado, semaforos, eventos) -> asyncio.Task:
+        # Fin de la voz en tiempo de reloj: el segmentador lo detecta con el retraso del silencio final
+        fin_voz = time.perf_counter() - (self.segmentador.posicion - enunciado["fin"])
+        datos = {"id": id_enunciado, "inicio": enunciado["inicio"], "fin": enunciado["fin"]}
+        eventos.put_nowait({"tipo": "enunciado", **datos})
+        trabajo = {
+            **datos,
+            "audio_nombre": f"conversacion_{id_enunciado}.wav",
+            "audio_bytes": enunciado["audio"],
+            "config_origen": self.config_origen,
+            "config_destino": self.config_destino
+        }
+        return asyncio.create_task(self._procesar_enunciado(trabajo, semaforos, eventos, fin_voz))
+
+    async def _procesar_enunciado(self, trabajo, semaforos, eventos, fin_voz):
+        try:
+            resultado = await self.pipeline.procesar_trabajo(trabajo, semaforos)
+        except Exception as e:
+            resultado = {"error": f"Error: {e}"}
+
+        latencia = time.perf_counter() - fin_voz
+        metricas.observar("conversacion_latencia_segundos", latencia)
+        eventos.put_nowait({
+            "tipo": "resultado",
+            "id": trabajo["id"],
+            "inicio": trabajo["inicio"],
+            "fin": trabajo["fin"],
+            "config_origen": resultado.get("config_origen", trabajo["config_origen"]),
+            "texto_original": resultado.get("texto_original"),
+            "texto_traducido": resultado.get("texto_traducido"),
+            "audio_resultado": resultado.get("audio_resultado"),
+            "traducciones": resultado.get("traducciones"),
+            "error": resultado.get("error"),
+            "latencia": latencia
+        })
+
+
+async def bloques_desde_wav(audio_bytes: bytes, bloque_ms: int = BLOQUE_MS, ritmo: float = 1.0):
+    """
+    Simula un micrófono a partir de un WAV: bloques PCM 16 bits mono a 16 kHz
+
+    Con ritmo=1.0 los bloques llegan en tiempo real; con ritmo=0 tan rápido
+    como se consuman. Los WAV con otro formato se convierten antes.
+    """
+    params, frames = leer_wav(audio_bytes)
+    if (params.nchannels, params.sampwidth, params.framerate) != (1, 2, FRECUENCIA_STT):
+        muestras, sample_rate = decodificar_audio(audio_bytes)
+        frames = float_a_pcm16(remuestrear(muestras, sample_rate, FRECUENCIA_STT))
+
+    tamaño = FRECUENCIA_STT * bloque_ms // 1000 * 2
+    inicio = time.perf_counter()
+    for i, posicion in enumerate(range(0, len(frames), tamaño)):
+        if ritmo > 0:
+            espera = inicio + i * bloque_ms / 1000 / ritmo - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+        yield frames[posicion: posicion + tamaño]
+
+
+def configuracion_desde_parametros(parametros: dict):
+    """
+    Configuración de idiomas a partir de la URL del websocket
+
+    ?origen=es-ES&destino=en&voz=en-US-JennyNeural[&formato=opus-24k][&deteccion=1][&sesion=...]
+    """
+    def valor(nombre, default=None):
+        return parametros.get(nombre, [default])[0]
+
+    idioma_stt, idioma_destino, voz = valor("origen"), valor("destino"), valor("voz")
+    if not idioma_stt or not idioma_destino or not voz:
+        raise ValueError("Faltan parámetros: origen, destino y voz son obligatorios")
+
+    config_origen = {
+        'deteccion_automatica': valor("deteccion") == "1",
+        'idioma_stt': idioma_stt,
+        'idioma_traduccion': idioma_stt.split('-')[0],
+        'idioma_detectado': None
+    }
+    config_destino = {'idioma': idioma_destino, 'voz': voz}
+    if valor("formato"):
+        config_destino['formato'] = valor("formato")
+    return config_origen, config_destino
+
+
+def emitir_token(sesion: str = "") -> str:
+    """Token firmado que autoriza a abrir una conexión para esa sesión durante CONVERSACION_TOKEN_TTL"""
+    caduca = int(time.time()) + CONVERSACION_TOKEN_TTL
+    return f"{caduca}.{_firmar(caduca, sesion)}"
+
+
+def verificar_token(token: Optional[str], sesion: str = "") -> bool:
+    caduca, _, firma = (token or "").partition(".")
+    if not caduca.isdigit() or int(caduca) < time.time():
+        return False
+    return hmac.compare_digest(firma, _firmar(int(caduca), sesion))
+
+
+def _firmar(caduca: int, sesion: str) -> str:
+    return hmac.new(_SECRETO, f"{caduca}:{sesion}".encode(), hashlib.sha256).hexdigest()
+
+
+def origen_permitido(origen: Optional[str], host: Optional[str]) -> bool:
+    """
+    Comprueba la cabecera Origin de la petición websocket
+
+    Los navegadores siempre la envían, así que una página de otro sitio no
+    puede abrir la conexión. Se admiten los orígenes de CONVERSACION_ORIGENES
+    o, si no se indican, los del mismo host que el websocket (la interfaz
+    está en el mismo equipo con otro puerto). Sin Origin (clientes que no son
+    navegadores) basta con el token.
+    """
+    if origen is None:
+        return True
+    origen = origen.rstrip("/")
+    if CONVERSACION_ORIGENES:
+        return origen in CONVERSACION_ORIGENES
+    return bool(host) and urlparse(origen).hostname == urlparse(f"//{host}").hostname
+
+
+def evento_a_json(evento: dict) -> str:
+    """Serializa un evento para el navegador (el audio va en base64 con su tipo MIME)"""
+    datos = {clave: valor for clave, valor in evento.items() if clave not in ("audio_resultado", "config_origen")}
+    if evento.get("audio_resultado"):
+        datos["audio"] = base64.b64encode(evento["audio_resultado"]).decode("ascii")
+        datos["mime"] = tipo_audio(evento["audio_resultado"])[0]
+    if evento.get("traducciones"):
+        datos["traducciones"] = [
+            {clave: t[clave] for clave in ("idioma", "voz", "texto", "error")}
+            for t in evento["traducciones"]
+        ]
+    return json.dumps(datos, ensure_ascii=False)
+
+
+class ServidorConversacion(threading.Thread):
+    """
+    Servidor websocket del modo conversación, en un hilo con su propio event loop
+
+    Cada conexión es un hablante en una dirección (origen → destino): el
+    navegador envía bloques PCM binarios y recibe un JSON por evento. Para una
+    conversación a dos bandas cada interlocutor abre su propia conexión con
+    los idiomas invertidos. Si la URL incluye sesion=..., los enunciados
+    traducidos se guardan en el historial de esa sesión.
+
+    Solo se aceptan conexiones con un token=... de emitir_token() para esa
+    sesión y, desde un navegador, con un Origin permitido.
+    """
+
+    def __init__(self, pipeline, puerto: int, host: str = CONVERSACION_HOST, historial=None,
+                 max_en_vuelo: int = 4):
+        super().__init__(daemon=True, name="servidor-conversacion")
+        self.pipeline = pipeline
+        self.puerto = puerto
+        self.host = host
+        self.historial = historial
+        self.max_en_vuelo = max_en_vuelo
+        self.listo = threading.Event()
+
+    def run(self):
+        asyncio.run(self._servir())
+
+    async def _servir(self):
+        try:
+            from websockets.asyncio.server import serve
+        except ImportError:
+            print("❌ El modo conversación necesita el paquete websockets: pip install websockets")
+            raise
+
+        # max_queue acota los mensajes recibidos sin leer: al llenarse se deja de leer el socket
+        async with serve(self._atender, self.host, self.puerto, process_request=self._autorizar,
+                         max_size=MAX_BYTES_MENSAJE, max_queue=32):
+            self.listo.set()
+            await asyncio.Future()
+
+    def _autorizar(self, conexion, peticion):
+        """Rechaza el handshake (403) si falta el token o el origen no está permitido"""
+        parametros = parse_qs(urlparse(peticion.path).query)
+        if not origen_permitido(peticion.headers.get("Origin"), peticion.headers.get("Host")):
+            metricas.incrementar("conversacion_rechazos_total", motivo="origen")
+            return conexion.respond(HTTPStatus.FORBIDDEN, "Origen no permitido\n")
+        if not verificar_token(parametros.get("token", [None])[0], parametros.get("sesion", [""])[0]):
+            metricas.incrementar("conversacion_rechazos_total", motivo="token")
+            return conexion.respond(HTTPStatus.FORBIDDEN, "Token no válido o caducado\n")
+        return None
+
+    async def _atender(self, conexion):
+        from websockets.exceptions import ConnectionClosed
+
+        parametros = parse_qs(urlparse(conexion.request.path).query)
+        try:
+            config_origen, config_destino = configuracion_desde_parametros(parametros)
+        except ValueError as e:
+            await conexion.close(1008, str(e))
+            return
+        sesion = parametros.get("sesion", [None])[0]
+
+        async def bloques():
+            async for mensaje in conexion:
+                if isinstance(mensaje, bytes):
+                    yield mensaje
+                elif mensaje == "fin":
+                    return
+
+        conversacion = ConversacionEnVivo(self.pipeline, config_origen, config_destino, self.max_en_vuelo)
+        metricas.incrementar("conversacion_conexiones_total")
+        try:
+            async for evento in conversacion.procesar(bloques()):
+                await conexion.send(evento_a_json(evento))
+                if evento["tipo"] == "resultado" and not evento["error"] and sesion and self.historial:
+                    await asyncio.to_thread(self._guardar, evento, config_destino, sesion)
+        except ConnectionClosed:
+            pass
+
+    def _guardar(self, evento, config_destino, sesion):
+        from services.historial import crear_registro
+
+        self.historial.guardar(crear_registro(
+            f"conversacion_{evento['id']}", evento["texto_original"], evento["texto_traducido"],
+            evento["config_origen"], config_destino
+        ), sesion=sesion)
+
+
+def iniciar_servidor_conversacion(puerto: int, historial=None, speech_service=None,
+                                  translation_service=None, host: str = CONVERSACION_HOST) -> ServidorConversacion:
+    """Arranca el servidor websocket (con los servicios por defecto si no se indican)"""
+    from services.pipeline import PipelineTraduccion
+    from services.speech_service import SpeechService
+    from services.translation_service import TranslationService
+
+    # El segmentador ya entrega PCM mono a 16 kHz: no hace falta normalizar
+    pipeline = PipelineTraduccion(speech_service or SpeechService(), translation_service or TranslationService(),
+                                  normalizar=False)
+    servidor = ServidorConversacion(pipeline, puerto, host=host, historial=historial)
+    servidor.start()
+    servidor.listo.wait(timeout=10)
+    return servidor
+
+
+if __name__ == "__main__":
+    # Servidor de conversación independiente de la interfaz:
+    #   CONVERSACION_SECRETO=... python -m services.conversacion --puerto 8766
+    # (la interfaz debe tener el mismo CONVERSACION_SECRETO para emitir tokens válidos)
+    parser = argparse.ArgumentParser(description="Servidor websocket del modo conversación")
+    parser.add_argument("--puerto", type=int, default=int(CONVERSACION_PORT or 8766))
+    parser.add_argument("--host", default=CONVERSACION_HOST)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Puerto para exponer /metrics y /metrics.json")
+    parser.add_argument("--metrics-host", default=None,
+                        help="Interfaz del servidor de métricas (por defecto METRICS_HOST, 127.0.0.1)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        servir_metricas(args.metrics_port, args.metrics_host)
+
+    from services.historial import HistorialSQLite
+
+    if not os.environ.get("CONVERSACION_SECRETO"):
+        print("⚠️  Sin CONVERSACION_SECRETO ninguna interfaz puede emitir tokens para este servidor")
+    servidor = iniciar_servidor_conversacion(args.puerto, HistorialSQLite(), host=args.host)
+    print(f"🗣️ Conversación en vivo escuchando en ws://{args.host}:{args.puerto}")
+    try:
+        servidor.join()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,164 @@
+import os
+import csv
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+HISTORY_PATH = os.environ.get("HISTORY_PATH", os.path.join(".cache", "historial.sqlite"))
+
+COLUMNAS_HISTORIAL = [
+    "timestamp", "audio_original", "idioma_origen", "texto_original",
+    "idioma_destino", "texto_traducido", "voz_destino"
+]
+
+
+def crear_registro(audio_nombre, texto_original, texto_traducido,
+                   config_origen, config_destino):
+    """Fila del historial de traducciones (la usan la interfaz y el modo batch)"""
+    return {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'audio_original': audio_nombre,
+        # Sin detección automática idioma_detectado es None: cuenta el idioma configurado
+        'idioma_origen': config_origen.get('idioma_detectado') or config_origen['idioma_stt'],
+        'texto_original': texto_original,
+        'idioma_destino': config_destino['idioma'],
+        'texto_traducido': texto_traducido,
+        'voz_destino': config_destino['voz']
+    }
+
+
+class RegistroHistorial:
+    """Fila compacta del historial en memoria (sin __dict__ por instancia)"""
+
+    __slots__ = ["id"] + COLUMNAS_HISTORIAL
+
+    def __init__(self, id, timestamp, audio_original, idioma_origen, texto_original,
+                 idioma_destino, texto_traducido, voz_destino):
+        self.id = id
+        self.timestamp = timestamp
+        self.audio_original = audio_original
+        self.idioma_origen = idioma_origen
+        self.texto_original = texto_original
+        self.idioma_destino = idioma_destino
+        self.texto_traducido = texto_traducido
+        self.voz_destino = voz_destino
+
+    def como_dict(self) -> dict:
+        return {columna: getattr(self, columna) for columna in COLUMNAS_HISTORIAL}
+
+    def como_fila(self) -> tuple:
+        return tuple(getattr(self, columna) for columna in COLUMNAS_HISTORIAL)
+
+
+class HistorialSQLite:
+    """
+    Historial de traducciones persistido en SQLite
+
+    Cada fila lleva la sesión que la creó; filtrando por sesión se obtiene el
+    historial de un usuario y sin filtro el de todo el equipo (mismo fichero).
+    Las consultas son paginadas y la exportación se hace por lotes, así que la
+    memoria no crece con el tamaño del historial.
+    """
+
+    def __init__(self, ruta: str = HISTORY_PATH):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS historial (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sesion TEXT,
+                timestamp TEXT NOT NULL,
+                audio_original TEXT,
+                idioma_origen TEXT,
+                texto_original TEXT,
+                idioma_destino TEXT,
+                texto_traducido TEXT,
+                voz_destino TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_historial_timestamp ON historial (timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_historial_sesion ON historial (sesion, timestamp)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_historial_idiomas ON historial (idioma_origen, idioma_destino, timestamp)"
+        )
+
+    def guardar(self, registro: dict, sesion: Optional[str] = None) -> int:
+        """Guarda una fila creada con crear_registro y devuelve su id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"INSERT INTO historial (sesion, {', '.join(COLUMNAS_HISTORIAL)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sesion, *(registro.get(columna) for columna in COLUMNAS_HISTORIAL))
+            )
+        return cursor.lastrowid
+
+    def contar(self, sesion: Optional[str] = None, idioma_origen: Optional[str] = None,
+               idioma_destino: Optional[str] = None) -> int:
+        where, parametros = self._filtros(sesion, idioma_origen, idioma_destino)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM historial{where}", parametros).fetchone()[0]
+
+    def pagina(self, numero: int = 0, tamaño: int = 20, sesion: Optional[str] = None,
+               idioma_origen: Optional[str] = None, idioma_destino: Optional[str] = None) -> List[RegistroHistorial]:
+        """Devuelve una página del historial, de la traducción más reciente a la más antigua"""
+        where, parametros = self._filtros(sesion, idioma_origen, idioma_destino)
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT id, {', '.join(COLUMNAS_HISTORIAL)} FROM historial{where} "
+                "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                (*parametros, tamaño, numero * tamaño)
+            ).fetchall()
+        return [RegistroHistorial(*fila) for fila in filas]
+
+    def iterar(self, sesion: Optional[str] = None, idioma_origen: Optional[str] = None,
+               idioma_destino: Optional[str] = None, tamaño_lote: int = 1000) -> Iterator[List[RegistroHistorial]]:
+        """Recorre el historial en lotes (orden cronológico) sin cargarlo entero"""
+        where, parametros = self._filtros(sesion, idioma_origen, idioma_destino)
+        ultimo_id = 0
+        while True:
+            condicion = f"{where} AND id > ?" if where else " WHERE id > ?"
+            with self._lock:
+                filas = self._conn.execute(
+                    f"SELECT id, {', '.join(COLUMNAS_HISTORIAL)} FROM historial{condicion} ORDER BY id LIMIT ?",
+                    (*parametros, ultimo_id, tamaño_lote)
+                ).fetchall()
+            if not filas:
+                return
+            ultimo_id = filas[-1][0]
+            yield [RegistroHistorial(*fila) for fila in filas]
+
+    def exportar_csv(self, destino, tamaño_lote: int = 1000, **filtros):
+        """Escribe el historial en CSV lote a lote sobre un fichero de texto abierto"""
+        escritor = csv.writer(destino)
+        escritor.writerow(COLUMNAS_HISTORIAL)
+        for lote in self.iterar(tamaño_lote=tamaño_lote, **filtros):
+            escritor.writerows(registro.como_fila() for registro in lote)
+
+    def exportar_parquet(self, destino, tamaño_lote: int = 5000, **filtros):
+        """Escribe el historial en Parquet, un row group por lote (requiere pyarrow)"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        esquema = pa.schema([(columna, pa.string()) for columna in COLUMNAS_HISTORIAL])
+        with pq.ParquetWriter(destino, esquema) as escritor:
+            for lote in self.iterar(tamaño_lote=tamaño_lote, **filtros):
+                columnas = {c: [getattr(r, c) for r in lote] for c in COLUMNAS_HISTORIAL}
+                escritor.write_table(pa.table(columnas, schema=esquema))
+
+    @staticmethod
+    def _filtros(sesion, idioma_origen, idioma_destino):
+        condiciones, parametros = [], []
+        for columna, valor in (("sesion", sesion), ("idioma_origen", idioma_origen),
+                               ("idioma_destino", idioma_destino)):
+            if valor is not None:
+                condiciones.append(f"{columna} = ?")
+                parametros.append(valor)
+        where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+        return where, parametros
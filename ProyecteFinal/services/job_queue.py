@@ -0,0 +1,471 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import argparse
+import itertools
+import threading
+from typing import Optional
+
+from utils.audio_temporal import AudioTemporal, TAMAÑO_BLOQUE_AUDIO
+from utils.cache import clave_cache
+from utils.metrics import servir_metricas
+
+JOBS_PATH = os.environ.get("JOBS_PATH", os.path.join(".cache", "trabajos.sqlite"))
+# Bloques de audio por transacción al encolar: cada una bloquea a los demás escritores solo un momento
+BLOQUES_POR_TRANSACCION = int(os.environ.get("JOBS_BLOQUES_POR_TRANSACCION", "16"))
+# Tiempo que se conservan los trabajos terminados (con su audio resultado) antes de purgarlos
+JOBS_TTL = int(os.environ.get("JOBS_TTL", str(24 * 3600)))
+# Cada cuánto purga un worker los trabajos terminados que superan JOBS_TTL
+JOBS_INTERVALO_PURGA = int(os.environ.get("JOBS_INTERVALO_PURGA", "600"))
+# Latido de un trabajo en proceso: muy por debajo del plazo de reencolar_huerfanos
+JOBS_LATIDO = float(os.environ.get("JOBS_LATIDO", "60"))
+# Segundos sin latido (o sin avanzar la subida) tras los que un trabajo se da por abandonado
+PLAZO_HUERFANOS = 600
+
+SUBIENDO = "subiendo"
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+# Columnas añadidas después de la primera versión de la tabla (se crean al abrir una base antigua)
+_COLUMNAS_NUEVAS = {"traducciones": "TEXT", "normalizado": "INTEGER NOT NULL DEFAULT 0"}
+# Campos de cada traducción multidestino que se guardan como JSON (el audio va en trabajos_traducciones)
+_CAMPOS_TRADUCCION = ("idioma", "voz", "texto", "error")
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos de traducción persistida en SQLite
+
+    La interfaz envía el audio y recibe un id; los workers (hilos de este
+    proceso u otros procesos que abran el mismo fichero) reclaman trabajos
+    pendientes y guardan el resultado. Como el estado vive fuera de la sesión
+    de Streamlit, un rerun o una desconexión no pierden el trabajo en curso.
+
+    El audio de entrada se guarda en trabajos_audio en filas de un bloque, de
+    modo que encolar y reclamar audios de cientos de MB no los carga enteros
+    (SQLite materializa un BLOB completo al escribirlo o leerlo como valor).
+    Los bloques se escriben y se leen con una conexión propia y fuera del lock
+    compartido, para que los sondeos de estado() y resultado() no esperen a
+    la copia; el trabajo está en SUBIENDO, invisible para los workers, hasta
+    que el audio está completo.
+    """
+
+    def __init__(self, ruta: str = JOBS_PATH):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = self._conectar(check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                clave TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                creado REAL NOT NULL,
+                actualizado REAL NOT NULL,
+                audio_nombre TEXT,
+                audio_bytes BLOB,
+                config_origen TEXT NOT NULL,
+                config_destino TEXT NOT NULL,
+                texto_original TEXT,
+                texto_traducido TEXT,
+                audio_resultado BLOB,
+                error TEXT,
+                traducciones TEXT,
+                normalizado INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columnas = {fila["name"] for fila in self._conn.execute("PRAGMA table_info(trabajos)")}
+        for columna, tipo in _COLUMNAS_NUEVAS.items():
+            if columna not in columnas:
+                self._conn.execute(f"ALTER TABLE trabajos ADD COLUMN {columna} {tipo}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos_audio (
+                trabajo_id TEXT NOT NULL,
+                orden INTEGER NOT NULL,
+                datos BLOB NOT NULL,
+                PRIMARY KEY (trabajo_id, orden)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos_traducciones (
+                trabajo_id TEXT NOT NULL,
+                orden INTEGER NOT NULL,
+                audio BLOB,
+                PRIMARY KEY (trabajo_id, orden)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (clave)")
+
+    def _conectar(self, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, **kwargs)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enviar(self, audio_bytes: bytes, audio_nombre: str, config_origen: dict, config_destino: dict,
+               normalizado: bool = False) -> str:
+        """
+        Encola un trabajo y devuelve su id
+
+        Si ya existe un trabajo idéntico (mismo audio y configuración) que no
+        haya fallado, incluso uno que aún se está subiendo, se devuelve ese id
+        en lugar de volver a pagar las llamadas. Con normalizado=True (la
+        interfaz ya pasó el audio por normalizar_audio) el worker no lo repite.
+        """
+        clave = clave_cache("trabajo", audio_bytes, json.dumps(config_origen, sort_keys=True),
+                            json.dumps(config_destino, sort_keys=True))
+        ahora = time.time()
+        trabajo_id = uuid.uuid4().hex
+        conn = self._conectar()
+        try:
+            # Búsqueda e inserción en la misma transacción: dos envíos idénticos a la vez dan un solo trabajo
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fila = conn.execute(
+                    """SELECT id FROM trabajos
+                       WHERE clave = ? AND estado != ? AND NOT (estado = ? AND actualizado < ?)
+                       ORDER BY creado DESC LIMIT 1""",
+                    (clave, ERROR, SUBIENDO, ahora - PLAZO_HUERFANOS)
+                ).fetchone()
+                if fila is None:
+                    conn.execute(
+                        """INSERT INTO trabajos (id, clave, estado, creado, actualizado, audio_nombre,
+                                                 config_origen, config_destino, normalizado)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (trabajo_id, clave, SUBIENDO, ahora, ahora, audio_nombre,
+                         json.dumps(config_origen), json.dumps(config_destino), int(normalizado))
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if fila is not None:
+                return fila["id"]
+
+            bloques = enumerate(_bloques(audio_bytes))
+            while True:
+                lote = list(itertools.islice(bloques, BLOQUES_POR_TRANSACCION))
+                if not lote:
+                    break
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "INSERT INTO trabajos_audio (trabajo_id, orden, datos) VALUES (?, ?, ?)",
+                        ((trabajo_id, orden, bloque) for orden, bloque in lote)
+                    )
+                    # Una subida en curso nunca parece abandonada a reencolar_huerfanos
+                    conn.execute("UPDATE trabajos SET actualizado = ? WHERE id = ?", (time.time(), trabajo_id))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except BaseException:
+            conn.execute("DELETE FROM trabajos_audio WHERE trabajo_id = ?", (trabajo_id,))
+            conn.execute("DELETE FROM trabajos WHERE id = ?", (trabajo_id,))
+            raise
+        finally:
+            conn.close()
+
+        # Con el audio completo, el trabajo pasa a ser visible para los workers
+        with self._lock:
+            self._conn.execute(
+                "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ?",
+                (PENDIENTE, time.time(), trabajo_id)
+            )
+        return trabajo_id
+
+    def estado(self, trabajo_id: str) -> Optional[dict]:
+        """
+        Estado del trabajo sin los datos binarios (para sondear desde la UI)
+
+        En un trabajo multidestino terminado, "traducciones" lleva el idioma,
+        la voz, el texto y el error de cada destino, sin el audio.
+        """
+        with self._lock:
+            fila = self._conn.execute(
+                """SELECT id, estado, creado, actualizado, audio_nombre, error, traducciones
+                   FROM trabajos WHERE id = ?""",
+                (trabajo_id,)
+            ).fetchone()
+        if fila is None:
+            return None
+        estado = dict(fila)
+        estado["traducciones"] = json.loads(estado["traducciones"]) if estado["traducciones"] else None
+        return estado
+
+    def resultado(self, trabajo_id: str) -> Optional[dict]:
+        """Resultado completo de un trabajo terminado (None si no ha terminado)"""
+        with self._lock:
+            fila = self._conn.execute(
+                """SELECT id, estado, audio_nombre, config_origen, config_destino, texto_original,
+                          texto_traducido, audio_resultado, error, traducciones
+                   FROM trabajos WHERE id = ? AND estado IN (?, ?)""",
+                (trabajo_id, COMPLETADO, ERROR)
+            ).fetchone()
+            audios = dict(self._conn.execute(
+                "SELECT orden, audio FROM trabajos_traducciones WHERE trabajo_id = ?", (trabajo_id,)
+            ).fetchall()) if fila is not None and fila["traducciones"] else {}
+        if fila is None:
+            return None
+        resultado = dict(fila)
+        resultado["config_origen"] = json.loads(resultado["config_origen"])
+        resultado["config_destino"] = json.loads(resultado["config_destino"])
+        if resultado["traducciones"]:
+            resultado["traducciones"] = [
+                {**traduccion, "audio": audios.get(orden)}
+                for orden, traduccion in enumerate(json.loads(resultado["traducciones"]))
+            ]
+        return resultado
+
+    def reclamar(self) -> Optional[dict]:
+        """
+        Marca como en proceso el trabajo pendiente más antiguo y lo devuelve
+
+        El audio se devuelve como AudioTemporal, leído bloque a bloque.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conn.execute(
+                    """SELECT id, audio_nombre, audio_bytes, config_origen, config_destino, normalizado
+                       FROM trabajos WHERE estado = ? ORDER BY creado LIMIT 1""",
+                    (PENDIENTE,)
+                ).fetchone()
+                if fila is not None:
+                    self._conn.execute(
+                        "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ?",
+                        (EN_PROCESO, time.time(), fila["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if fila is None:
+            return None
+        return {
+            "id": fila["id"],
+            "audio_nombre": fila["audio_nombre"],
+            "audio_bytes": self._leer_audio(fila["id"], fila["audio_nombre"], fila["audio_bytes"]),
+            "config_origen": json.loads(fila["config_origen"]),
+            "config_destino": json.loads(fila["config_destino"]),
+            "normalizado": bool(fila["normalizado"])
+        }
+
+    def _leer_audio(self, trabajo_id: str, nombre: Optional[str], audio_bytes: Optional[bytes]) -> AudioTemporal:
+        if audio_bytes is not None:
+            # Trabajo encolado antes de guardar el audio por bloques
+            return AudioTemporal.desde_bytes(audio_bytes, nombre or "audio")
+        conn = self._conectar()
+        try:
+            filas = conn.execute(
+                "SELECT datos FROM trabajos_audio WHERE trabajo_id = ? ORDER BY orden", (trabajo_id,)
+            )
+            return AudioTemporal.desde_bloques((fila["datos"] for fila in filas), nombre or "audio")
+        finally:
+            conn.close()
+
+    def completar(self, trabajo_id: str, resultado: dict):
+        """
+        Guarda el resultado de la pipeline (o su error) y libera el audio de entrada
+
+        Si el resultado no trae config_origen (p. ej. una excepción en el
+        worker) se conserva la configuración con la que se encoló.
+        """
+        config_origen = resultado.get("config_origen")
+        traducciones = resultado.get("traducciones") or []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """UPDATE trabajos SET estado = ?, actualizado = ?,
+                                           config_origen = COALESCE(?, config_origen), texto_original = ?,
+                                           texto_traducido = ?, audio_resultado = ?, error = ?, traducciones = ?,
+                                           audio_bytes = NULL
+                       WHERE id = ?""",
+                    (ERROR if resultado.get("error") else COMPLETADO, time.time(),
+                     json.dumps(config_origen) if config_origen else None, resultado.get("texto_original"),
+                     resultado.get("texto_traducido"), resultado.get("audio_resultado"), resultado.get("error"),
+                     json.dumps([{campo: t.get(campo) for campo in _CAMPOS_TRADUCCION} for t in traducciones],
+                                ensure_ascii=False) if traducciones else None,
+                     trabajo_id)
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO trabajos_traducciones (trabajo_id, orden, audio) VALUES (?, ?, ?)",
+                    ((trabajo_id, orden, t.get("audio")) for orden, t in enumerate(traducciones))
+                )
+                self._conn.execute("DELETE FROM trabajos_audio WHERE trabajo_id = ?", (trabajo_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def latido(self, trabajo_id: str):
+        """El worker sigue con el trabajo: renueva actualizado para que no parezca huérfano"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE trabajos SET actualizado = ? WHERE id = ? AND estado = ?",
+                (time.time(), trabajo_id, EN_PROCESO)
+            )
+
+    def reencolar_huerfanos(self, segundos: float = PLAZO_HUERFANOS):
+        """
+        Devuelve a pendiente los trabajos en proceso de un worker que murió
+        y borra las subidas que se quedaron a medias
+
+        Un trabajo vivo renueva actualizado cada JOBS_LATIDO segundos, así que
+        solo vuelven a pendiente los que llevan segundos sin latido, no los largos.
+        """
+        limite = time.time() - segundos
+        with self._lock:
+            self._conn.execute(
+                "UPDATE trabajos SET estado = ?, actualizado = ? WHERE estado = ? AND actualizado < ?",
+                (PENDIENTE, time.time(), EN_PROCESO, limite)
+            )
+            self._conn.execute(
+                """DELETE FROM trabajos_audio WHERE trabajo_id IN
+                   (SELECT id FROM trabajos WHERE estado = ? AND actualizado < ?)""",
+                (SUBIENDO, limite)
+            )
+            self._conn.execute("DELETE FROM trabajos WHERE estado = ? AND actualizado < ?", (SUBIENDO, limite))
+
+    def purgar_terminados(self, segundos: float = JOBS_TTL) -> int:
+        """Borra los trabajos completados o fallidos hace más de segundos; devuelve cuántos"""
+        parametros = (COMPLETADO, ERROR, time.time() - segundos)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """DELETE FROM trabajos_traducciones WHERE trabajo_id IN
+                       (SELECT id FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?)""",
+                    parametros
+                )
+                cursor = self._conn.execute(
+                    "DELETE FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?", parametros
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+
+def _bloques(audio_bytes):
+    """Bloques de TAMAÑO_BLOQUE_AUDIO de un AudioTemporal o de unos bytes"""
+    if isinstance(audio_bytes, AudioTemporal):
+        return audio_bytes.bloques()
+    vista = memoryview(audio_bytes)
+    return (vista[i: i + TAMAÑO_BLOQUE_AUDIO] for i in range(0, len(vista), TAMAÑO_BLOQUE_AUDIO))
+
+
+class WorkerTrabajos(threading.Thread):
+    """
+    Hilo que consume la cola con la pipeline asíncrona
+
+    Un solo worker mantiene hasta max_en_vuelo trabajos a la vez; los límites
+    por etapa de la pipeline siguen aplicándose entre todos ellos. Cada
+    JOBS_INTERVALO_PURGA segundos purga los trabajos terminados caducados y
+    cada trabajo en curso late cada JOBS_LATIDO segundos.
+    """
+
+    def __init__(self, cola: ColaTrabajos, pipeline, max_en_vuelo: int = 50, intervalo: float = 0.5):
+        super().__init__(daemon=True, name="worker-trabajos")
+        self.cola = cola
+        self.pipeline = pipeline
+        self.max_en_vuelo = max_en_vuelo
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+
+    def detener(self):
+        self._parar.set()
+
+    def run(self):
+        asyncio.run(self._bucle())
+
+    async def _bucle(self):
+        semaforos = self.pipeline.crear_semaforos()
+        en_vuelo = asyncio.Semaphore(self.max_en_vuelo)
+        tareas = set()
+        proxima_purga = time.monotonic()
+
+        while not self._parar.is_set():
+            if time.monotonic() >= proxima_purga:
+                await asyncio.to_thread(self.cola.purgar_terminados)
+                proxima_purga = time.monotonic() + JOBS_INTERVALO_PURGA
+            await en_vuelo.acquire()
+            trabajo = await asyncio.to_thread(self.cola.reclamar)
+            if trabajo is None:
+                en_vuelo.release()
+                await asyncio.sleep(self.intervalo)
+                continue
+            tarea = asyncio.create_task(self._procesar(trabajo, semaforos, en_vuelo))
+            tareas.add(tarea)
+            tarea.add_done_callback(tareas.discard)
+
+        if tareas:
+            await asyncio.gather(*tareas)
+
+    async def _procesar(self, trabajo, semaforos, en_vuelo):
+        latido = asyncio.create_task(self._latir(trabajo["id"]))
+        try:
+            resultado = await self.pipeline.procesar_trabajo(trabajo, semaforos)
+        except Exception as e:
+            resultado = {"error": f"Error: {e}"}
+        finally:
+            latido.cancel()
+            en_vuelo.release()
+            trabajo["audio_bytes"].cerrar()
+        await asyncio.to_thread(self.cola.completar, trabajo["id"], resultado)
+
+    async def _latir(self, trabajo_id):
+        while True:
+            await asyncio.sleep(JOBS_LATIDO)
+            await asyncio.to_thread(self.cola.latido, trabajo_id)
+
+
+def iniciar_workers(cola: ColaTrabajos, num_workers: int = 1, max_en_vuelo: int = 50):
+    """Arranca workers en este proceso con los servicios por defecto"""
+    from services.pipeline import PipelineTraduccion
+    from services.speech_service import SpeechService
+    from services.translation_service import TranslationService
+
+    pipeline = PipelineTraduccion(SpeechService(), TranslationService())
+    cola.reencolar_huerfanos()
+    workers = [WorkerTrabajos(cola, pipeline, max_en_vuelo) for _ in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+if __name__ == "__main__":
+    # Proceso de workers independiente de la interfaz:
+    #   python -m services.job_queue --workers 2 --en-vuelo 100
+    parser = argparse.ArgumentParser(description="Workers de la cola de traducciones")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--en-vuelo", type=int, default=50)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Puerto para exponer /metrics y /metrics.json")
+    parser.add_argument("--metrics-host", default=None,
+                        help="Interfaz del servidor de métricas (por defecto METRICS_HOST, 127.0.0.1)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        servir_metricas(args.metrics_port, args.metrics_host)
+
+    workers = iniciar_workers(ColaTrabajos(), args.workers, args.en_vuelo)
+    print(f"🚀 {len(workers)} worker(s) escuchando en {JOBS_PATH}")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.detener()
@@ -0,0 +1,39 @@
+import io
+import os
+import json
+import zipfile
+
+from utils.audio import tipo_audio
+
+
+def crear_paquete_zip(resultado: dict) -> bytes:
+    """
+    Empaqueta un resultado multidestino en un zip
+
+    Contiene la transcripción, el texto y el audio de cada idioma destino y un
+    resumen.json con los idiomas, voces y errores.
+    """
+    base = os.path.splitext(resultado.get("audio_nombre") or "traduccion")[0]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as paquete:
+        paquete.writestr(f"{base}/transcripcion.txt", resultado.get("texto_original") or "")
+        for traduccion in resultado.get("traducciones", []):
+            if traduccion["texto"] and not traduccion["texto"].startswith("Error"):
+                paquete.writestr(f"{base}/{traduccion['idioma']}.txt", traduccion["texto"])
+            if traduccion["audio"]:
+                # El audio (MP3/Opus) ya está comprimido: se guarda sin volver a comprimir
+                extension = tipo_audio(traduccion["audio"])[1]
+                paquete.writestr(f"{base}/{traduccion['idioma']}.{extension}", traduccion["audio"],
+                                 compress_type=zipfile.ZIP_STORED)
+
+        resumen = {
+            "audio_original": resultado.get("audio_nombre"),
+            "idioma_origen": resultado["config_origen"].get("idioma_detectado") or resultado["config_origen"]["idioma_stt"],
+            "texto_original": resultado.get("texto_original"),
+            "traducciones": [
+                {clave: t[clave] for clave in ("idioma", "voz", "texto", "error")}
+                for t in resultado.get("traducciones", [])
+            ]
+        }
+        paquete.writestr(f"{base}/resumen.json", json.dumps(resumen, ensure_ascii=False, indent=2))
+    return buffer.getvalue()
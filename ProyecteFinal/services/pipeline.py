@@ -0,0 +1,250 @@
+import os
+import asyncio
+import itertools
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Union
+
+from utils.audio import normalizar_audio
+from utils.audio_temporal import AudioTemporal
+from utils.metrics import cronometrar
+
+# Máximo de llamadas simultáneas por etapa
+LIMITES_POR_DEFECTO = {
+    "preproceso": os.cpu_count() or 2,
+    "stt": 16,
+    "deteccion": 32,
+    "traduccion": 32,
+    "tts": 16
+}
+
+
+class PipelineTraduccion:
+    """
+    Pipeline asíncrono Voz → Texto → Traducción → Voz
+
+    Procesa un flujo de trabajos de audio manteniendo muchos en vuelo a la vez.
+    Cada etapa tiene su propio límite de concurrencia, así que un trabajo puede
+    estar traduciendo mientras otros siguen transcribiendo o sintetizando.
+
+    Un trabajo es un dict con las claves:
+        audio_bytes, audio_nombre, config_origen, config_destino, id (opcional),
+        normalizado (opcional: el audio ya pasó por normalizar_audio)
+    o bien, para traducir un texto sin pasar por STT:
+        texto, audio_nombre, config_origen, config_destino, id (opcional)
+
+    config_destino puede incluir "formato" (nombre de FORMATOS_TTS o formato de
+    Azure) para elegir el formato y la tasa de bits de la voz sintetizada.
+
+    Si config_destino incluye "destinos" (lista de {"idioma", "voz"}), el
+    trabajo se transcribe una vez, se traduce a todos los idiomas en una sola
+    petición y las voces se sintetizan en paralelo; el resultado lleva además
+    "traducciones": una entrada {idioma, voz, texto, audio, error} por destino.
+
+    Si se indica un TraductorPorLotes, las traducciones de trabajos distintos
+    con el mismo par de idiomas se agrupan en una sola petición.
+    """
+
+    def __init__(self, speech_service, translation_service,
+                 limites: Optional[Dict[str, int]] = None, max_en_vuelo: int = 200,
+                 traductor_lotes=None, normalizar: bool = True):
+        self.speech_service = speech_service
+        self.translation_service = translation_service
+        self.traductor_lotes = traductor_lotes
+        self.normalizar = normalizar
+        self.limites = {**LIMITES_POR_DEFECTO, **(limites or {})}
+        self.max_en_vuelo = max_en_vuelo
+
+    async def procesar_flujo(self, trabajos: Union[Iterable[dict], AsyncIterable[dict]]) -> AsyncIterator[dict]:
+        """
+        Procesa los trabajos concurrentemente y devuelve los resultados según terminan
+
+        Una excepción en un trabajo se devuelve como el "error" de su resultado
+        y no interrumpe el resto del flujo.
+        """
+        semaforos = self.crear_semaforos()
+        contador = itertools.count()
+        pendientes = set()
+
+        async for trabajo in self._iterar(trabajos):
+            trabajo.setdefault("id", next(contador))
+            pendientes.add(asyncio.create_task(self._procesar_sin_excepciones(trabajo, semaforos)))
+
+            # Contrapresión: no aceptar más trabajos si ya hay demasiados en vuelo
+            if len(pendientes) >= self.max_en_vuelo:
+                terminados, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in terminados:
+                    yield tarea.result()
+
+        while pendientes:
+            terminados, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in terminados:
+                yield tarea.result()
+
+    def crear_semaforos(self) -> Dict[str, asyncio.Semaphore]:
+        """Un semáforo por etapa, compartido por todos los trabajos de un mismo bucle"""
+        return {etapa: asyncio.Semaphore(limite) for etapa, limite in self.limites.items()}
+
+    def procesar_lote(self, trabajos: Iterable[dict]) -> list:
+        """Versión síncrona: procesa una lista de trabajos y devuelve los resultados en orden"""
+        async def _recoger():
+            return [resultado async for resultado in self.procesar_flujo(trabajos)]
+
+        resultados = asyncio.run(_recoger())
+        return sorted(resultados, key=lambda r: r["id"])
+
+    async def _procesar_sin_excepciones(self, trabajo: dict, semaforos: Dict[str, asyncio.Semaphore]) -> dict:
+        try:
+            return await self.procesar_trabajo(trabajo, semaforos)
+        except Exception as e:
+            resultado = _resultado_vacio(trabajo, dict(trabajo["config_origen"]))
+            resultado["error"] = f"Error: {e}"
+            return resultado
+
+    @cronometrar("trabajo_completo")
+    async def procesar_trabajo(self, trabajo: dict, semaforos: Dict[str, asyncio.Semaphore]) -> dict:
+        """Ejecuta las cuatro etapas para un único trabajo"""
+        config_origen = dict(trabajo["config_origen"])
+        config_destino = trabajo["config_destino"]
+        resultado = _resultado_vacio(trabajo, config_origen)
+
+        texto_original = trabajo.get("texto")
+        if texto_original is not None:
+            # Trabajo de texto: sin STT; con detección automática Translator identifica el origen
+            if config_origen["deteccion_automatica"]:
+                config_origen["idioma_traduccion"] = None
+        else:
+            texto_original = await self._transcribir(trabajo["audio_bytes"], config_origen, semaforos,
+                                                     self.normalizar and not trabajo.get("normalizado"))
+        if not texto_original or texto_original.startswith("Error"):
+            resultado["error"] = texto_original or "Error en transcripción"
+            return resultado
+        resultado["texto_original"] = texto_original
+
+        if config_destino.get("destinos"):
+            return await self._procesar_destinos(resultado, texto_original, config_origen,
+                                                 config_destino["destinos"], semaforos,
+                                                 config_destino.get("formato"))
+
+        # PASO 2: Traducción
+        async with semaforos["traduccion"]:
+            texto_traducido = await self._traducir(
+                texto_original, config_origen["idioma_traduccion"], config_destino["idioma"]
+            )
+        if not texto_traducido or texto_traducido.startswith("Error"):
+            resultado["error"] = texto_traducido or "Error en traducción"
+            return resultado
+        resultado["texto_traducido"] = texto_traducido
+
+        # PASO 3: Síntesis de voz
+        async with semaforos["tts"]:
+            audio_resultado = await self.speech_service.sintetizar_voz_async(
+                texto_traducido, config_destino["voz"], config_destino.get("formato")
+            )
+        if not audio_resultado:
+            resultado["error"] = "Error generando audio"
+            return resultado
+        resultado["audio_resultado"] = audio_resultado
+        return resultado
+
+    async def _transcribir(self, audio_bytes, config_origen, semaforos, normalizar=True):
+        """Normalización, detección de idioma y transcripción de un trabajo de audio"""
+        # PASO 0: Normalización del audio (mono, 16 kHz, sin silencios)
+        audio = audio_bytes
+        if normalizar:
+            async with semaforos["preproceso"]:
+                audio = await asyncio.to_thread(normalizar_audio, audio_bytes)
+
+        try:
+            # Detección automática de idioma (ampliación) sobre un prefijo del audio
+            texto_original = None
+            if config_origen["deteccion_automatica"]:
+                async with semaforos["deteccion"]:
+                    idioma_stt, idioma_detectado, _, texto_original = \
+                        await self.translation_service.identificar_idioma_audio_async(
+                            audio, self.speech_service, config_origen["idioma_stt"]
+                        )
+                self.translation_service.aplicar_idioma(config_origen, idioma_stt, idioma_detectado)
+
+            # PASO 1: Transcripción (una sola subida del audio completo)
+            if texto_original is None:
+                async with semaforos["stt"]:
+                    texto_original = await self.speech_service.transcribir_audio_async(
+                        audio, config_origen["idioma_stt"]
+                    )
+            return texto_original
+        finally:
+            # La copia normalizada es de este trabajo; el audio original es del llamante
+            if isinstance(audio, AudioTemporal) and audio is not audio_bytes:
+                audio.cerrar()
+
+    async def _procesar_destinos(self, resultado, texto_original, config_origen, destinos, semaforos,
+                                 formato=None):
+        """Varios idiomas destino: una traducción con to=[...] y las voces en paralelo"""
+        # PASO 2: Traducción a todos los destinos en la misma petición
+        async with semaforos["traduccion"]:
+            textos = await self._traducir_multiple(
+                texto_original, config_origen["idioma_traduccion"], [d["idioma"] for d in destinos]
+            )
+
+        # PASO 3: Síntesis de voz de cada destino (limitada por el semáforo de TTS)
+        async def sintetizar(destino):
+            texto = textos.get(destino["idioma"])
+            salida = {"idioma": destino["idioma"], "voz": destino["voz"], "texto": texto, "audio": None, "error": None}
+            if not texto or texto.startswith("Error"):
+                salida["error"] = texto or "Error en traducción"
+                return salida
+            async with semaforos["tts"]:
+                salida["audio"] = await self.speech_service.sintetizar_voz_async(
+                    texto, destino["voz"], destino.get("formato") or formato
+                )
+            if not salida["audio"]:
+                salida["error"] = "Error generando audio"
+            return salida
+
+        resultado["traducciones"] = list(await asyncio.gather(*(sintetizar(d) for d in destinos)))
+        # El primer destino ocupa los campos de un trabajo de un solo idioma
+        resultado["texto_traducido"] = resultado["traducciones"][0]["texto"]
+        resultado["audio_resultado"] = resultado["traducciones"][0]["audio"]
+        errores = [f"{t['idioma']}: {t['error']}" for t in resultado["traducciones"] if t["error"]]
+        if len(errores) == len(destinos):
+            resultado["error"] = "; ".join(errores)
+        return resultado
+
+    async def _traducir(self, texto, idioma_origen, idioma_destino):
+        if self.traductor_lotes is None:
+            return await self.translation_service.traducir_texto_async(texto, idioma_origen, idioma_destino)
+
+        futuro = self.traductor_lotes.enviar(texto, idioma_origen, [idioma_destino])
+        resultado = await asyncio.wrap_future(futuro)
+        return resultado[idioma_destino]
+
+    async def _traducir_multiple(self, texto, idioma_origen, idiomas_destino):
+        """Devuelve {idioma_destino: traducción} con una sola petición a Translator"""
+        if self.traductor_lotes is None:
+            resultados = await self.translation_service.traducir_lote_async([texto], idioma_origen, idiomas_destino)
+            return resultados[0]
+
+        return await asyncio.wrap_future(self.traductor_lotes.enviar(texto, idioma_origen, idiomas_destino))
+
+    @staticmethod
+    async def _iterar(trabajos):
+        """Permite recibir trabajos como iterable normal o asíncrono"""
+        if hasattr(trabajos, "__aiter__"):
+            async for trabajo in trabajos:
+                yield trabajo
+        else:
+            for trabajo in trabajos:
+                yield trabajo
+
+
+
+def _resultado_vacio(trabajo: dict, config_origen: dict) -> dict:
+    return {
+        "id": trabajo.get("id"),
+        "audio_nombre": trabajo.get("audio_nombre"),
+        "config_origen": config_origen,
+        "config_destino": trabajo["config_destino"],
+        "texto_original": None,
+        "texto_traducido": None,
+        "audio_resultado": None,
+        "error": None
+    }
\ No newline at end of file
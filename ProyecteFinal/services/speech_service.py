@@ -1,31 +1,276 @@
-import streamlit as st
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.audio import codificar_opus, duracion_wav, es_ogg_opus, es_wav, fragmentos_wav_por_silencios
+from utils.cache import cache_persistente
+from utils.config import obtener_config
 from utils.http_client import HTTPClient  
-import os
+from utils.metrics import BUCKETS_BYTES, cronometrar, metricas
+from utils.texto import agrupar_frases, dividir_en_frases
+
+# El endpoint REST de audio corto admite como máximo 60 segundos por petición
+DURACION_MAXIMA_FRAGMENTO = 55.0
+
+# Fragmentos de un audio largo en vuelo a la vez (y, por tanto, en memoria)
+MAX_FRAGMENTOS_EN_VUELO = 8
+
+# Tamaño máximo de cada segmento de texto en la síntesis por frases
+MAX_CARACTERES_SEGMENTO_TTS = 250
+# Un segmento por frase (el primero suena antes); las más cortas se juntan con la siguiente
+MIN_CARACTERES_SEGMENTO_TTS = 20
+
+CONTENT_TYPE_WAV = "audio/wav; codecs=audio/pcm; samplerate=16000"
+CONTENT_TYPE_OPUS = "audio/ogg; codecs=opus"
+
+# Formatos de salida de la síntesis (nombre corto → X-Microsoft-OutputFormat).
+# También se acepta directamente cualquier formato de Azure
+FORMATOS_TTS = {
+    "mp3": "audio-16khz-128kbitrate-mono-mp3",
+    "mp3-32k": "audio-16khz-32kbitrate-mono-mp3",
+    "opus": "ogg-16khz-16bit-mono-opus",
+    "opus-24k": "webm-24khz-16bit-24kbps-mono-opus",
+}
 
 
 class SpeechService:
-    def __init__(self):
-        self.speech_key = os.environ.get("AZURE_SPEECH_KEY") or st.secrets.get("AZURE_SPEECH_KEY")
-        self.region = os.environ.get("AZURE_REGION") or st.secrets.get("AZURE_REGION")
+    def __init__(self, speech_key=None, region=None, stt_endpoint=None, tts_endpoint=None,
+                 formato_stt=None, bitrate_opus=None, formato_tts=None):
+        # Las claves se inyectan o se leen de la configuración (entorno / st.secrets)
+        self.speech_key = speech_key or obtener_config("AZURE_SPEECH_KEY")
+        self.region = region or obtener_config("AZURE_REGION")
+        # Endpoints alternativos (p. ej. benchmarks/mock_azure.py); por defecto los de la región
+        self.stt_endpoint = stt_endpoint or obtener_config(
+            "AZURE_STT_ENDPOINT", f"https://{self.region}.stt.speech.microsoft.com"
+        )
+        self.tts_endpoint = tts_endpoint or obtener_config(
+            "AZURE_TTS_ENDPOINT", f"https://{self.region}.tts.speech.microsoft.com"
+        )
+        # Subida comprimida: los WAV se envían como Ogg/Opus (opus | wav)
+        self.formato_stt = formato_stt or obtener_config("STT_FORMATO", "opus")
+        self.bitrate_opus = bitrate_opus or obtener_config("STT_OPUS_BITRATE", "24k")
+        # Formato de la voz sintetizada si la petición no indica otro
+        self.formato_tts = formato_tts or obtener_config("TTS_FORMATO", "mp3")
         self.http_client = HTTPClient(max_retries=3, base_backoff=1.5)  #Usar HTTPClient
     
-    # st.cache_data maneja todo automáticamente
-    @st.cache_data(ttl=3600, show_spinner="Transcribiendo audio...")
-    def transcribir_audio(_self, audio_bytes, idioma):
-        url = f"https://{_self.region}.stt.speech.microsoft.com/speech/recognition/conversation/cognitiveservices/v1"
-        headers = {
-            "Ocp-Apim-Subscription-Key": _self.speech_key,
-            "Content-Type": "audio/wav; codecs=audio/pcm; samplerate=16000"
-        }
+    @cronometrar("stt")
+    @cache_persistente("stt")
+    def transcribir_audio(self, audio_bytes, idioma):
+        # Audios largos: por fragmentos en paralelo
+        if self.es_audio_largo(audio_bytes):
+            return self._unir_transcripciones(self.transcribir_audio_streaming(audio_bytes, idioma))
+        
+        return self._transcribir_fragmento(audio_bytes, idioma)
+    
+    @cronometrar("stt")
+    @cache_persistente("stt")
+    async def transcribir_audio_async(self, audio_bytes, idioma):
+        """Versión asíncrona de transcribir_audio (para el pipeline concurrente)"""
+        if self.es_audio_largo(audio_bytes):
+            return self._unir_transcripciones(await self._transcribir_fragmentos_async(audio_bytes, idioma))
         
+        return await self._transcribir_fragmento_async(audio_bytes, idioma)
+    
+    async def _transcribir_fragmentos_async(self, audio_bytes, idioma):
+        """Fragmentos en paralelo, cortados según se envían (como mucho MAX_FRAGMENTOS_EN_VUELO)"""
+        fragmentos = fragmentos_wav_por_silencios(audio_bytes, DURACION_MAXIMA_FRAGMENTO)
+        en_vuelo = deque()
+        textos = []
+        while True:
+            fragmento = await asyncio.to_thread(next, fragmentos, None)
+            if fragmento is None:
+                break
+            en_vuelo.append(asyncio.ensure_future(self._transcribir_fragmento_async(fragmento, idioma)))
+            if len(en_vuelo) >= MAX_FRAGMENTOS_EN_VUELO:
+                textos.append(await en_vuelo.popleft())
+        textos.extend(await asyncio.gather(*en_vuelo))
+        return textos
+    
+    def transcribir_audio_streaming(self, audio_bytes, idioma, max_workers=4):
+        """
+        Transcribe un audio largo por fragmentos cortados en silencios
+        
+        Los fragmentos se envían en paralelo y el texto de cada uno se devuelve
+        en orden en cuanto está disponible (generador). Cada fragmento se corta
+        al enviarlo, así que en memoria hay como mucho 2 * max_workers.
+        """
+        if not self.es_audio_largo(audio_bytes):
+            yield self._transcribir_fragmento(audio_bytes, idioma)
+            return
+        
+        fragmentos = fragmentos_wav_por_silencios(audio_bytes, DURACION_MAXIMA_FRAGMENTO)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stt-fragmentos") as executor:
+            futuros = deque()
+            try:
+                for fragmento in fragmentos:
+                    futuros.append(executor.submit(self._transcribir_fragmento, fragmento, idioma))
+                    if len(futuros) >= 2 * max_workers:
+                        yield futuros.popleft().result()
+                while futuros:
+                    yield futuros.popleft().result()
+            finally:
+                # Si se abandona el generador, no seguir enviando fragmentos
+                for futuro in futuros:
+                    futuro.cancel()
+    
+    @staticmethod
+    def es_audio_largo(audio_bytes):
+        duracion = duracion_wav(audio_bytes)
+        return duracion is not None and duracion > DURACION_MAXIMA_FRAGMENTO
+    
+    @cache_persistente("stt_fragmento")
+    def _transcribir_fragmento(self, audio_bytes, idioma):
         #USAR HTTPClient CON REINTENTOS
-        response = _self.http_client.post_with_retry(
-            url, 
-            params={"language": idioma}, 
-            headers=headers, 
-            data=audio_bytes
+        response = self.http_client.post_with_retry(
+            **self._peticion_transcripcion(*self._preparar_subida(audio_bytes), idioma)
+        )
+        return self._resultado_transcripcion(response)
+    
+    @cache_persistente("stt_fragmento")
+    async def _transcribir_fragmento_async(self, audio_bytes, idioma):
+        datos, content_type = await asyncio.to_thread(self._preparar_subida, audio_bytes)
+        response = await self.http_client.post_with_retry_async(
+            **self._peticion_transcripcion(datos, content_type, idioma)
         )
+        return self._resultado_transcripcion(response)
+    
+    def _preparar_subida(self, audio_bytes):
+        """
+        Devuelve (datos, Content-Type) para el STT
         
+        El Ogg/Opus se envía tal cual y los WAV se comprimen a Opus (unas 10
+        veces menos bytes que el PCM), salvo con STT_FORMATO=wav o sin ffmpeg.
+        La caché sigue usando el audio original como clave. Un AudioTemporal
+        se devuelve como tal y el cliente HTTP lo sube por bloques.
+        """
+        if es_ogg_opus(audio_bytes):
+            return audio_bytes, CONTENT_TYPE_OPUS
+        if self.formato_stt == "opus" and es_wav(audio_bytes):
+            comprimido = codificar_opus(audio_bytes, self.bitrate_opus)
+            if comprimido:
+                metricas.observar("stt_subida_bytes", len(comprimido), buckets=BUCKETS_BYTES, formato="opus")
+                metricas.incrementar("stt_subida_ahorro_bytes_total", len(audio_bytes) - len(comprimido))
+                return comprimido, CONTENT_TYPE_OPUS
+        metricas.observar("stt_subida_bytes", len(audio_bytes), buckets=BUCKETS_BYTES, formato="wav")
+        return audio_bytes, CONTENT_TYPE_WAV
+    
+    @staticmethod
+    def _unir_transcripciones(textos):
+        """Une los textos de los fragmentos en orden (el primer error se propaga)"""
+        partes = []
+        for texto in textos:
+            if texto and texto.startswith("Error"):
+                return texto
+            if texto:
+                partes.append(texto)
+        return " ".join(partes)
+    
+    @cronometrar("tts")
+    def sintetizar_voz(self, texto, voz, formato=None):
+        """Sintetiza el texto con la voz indicada en el formato pedido (o el configurado)"""
+        return self._sintetizar_texto(texto, voz, self.formato_azure(formato))
+    
+    @cronometrar("tts")
+    async def sintetizar_voz_async(self, texto, voz, formato=None):
+        """Versión asíncrona de sintetizar_voz (para el pipeline concurrente)"""
+        return await self._sintetizar_texto_async(texto, voz, self.formato_azure(formato))
+    
+    def formato_azure(self, formato=None):
+        """Formato de salida de Azure para un nombre corto de FORMATOS_TTS (o el configurado)"""
+        formato = formato or self.formato_tts
+        return FORMATOS_TTS.get(formato, formato)
+    
+    @staticmethod
+    def admite_segmentos(formato_azure):
+        """Los MP3 y el PCM crudo se pueden concatenar; Ogg y WebM necesitan una sola petición"""
+        return formato_azure.endswith("mp3") or formato_azure.startswith("raw-")
+    
+    # El formato ya resuelto forma parte de la clave: mismo texto en MP3 y en Opus son entradas distintas
+    @cache_persistente("tts")
+    def _sintetizar_texto(self, texto, voz, formato):
+        # Textos largos: por frases en paralelo y concatenado
+        if len(self.segmentar_texto(texto)) > 1 and self.admite_segmentos(formato):
+            return self._unir_audios(self.sintetizar_voz_streaming(texto, voz, formato))
+        
+        return self._sintetizar_segmento(texto, voz, formato)
+    
+    @cache_persistente("tts")
+    async def _sintetizar_texto_async(self, texto, voz, formato):
+        segmentos = self.segmentar_texto(texto)
+        if len(segmentos) > 1 and self.admite_segmentos(formato):
+            audios = await asyncio.gather(*(
+                self._sintetizar_segmento_async(segmento, voz, formato) for segmento in segmentos
+            ))
+            return self._unir_audios(audios)
+        
+        return await self._sintetizar_segmento_async(texto, voz, formato)
+    
+    def sintetizar_voz_streaming(self, texto, voz, formato=None, max_workers=4):
+        """
+        Sintetiza el texto frase a frase
+        
+        Las frases se sintetizan en paralelo y los segmentos de audio se
+        devuelven en orden en cuanto están listos (generador), de modo que el
+        primero puede reproducirse antes de terminar el resto. Cada segmento
+        es un fichero de audio completo en el formato pedido.
+        """
+        formato = self.formato_azure(formato)
+        segmentos = self.segmentar_texto(texto)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-frases") as executor:
+            futuros = [executor.submit(self._sintetizar_segmento, s, voz, formato) for s in segmentos]
+            try:
+                for futuro in futuros:
+                    yield futuro.result()
+            finally:
+                for futuro in futuros:
+                    futuro.cancel()
+    
+    @staticmethod
+    def segmentar_texto(texto):
+        """Divide el texto en segmentos de una frase completa (o varias muy cortas) para la síntesis"""
+        return agrupar_frases(dividir_en_frases(texto), MAX_CARACTERES_SEGMENTO_TTS,
+                              MIN_CARACTERES_SEGMENTO_TTS) or [texto]
+    
+    @cache_persistente("tts")
+    def _sintetizar_segmento(self, texto, voz, formato):
+        #USAR HTTPClient CON REINTENTOS
+        response = self.http_client.post_with_retry(
+            **self._peticion_sintesis(texto, voz, formato)
+        )
+        return self._resultado_sintesis(response)
+    
+    @cache_persistente("tts")
+    async def _sintetizar_segmento_async(self, texto, voz, formato):
+        response = await self.http_client.post_with_retry_async(
+            **self._peticion_sintesis(texto, voz, formato)
+        )
+        return self._resultado_sintesis(response)
+    
+    @staticmethod
+    def _unir_audios(audios):
+        """Concatena los segmentos (MP3 o PCM crudo) en orden (None si alguno falló)"""
+        partes = []
+        for audio in audios:
+            if audio is None:
+                return None
+            partes.append(audio)
+        return b"".join(partes)
+    
+    def _peticion_transcripcion(self, audio_bytes, content_type, idioma):
+        """Construye los argumentos de la petición STT"""
+        url = f"{self.stt_endpoint}/speech/recognition/conversation/cognitiveservices/v1"
+        headers = {
+            "Ocp-Apim-Subscription-Key": self.speech_key,
+            "Content-Type": content_type
+        }
+        return {
+            "url": url,
+            "params": {"language": idioma},
+            "headers": headers,
+            "data": audio_bytes
+        }
+    
+    @staticmethod
+    def _resultado_transcripcion(response):
         if response and response.status_code == 200:
             data = response.json()
             return data.get("DisplayText") or data.get("Text")
@@ -34,10 +279,9 @@ class SpeechService:
         else:
             return "Error: No se pudo conectar con el servicio de voz"
     
-    # utilitzem el cache de streamlit
-    @st.cache_data(ttl=3600, show_spinner="Generando audio...")
-    def sintetizar_voz(_self, texto, voz):
-        url = f"https://{_self.region}.tts.speech.microsoft.com/cognitiveservices/v1"
+    def _peticion_sintesis(self, texto, voz, formato):
+        """Construye los argumentos de la petición TTS"""
+        url = f"{self.tts_endpoint}/cognitiveservices/v1"
         idioma_voz = "-".join(voz.split('-')[:2])
         
         ssml = f"""<speak version='1.0' xml:lang='{idioma_voz}'>
@@ -45,18 +289,18 @@ class SpeechService:
         </speak>"""
         
         headers = {
-            "Ocp-Apim-Subscription-Key": _self.speech_key,
+            "Ocp-Apim-Subscription-Key": self.speech_key,
             "Content-Type": "application/ssml+xml",
-            "X-Microsoft-OutputFormat": "audio-16khz-128kbitrate-mono-mp3"
+            "X-Microsoft-OutputFormat": formato
         }
-        
-        #USAR HTTPClient CON REINTENTOS
-        response = _self.http_client.post_with_retry(
-            url, 
-            headers=headers, 
-            data=ssml.encode("utf-8")
-        )
-        
+        return {
+            "url": url,
+            "headers": headers,
+            "data": ssml.encode("utf-8")
+        }
+    
+    @staticmethod
+    def _resultado_sintesis(response):
         if response and response.status_code == 200:
             return response.content
         else:
@@ -0,0 +1,116 @@
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+from services.translation_service import MAX_CARACTERES_TRADUCCION, MAX_ELEMENTOS_TRADUCCION
+
+
+class TraductorPorLotes:
+    """
+    Agrupa traducciones pendientes en una sola petición a Translator
+
+    Los textos que comparten (idioma_origen, idiomas_destino) se acumulan y se
+    envían juntos cuando se alcanza el umbral de elementos/caracteres o cuando
+    vence una espera corta. Cada llamante recibe un Future con su resultado.
+
+    Cada lote tiene un número de generación: el temporizador de un lote que ya
+    se envió por tamaño no puede vaciar antes de tiempo el siguiente de la
+    misma clave.
+    """
+
+    def __init__(self, translation_service, max_elementos: int = 100,
+                 max_caracteres: int = MAX_CARACTERES_TRADUCCION,
+                 espera_maxima: float = 0.05, max_workers: int = 4):
+        self.translation_service = translation_service
+        self.max_elementos = min(max_elementos, MAX_ELEMENTOS_TRADUCCION)
+        self.max_caracteres = min(max_caracteres, MAX_CARACTERES_TRADUCCION)
+        self.espera_maxima = espera_maxima
+        self._pendientes: Dict[Tuple, List[Tuple[str, Future]]] = {}
+        self._caracteres: Dict[Tuple, int] = {}
+        self._generaciones: Dict[Tuple, int] = {}
+        self._contador = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lotes-traduccion")
+
+    def enviar(self, texto: str, idioma_origen: str, idiomas_destino: Sequence[str]) -> Future:
+        """
+        Encola un texto y devuelve un Future que resuelve a {idioma_destino: traducción}
+        """
+        clave = (idioma_origen, tuple(idiomas_destino))
+        coste = len(texto) * len(clave[1])
+        futuro = Future()
+        lotes_listos = []
+
+        with self._lock:
+            # Si el texto no cabe en el lote actual, se envía el lote antes
+            if clave in self._pendientes and self._caracteres[clave] + coste > self.max_caracteres:
+                lotes_listos.append((clave, self._extraer(clave)))
+
+            nuevo_lote = clave not in self._pendientes
+            if nuevo_lote:
+                generacion = self._generaciones[clave] = next(self._contador)
+            self._pendientes.setdefault(clave, []).append((texto, futuro))
+            self._caracteres[clave] = self._caracteres.get(clave, 0) + coste
+
+            if (len(self._pendientes[clave]) >= self.max_elementos
+                    or self._caracteres[clave] >= self.max_caracteres):
+                lotes_listos.append((clave, self._extraer(clave)))
+                nuevo_lote = False
+
+        if nuevo_lote:
+            temporizador = threading.Timer(self.espera_maxima, self._vaciar, args=(clave, generacion))
+            temporizador.daemon = True
+            temporizador.start()
+
+        for clave_lista, lote in lotes_listos:
+            self._executor.submit(self._enviar_lote, clave_lista, lote)
+        return futuro
+
+    def traducir(self, texto: str, idioma_origen: str, idioma_destino: str) -> str:
+        """Equivalente bloqueante de TranslationService.traducir_texto"""
+        return self.enviar(texto, idioma_origen, [idioma_destino]).result()[idioma_destino]
+
+    def traducir_multiple(self, texto: str, idioma_origen: str, idiomas_destino: Sequence[str]) -> Dict[str, str]:
+        """Traduce un texto a varios idiomas destino en la misma petición"""
+        return self.enviar(texto, idioma_origen, idiomas_destino).result()
+
+    def vaciar_todo(self):
+        """Envía inmediatamente todos los lotes pendientes"""
+        with self._lock:
+            lotes = [(clave, self._extraer(clave)) for clave in list(self._pendientes)]
+        for clave, lote in lotes:
+            self._executor.submit(self._enviar_lote, clave, lote)
+
+    def cerrar(self):
+        self.vaciar_todo()
+        self._executor.shutdown(wait=True)
+
+    def _vaciar(self, clave, generacion):
+        """Llamado por el temporizador al vencer la espera máxima de su lote"""
+        with self._lock:
+            if self._generaciones.get(clave) != generacion:
+                return
+            lote = self._extraer(clave)
+        self._enviar_lote(clave, lote)
+
+    def _extraer(self, clave):
+        """Saca el lote pendiente de una clave (requiere tener el lock)"""
+        self._caracteres.pop(clave, None)
+        self._generaciones.pop(clave, None)
+        return self._pendientes.pop(clave)
+
+    def _enviar_lote(self, clave, lote):
+        idioma_origen, idiomas_destino = clave
+        try:
+            resultados = self.translation_service.traducir_lote(
+                [texto for texto, _ in lote], idioma_origen, list(idiomas_destino)
+            )
+            for (_, futuro), resultado in zip(lote, resultados):
+                futuro.set_result(resultado)
+            if len(resultados) < len(lote):
+                raise RuntimeError(f"Translator devolvió {len(resultados)} traducciones para {len(lote)} textos")
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
@@ -0,0 +1,143 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+from utils.metrics import metricas
+from utils.similitud import forma_canonica
+
+# Configuración por variables de entorno
+TM_ENABLED = os.environ.get("TM_ENABLED", "1") == "1"
+TM_PATH = os.environ.get("TM_PATH", os.path.join(".cache", "memoria_traduccion.sqlite"))
+# Reutilizar también frases que solo cambian en comas, mayúsculas o espacios.
+# Por defecto solo exactas
+TM_IGNORAR_FORMA = os.environ.get("TM_IGNORAR_FORMA", "0") == "1"
+
+
+class MemoriaTraduccion:
+    """
+    Memoria de traducción por frases en SQLite
+
+    Guarda pares (frase origen, frase destino) por par de idiomas. Una frase
+    se busca primero por coincidencia exacta (salvo espacios) y, si no la
+    hay y TM_IGNORAR_FORMA está activo, por su forma canónica: mismas
+    palabras en el mismo orden y mismo signo final. La diferencia puede ser
+    de comas, mayúsculas o espacios, nunca una negación, una cifra o un "?"
+    ("no ha sido enviado" no reutiliza "ha sido enviado").
+    """
+
+    def __init__(self, ruta: str = TM_PATH, ignorar_forma: bool = TM_IGNORAR_FORMA):
+        self.ruta = ruta
+        self.ignorar_forma = ignorar_forma
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS segmentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                par TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                origen TEXT NOT NULL,
+                destino TEXT NOT NULL,
+                creado REAL NOT NULL,
+                usos INTEGER NOT NULL DEFAULT 0,
+                forma TEXT,
+                UNIQUE (par, clave)
+            )
+        """)
+        # Memorias anteriores: sin columna forma y con el índice MinHash/LSH
+        columnas = {fila[1] for fila in self._conn.execute("PRAGMA table_info(segmentos)")}
+        if "forma" not in columnas:
+            self._conn.execute("ALTER TABLE segmentos ADD COLUMN forma TEXT")
+        sin_forma = self._conn.execute("SELECT id, origen FROM segmentos WHERE forma IS NULL").fetchall()
+        if sin_forma:
+            self._conn.executemany(
+                "UPDATE segmentos SET forma = ? WHERE id = ?",
+                [(self._forma(origen), segmento_id) for segmento_id, origen in sin_forma]
+            )
+        self._conn.execute("DROP TABLE IF EXISTS lsh")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_segmentos_forma ON segmentos (par, forma)")
+
+    def buscar(self, frases: Sequence[str], idioma_origen: str, idioma_destino: str) -> List[Optional[str]]:
+        """Traducción guardada de cada frase (None si no hay ninguna reutilizable)"""
+        par = f"{idioma_origen}>{idioma_destino}"
+        traducciones = []
+        with self._lock:
+            for frase in frases:
+                traduccion = self._buscar_exacta(par, frase)
+                resultado = "exacta"
+                if traduccion is None and self.ignorar_forma:
+                    traduccion = self._buscar_aproximada(par, frase)
+                    resultado = "aproximada"
+                metricas.incrementar("memoria_traduccion_total", resultado=resultado if traduccion else "nueva")
+                traducciones.append(traduccion)
+        return traducciones
+
+    def guardar(self, pares: Sequence[Tuple[str, str]], idioma_origen: str, idioma_destino: str):
+        """Guarda pares (frase origen, frase traducida) con su clave exacta y su forma canónica"""
+        par = f"{idioma_origen}>{idioma_destino}"
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO segmentos (par, clave, origen, destino, creado, forma) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(par, self._clave(origen), origen, destino, ahora, self._forma(origen)) for origen, destino in pares]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _buscar_exacta(self, par, frase):
+        fila = self._conn.execute(
+            "SELECT id, destino FROM segmentos WHERE par = ? AND clave = ?", (par, self._clave(frase))
+        ).fetchone()
+        if fila is None:
+            return None
+        self._conn.execute("UPDATE segmentos SET usos = usos + 1 WHERE id = ?", (fila[0],))
+        return fila[1]
+
+    def _buscar_aproximada(self, par, frase):
+        # Entre varias frases con la misma forma, la más usada
+        fila = self._conn.execute(
+            "SELECT id, destino FROM segmentos WHERE par = ? AND forma = ? ORDER BY usos DESC, id LIMIT 1",
+            (par, self._forma(frase))
+        ).fetchone()
+        if fila is None:
+            return None
+        self._conn.execute("UPDATE segmentos SET usos = usos + 1 WHERE id = ?", (fila[0],))
+        return fila[1]
+
+    @staticmethod
+    def _clave(frase):
+        """Clave exacta: el texto tal cual salvo espacios (la puntuación cambia el sentido)"""
+        return hashlib.sha256(" ".join(frase.split()).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _forma(frase):
+        """Clave aproximada: mismas palabras y mismo signo final (ver forma_canonica)"""
+        return hashlib.sha256(forma_canonica(frase).encode("utf-8")).hexdigest()
+
+
+_memoria_global: Optional[MemoriaTraduccion] = None
+_memoria_lock = threading.Lock()
+
+
+def obtener_memoria() -> Optional[MemoriaTraduccion]:
+    """Memoria de traducción del proceso (None si TM_ENABLED=0)"""
+    global _memoria_global
+    if not TM_ENABLED:
+        return None
+    if _memoria_global is None:
+        with _memoria_lock:
+            if _memoria_global is None:
+                _memoria_global = MemoriaTraduccion()
+    return _memoria_global
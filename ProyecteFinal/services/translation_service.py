@@ -1,12 +1,35 @@
-import streamlit as st
+import asyncio
 from utils.http_client import HTTPClient  #Importar HTTPClient
-import os
+from utils.cache import cache_persistente
+from utils.config import obtener_config
+from utils.metrics import cronometrar
+from utils.audio import extraer_prefijo_wav
+from utils.texto import dividir_en_frases
+from services.translation_memory import obtener_memoria
+
+# Límites de la API Translator v3 por petición
+MAX_ELEMENTOS_TRADUCCION = 1000
+MAX_CARACTERES_TRADUCCION = 50000  # suma de caracteres x número de idiomas destino
+
+# Segundos de audio que se transcriben para identificar el idioma
+SEGUNDOS_PREFIJO_DETECCION = 4.0
+CONFIANZA_MINIMA_DETECCION = 0.7
+
+IDIOMAS_STT = ["es-ES", "en-US", "fr-FR", "de-DE", "it-IT", "pt-BR", "ja-JP"]
+IDIOMAS_DESTINO = ["es", "en", "fr", "de", "it", "pt", "ja"]
+IDIOMAS_SIN_ESPACIOS = ("ja", "zh-Hans", "zh-Hant")  # las frases se unen sin espacio
 
 class TranslationService:
-    def __init__(self):
-        self.translator_key = os.environ.get("AZURE_TRANSLATOR_KEY") or st.secrets.get("AZURE_TRANSLATOR_KEY")
-        self.region = os.environ.get("AZURE_REGION") or st.secrets.get("AZURE_REGION")
+    def __init__(self, translator_key=None, region=None, memoria=None, translator_endpoint=None):
+        # Las claves se inyectan o se leen de la configuración (entorno / st.secrets)
+        self.translator_key = translator_key or obtener_config("AZURE_TRANSLATOR_KEY")
+        self.region = region or obtener_config("AZURE_REGION")
+        self.translator_endpoint = translator_endpoint or obtener_config(
+            "AZURE_TRANSLATOR_ENDPOINT", "https://api.cognitive.microsofttranslator.com"
+        )
         self.http_client = HTTPClient(max_retries=3, base_backoff=1.5)  #Usar HTTPClient
+        # Memoria de traducción por frases (TM_ENABLED=0 para desactivarla)
+        self.memoria = memoria or obtener_memoria()
         
         # Mapeo de idiomas
         self.mapeo_idiomas_stt = {
@@ -24,75 +47,224 @@ class TranslationService:
             "ja": ["ja-JP-NanamiNeural", "ja-JP-KeitaNeural"]
         }
 
-    def configurar_idioma_origen(self):
-        """Configuración del idioma de origen con detección automática"""
-        st.subheader("🎤 Configuración Entrada")
-        
-        deteccion_automatica = st.checkbox(
-            "🔍 Detectar idioma automáticamente", 
-            value=True,
-            help="El sistema detectará automáticamente el idioma del audio"
+    @cronometrar("deteccion")
+    @cache_persistente("deteccion")
+    def detectar_idioma(self, texto):
+        """Detección automática de idioma (AMPLIACIÓN)"""
+        #USAR HTTPClient CON REINTENTOS
+        response = self.http_client.post_with_retry(
+            **self._peticion_deteccion(texto)
         )
-        
-        if deteccion_automatica:
-            st.info("🌐 El idioma se detectará automáticamente")
-            idioma_stt = "es-ES"  # Idioma por defecto para transcripción inicial
-            idioma_traduccion = "es"  # Idioma por defecto para traducción
-        else:
-            idioma_stt = st.selectbox(
-                "Idioma del audio original:",
-                ["es-ES", "en-US", "fr-FR", "de-DE", "it-IT", "pt-BR", "ja-JP"]
-            )
-            # Extraer código simple para traducción (es-ES → es)
-            idioma_traduccion = idioma_stt.split('-')[0]
-        
-        return {
-            'deteccion_automatica': deteccion_automatica,
-            'idioma_stt': idioma_stt,
-            'idioma_traduccion': idioma_traduccion,
-            'idioma_detectado': None
-        }
+        return self._resultado_deteccion(response)
 
-    def configurar_idioma_destino(self):
-        """Configuración del idioma de destino"""
-        st.subheader("🌍 Configuración Salida")
-        
-        idioma_destino = st.selectbox(
-            "Idioma de destino:",
-            ["es", "en", "fr", "de", "it", "pt", "ja"]
+    @cronometrar("deteccion")
+    @cache_persistente("deteccion")
+    async def detectar_idioma_async(self, texto):
+        """Versión asíncrona de detectar_idioma (para el pipeline concurrente)"""
+        response = await self.http_client.post_with_retry_async(
+            **self._peticion_deteccion(texto)
         )
-        
-        voz = st.selectbox(
-            "Voz para audio:",
-            self.voces_por_idioma.get(idioma_destino, ["es-ES-ElviraNeural"])
+        return self._resultado_deteccion(response)
+
+    @cronometrar("identificacion_idioma")
+    def identificar_idioma_audio(self, audio_bytes, speech_service, idioma_stt_previo="es-ES"):
+        """
+        Identifica el idioma hablado transcribiendo solo un prefijo del audio
+
+        Returns:
+            (idioma_stt, idioma_detectado, confianza, texto)
+        """
+        prefijo, completo = extraer_prefijo_wav(audio_bytes, SEGUNDOS_PREFIJO_DETECCION)
+        texto_prefijo = speech_service.transcribir_audio(prefijo, idioma_stt_previo)
+        if not texto_prefijo or texto_prefijo.startswith("Error"):
+            return idioma_stt_previo, None, 0, None
+
+        idioma_detectado, confianza = self.detectar_idioma(texto_prefijo)
+        return self._resolver_idioma(idioma_stt_previo, idioma_detectado, confianza, texto_prefijo, completo)
+
+    @cronometrar("identificacion_idioma")
+    async def identificar_idioma_audio_async(self, audio_bytes, speech_service, idioma_stt_previo="es-ES"):
+        """Versión asíncrona de identificar_idioma_audio"""
+        prefijo, completo = extraer_prefijo_wav(audio_bytes, SEGUNDOS_PREFIJO_DETECCION)
+        texto_prefijo = await speech_service.transcribir_audio_async(prefijo, idioma_stt_previo)
+        if not texto_prefijo or texto_prefijo.startswith("Error"):
+            return idioma_stt_previo, None, 0, None
+
+        idioma_detectado, confianza = await self.detectar_idioma_async(texto_prefijo)
+        return self._resolver_idioma(idioma_stt_previo, idioma_detectado, confianza, texto_prefijo, completo)
+
+    def _resolver_idioma(self, idioma_stt_previo, idioma_detectado, confianza, texto_prefijo, completo):
+        idioma_stt = idioma_stt_previo
+        if idioma_detectado and confianza > CONFIANZA_MINIMA_DETECCION:
+            idioma_stt = self.mapeo_idiomas_stt.get(idioma_detectado, idioma_stt_previo)
+
+        # Si el prefijo era todo el audio y el idioma no cambia, ya tenemos el texto
+        texto = texto_prefijo if completo and idioma_stt == idioma_stt_previo else None
+        return idioma_stt, idioma_detectado, confianza, texto
+
+    @staticmethod
+    def aplicar_idioma(config_origen, idioma_stt, idioma_detectado):
+        config_origen['idioma_detectado'] = idioma_detectado
+        if idioma_stt != config_origen['idioma_stt']:
+            config_origen['idioma_stt'] = idioma_stt
+            config_origen['idioma_traduccion'] = idioma_stt.split('-')[0]  # Usar idioma detectado para traducción
+        return config_origen
+
+    @cronometrar("traduccion")
+    @cache_persistente("traduccion")
+    def traducir_texto(self, texto, idioma_origen, idioma_destino):
+        """Traduce texto entre idiomas"""
+        if self._usa_memoria(idioma_origen):
+            return self.traducir_lote([texto], idioma_origen, [idioma_destino])[0][idioma_destino]
+        #USAR HTTPClient CON REINTENTOS
+        response = self.http_client.post_with_retry(
+            **self._peticion_traduccion(texto, idioma_origen, idioma_destino)
         )
-        
+        return self._resultado_traduccion(response)
+
+    @cronometrar("traduccion")
+    @cache_persistente("traduccion")
+    async def traducir_texto_async(self, texto, idioma_origen, idioma_destino):
+        """Versión asíncrona de traducir_texto (para el pipeline concurrente)"""
+        if self._usa_memoria(idioma_origen):
+            resultados = await self.traducir_lote_async([texto], idioma_origen, [idioma_destino])
+            return resultados[0][idioma_destino]
+        response = await self.http_client.post_with_retry_async(
+            **self._peticion_traduccion(texto, idioma_origen, idioma_destino)
+        )
+        return self._resultado_traduccion(response)
+
+    @cronometrar("traduccion_lote")
+    def traducir_lote(self, textos, idioma_origen, idiomas_destino):
+        """
+        Traduce varios textos a uno o varios idiomas con el mínimo de peticiones
+
+        Args:
+            textos: Lista de textos a traducir
+            idioma_origen: Código de idioma origen (None para autodetección)
+            idiomas_destino: Lista de códigos de idioma destino
+
+        Returns:
+            Lista con un dict {idioma_destino: texto_traducido} por cada texto
+        """
+        consulta = self._consultar_memoria(textos, idioma_origen, idiomas_destino)
+        pendientes = consulta[2] if consulta else textos
+
+        resultados = []
+        for bloque in self._particionar(pendientes, len(idiomas_destino)):
+            response = self.http_client.post_with_retry(
+                **self._peticion_traduccion_lote(bloque, idioma_origen, idiomas_destino)
+            )
+            resultados.extend(self._resultado_traduccion_lote(response, len(bloque), idiomas_destino))
+
+        if consulta:
+            return self._completar_con_memoria(consulta, resultados, idioma_origen, idiomas_destino)
+        return resultados
+
+    @cronometrar("traduccion_lote")
+    async def traducir_lote_async(self, textos, idioma_origen, idiomas_destino):
+        """Versión asíncrona de traducir_lote (la memoria SQLite se consulta fuera del event loop)"""
+        consulta = await asyncio.to_thread(self._consultar_memoria, textos, idioma_origen, idiomas_destino)
+        pendientes = consulta[2] if consulta else textos
+
+        resultados = []
+        for bloque in self._particionar(pendientes, len(idiomas_destino)):
+            response = await self.http_client.post_with_retry_async(
+                **self._peticion_traduccion_lote(bloque, idioma_origen, idiomas_destino)
+            )
+            resultados.extend(self._resultado_traduccion_lote(response, len(bloque), idiomas_destino))
+
+        if consulta:
+            return await asyncio.to_thread(
+                self._completar_con_memoria, consulta, resultados, idioma_origen, idiomas_destino
+            )
+        return resultados
+
+    def _usa_memoria(self, idioma_origen):
+        # Con autodetección (sin idioma origen) no se sabe en qué par de idiomas buscar
+        return self.memoria is not None and bool(idioma_origen)
+
+    def _consultar_memoria(self, textos, idioma_origen, idiomas_destino):
+        """
+        Divide los textos en frases y busca cada una en la memoria de traducción
+
+        Returns:
+            (frases_por_texto, traducciones, pendientes) o None si no se usa la
+            memoria; pendientes son las frases únicas que hay que enviar a Azure
+        """
+        if not self._usa_memoria(idioma_origen):
+            return None
+        frases_por_texto = [dividir_en_frases(texto) or [texto] for texto in textos]
+        unicas = list(dict.fromkeys(frase for frases in frases_por_texto for frase in frases))
+
+        traducciones = {}  # (frase, idioma_destino) -> traducción
+        for destino in idiomas_destino:
+            for frase, traduccion in zip(unicas, self.memoria.buscar(unicas, idioma_origen, destino)):
+                if traduccion is not None:
+                    traducciones[(frase, destino)] = traduccion
+        pendientes = [f for f in unicas if any((f, d) not in traducciones for d in idiomas_destino)]
+        return frases_por_texto, traducciones, pendientes
+
+    def _completar_con_memoria(self, consulta, resultados, idioma_origen, idiomas_destino):
+        """Guarda las frases nuevas en la memoria y recompone cada texto traducido"""
+        frases_por_texto, traducciones, pendientes = consulta
+        nuevas = {destino: [] for destino in idiomas_destino}
+        for frase, resultado in zip(pendientes, resultados):
+            for destino in idiomas_destino:
+                if (frase, destino) in traducciones:
+                    continue
+                traduccion = resultado.get(destino) or "Error: traducción vacía"
+                traducciones[(frase, destino)] = traduccion
+                if not traduccion.startswith("Error"):
+                    nuevas[destino].append((frase, traduccion))
+        for destino, pares in nuevas.items():
+            if pares:
+                self.memoria.guardar(pares, idioma_origen, destino)
+
+        salida = []
+        for frases in frases_por_texto:
+            fila = {}
+            for destino in idiomas_destino:
+                partes = [traducciones[(frase, destino)] for frase in frases]
+                error = next((p for p in partes if p.startswith("Error")), None)
+                separador = "" if destino in IDIOMAS_SIN_ESPACIOS else " "
+                fila[destino] = error or separador.join(partes)
+            salida.append(fila)
+        return salida
+
+    @staticmethod
+    def _particionar(textos, num_destinos=1):
+        """Divide los textos en bloques que respetan los límites de elementos y caracteres"""
+        bloque, caracteres = [], 0
+        for texto in textos:
+            coste = len(texto) * num_destinos
+            if bloque and (len(bloque) >= MAX_ELEMENTOS_TRADUCCION
+                           or caracteres + coste > MAX_CARACTERES_TRADUCCION):
+                yield bloque
+                bloque, caracteres = [], 0
+            bloque.append(texto)
+            caracteres += coste
+        if bloque:
+            yield bloque
+
+    def _cabeceras_translator(self):
         return {
-            'idioma': idioma_destino,
-            'voz': voz
+            "Ocp-Apim-Subscription-Key": self.translator_key,
+            "Ocp-Apim-Subscription-Region": self.region,
+            "Content-Type": "application/json"
         }
 
-    # st.cache_data maneja todo automáticamente
-    @st.cache_data(ttl=3600)
-    def detectar_idioma(_self, texto):
-        """Detección automática de idioma (AMPLIACIÓN)"""
-        url = "https://api.cognitive.microsofttranslator.com/detect"
-        params = {"api-version": "3.0"}
-        headers = {
-            "Ocp-Apim-Subscription-Key": _self.translator_key,
-            "Ocp-Apim-Subscription-Region": _self.region,
-            "Content-Type": "application/json"
+    def _peticion_deteccion(self, texto):
+        """Construye los argumentos de la petición /detect"""
+        return {
+            "url": f"{self.translator_endpoint}/detect",
+            "params": {"api-version": "3.0"},
+            "headers": self._cabeceras_translator(),
+            "json": [{"text": texto}]
         }
-        body = [{"text": texto}]
 
-        #USAR HTTPClient CON REINTENTOS
-        response = _self.http_client.post_with_retry(
-            url, 
-            params=params, 
-            headers=headers, 
-            json=body
-        )
-        
+    @staticmethod
+    def _resultado_deteccion(response):
         if response and response.status_code == 200:
             resultado = response.json()
             idioma = resultado[0]['language']
@@ -100,61 +272,42 @@ class TranslationService:
             return idioma, confianza
         return None, 0
 
-    def detectar_y_mejorar_idioma(self, audio_bytes, texto_original, config_origen):
-        """Mejora la transcripción detectando el idioma automáticamente"""
-        from services.speech_service import SpeechService
-        
-        st.write("**🔍 Detectando idioma...**")
-        idioma_detectado, confianza = self.detectar_idioma(texto_original)
-        
-        if idioma_detectado and confianza > 0.7:
-            st.success(f"🌐 Idioma detectado: **{idioma_detectado}** ({confianza:.1%})")
-            
-            # Re-transcribir con el idioma correcto si es diferente
-            idioma_stt_correcto = self.mapeo_idiomas_stt.get(idioma_detectado, "es-ES")
-            if idioma_stt_correcto != config_origen['idioma_stt']:
-                st.write("**🔄 Mejorando transcripción...**")
-                speech_service = SpeechService()
-                texto_mejorado = speech_service.transcribir_audio(audio_bytes, idioma_stt_correcto)
-                if texto_mejorado and not texto_mejorado.startswith("Error"):
-                    # Actualizar config_origen con el idioma detectado
-                    config_origen['idioma_detectado'] = idioma_detectado
-                    config_origen['idioma_traduccion'] = idioma_detectado  # Usar idioma detectado para traducción
-                    return texto_mejorado, config_origen
-        
-        # Si no se detecta o no mejora, mantener configuración original
-        config_origen['idioma_detectado'] = idioma_detectado
-        return texto_original, config_origen
+    def _peticion_traduccion(self, texto, idioma_origen, idioma_destino):
+        """Construye los argumentos de la petición /translate"""
+        return self._peticion_traduccion_lote([texto], idioma_origen, [idioma_destino])
 
-    # st.cache_data maneja todo automáticamente
-    @st.cache_data(ttl=3600, show_spinner="Traduciendo texto...")
-    def traducir_texto(_self, texto, idioma_origen, idioma_destino):
-        """Traduce texto entre idiomas"""
-        url = "https://api.cognitive.microsofttranslator.com/translate"
-        params = {
-            "api-version": "3.0",
-            "from": idioma_origen,
-            "to": idioma_destino
-        }
-        headers = {
-            "Ocp-Apim-Subscription-Key": _self.translator_key,
-            "Ocp-Apim-Subscription-Region": _self.region,
-            "Content-Type": "application/json"
+    def _peticion_traduccion_lote(self, textos, idioma_origen, idiomas_destino):
+        """Petición /translate con varios textos y varios idiomas destino (to=fr&to=de...)"""
+        return {
+            "url": f"{self.translator_endpoint}/translate",
+            "params": {
+                "api-version": "3.0",
+                "from": idioma_origen,
+                "to": list(idiomas_destino)
+            },
+            "headers": self._cabeceras_translator(),
+            "json": [{"text": texto} for texto in textos]
         }
-        body = [{"text": texto}]
 
-        #USAR HTTPClient CON REINTENTOS
-        response = _self.http_client.post_with_retry(
-            url, 
-            params=params, 
-            headers=headers, 
-            json=body
-        )
-        
+    @staticmethod
+    def _resultado_traduccion(response):
         if response and response.status_code == 200:
             resultado = response.json()
             return resultado[0]['translations'][0]['text']
         elif response:
             return f"Error: {response.status_code} - {response.text}"
         else:
-            return "Error: No se pudo conectar con el servicio de traducción"
\ No newline at end of file
+            return "Error: No se pudo conectar con el servicio de traducción"
+
+    @staticmethod
+    def _resultado_traduccion_lote(response, num_textos, idiomas_destino):
+        if response and response.status_code == 200:
+            return [
+                {t['to']: t['text'] for t in elemento['translations']}
+                for elemento in response.json()
+            ]
+        elif response:
+            error = f"Error: {response.status_code} - {response.text}"
+        else:
+            error = "Error: No se pudo conectar con el servicio de traducción"
+        return [{destino: error for destino in idiomas_destino} for _ in range(num_textos)]
\ No newline at end of file
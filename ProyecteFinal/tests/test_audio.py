@@ -0,0 +1,76 @@
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from utils import audio as modulo_audio
+from utils.audio import (
+    escribir_wav, extraer_prefijo_wav, fragmentos_wav_por_silencios, liberar_audio, normalizar_audio,
+    normalizar_en_segundo_plano, duracion_wav
+)
+from utils.audio_temporal import AudioTemporal
+
+WAV = escribir_wav((np.random.default_rng(0).standard_normal(16000 * 70) * 3000).astype("<i2").tobytes(),
+                   1, 2, 16000)
+
+MAL_FORMADOS = {
+    "cabecera_truncada": WAV[:30],
+    "datos_truncados": WAV[:100001],
+    "formato_desconocido": WAV[:20] + struct.pack("<H", 3) + WAV[22:],
+    "sin_canales": WAV[:22] + struct.pack("<H", 0) + WAV[24:],
+    "sin_chunk_data": WAV[:36],
+    "chunk_imposible": WAV[:36] + b"LIST" + struct.pack("<I", 2 ** 31) + WAV[36:1000],
+}
+
+
+def _error(func):
+    try:
+        func()
+    except Exception as e:
+        return type(e)
+    return None
+
+
+@pytest.mark.parametrize("datos", MAL_FORMADOS.values(), ids=MAL_FORMADOS.keys())
+def test_audio_temporal_falla_igual_que_bytes(datos):
+    with AudioTemporal.desde_bytes(datos) as audio:
+        assert _error(lambda: extraer_prefijo_wav(audio, 10)) is _error(lambda: extraer_prefijo_wav(datos, 10))
+        assert (_error(lambda: list(fragmentos_wav_por_silencios(audio)))
+                is _error(lambda: list(fragmentos_wav_por_silencios(datos))))
+
+
+@pytest.mark.parametrize("datos", MAL_FORMADOS.values(), ids=MAL_FORMADOS.keys())
+def test_normalizar_no_lanza_con_wav_mal_formado(datos):
+    assert isinstance(normalizar_audio(datos), bytes)
+    with AudioTemporal.desde_bytes(datos) as audio:
+        assert isinstance(normalizar_audio(audio), AudioTemporal)
+    assert duracion_wav(datos) is None or duracion_wav(datos) > 0
+
+
+def test_liberar_audio_espera_a_su_normalizacion(monkeypatch):
+    puede_terminar = threading.Event()
+
+    def normalizar_lento(audio):
+        puede_terminar.wait(5)
+        return AudioTemporal.desde_bytes(audio.leer(), audio.nombre)
+
+    monkeypatch.setattr(modulo_audio, "normalizar_audio", normalizar_lento)
+    audio = AudioTemporal.desde_bytes(WAV[:1000])
+    futuro = normalizar_en_segundo_plano(audio)
+
+    liberar_audio(audio)
+    assert not audio._fichero.closed
+    puede_terminar.set()
+    futuro.result(timeout=5).cerrar()
+    assert audio._fichero.closed
+
+
+def test_liberar_audio_no_cierra_el_que_es_su_propia_normalizacion(monkeypatch):
+    monkeypatch.setattr(modulo_audio, "normalizar_audio", lambda audio: audio)
+    audio = AudioTemporal.desde_bytes(WAV[:1000])
+    normalizar_en_segundo_plano(audio).result(timeout=5)
+
+    liberar_audio(audio)
+
+    assert not audio._fichero.closed
\ No newline at end of file
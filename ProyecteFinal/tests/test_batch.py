@@ -0,0 +1,39 @@
+import csv
+
+from batch import COLUMNAS_RESULTADOS, huella_fichero, preparar_resultados
+from services.historial import crear_registro
+
+
+def _escribir(ruta, filas):
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUMNAS_RESULTADOS, restval="")
+        escritor.writeheader()
+        escritor.writerows(filas)
+
+
+def test_relanzar_quita_las_filas_de_los_ficheros_que_se_repiten(tmp_path):
+    correcto, fallido, modificado, ajeno = (str(tmp_path / n) for n in ("a.txt", "b.txt", "c.txt", "d.txt"))
+    for ruta in (correcto, fallido, modificado):
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("hola")
+    resultados = str(tmp_path / "resultados.csv")
+    _escribir(resultados, [
+        {"archivo": correcto, "huella": huella_fichero(correcto), "estado": "ok"},
+        {"archivo": fallido, "huella": huella_fichero(fallido), "estado": "error"},
+        {"archivo": modificado, "huella": "otra", "estado": "ok"},
+        {"archivo": ajeno, "huella": "x", "estado": "error"},
+    ])
+
+    completados = preparar_resultados(resultados, [correcto, fallido, modificado])
+
+    assert completados == {correcto}
+    with open(resultados, newline="", encoding="utf-8") as f:
+        assert [fila["archivo"] for fila in csv.DictReader(f)] == [correcto, ajeno]
+
+
+def test_sin_deteccion_el_idioma_origen_es_el_configurado():
+    config_origen = {"deteccion_automatica": False, "idioma_stt": "fr-FR", "idioma_detectado": None}
+
+    fila = crear_registro("a.wav", "bonjour", "hello", config_origen, {"idioma": "en", "voz": "en-US-AriaNeural"})
+
+    assert fila["idioma_origen"] == "fr-FR"
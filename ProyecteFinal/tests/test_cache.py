@@ -0,0 +1,69 @@
+import os
+
+from utils import cache as modulo_cache
+from utils.audio_temporal import AudioTemporal
+from utils.cache import MemoryCache, SQLiteCache, cache_persistente, clave_cache, configurar_cache
+
+
+def test_sqlite_respeta_max_bytes_sin_sumar_en_cada_set(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), max_bytes=200_000)
+    for i in range(100):
+        cache.set(f"clave{i}", os.urandom(5000))
+
+    assert cache.estadisticas()["bytes"] <= 200_000
+    assert cache._bytes == cache._sumar_tamaño()
+    assert cache.get("clave99") is not None
+    assert cache.get("clave0") is None
+
+
+def test_sqlite_borra_caducados_cada_n_escrituras(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo_cache, "CACHE_EXPULSION_CADA", 5)
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.set("caduca", "valor", ttl=-1)
+    for i in range(4):
+        cache.set(f"clave{i}", "valor")
+
+    assert cache._conn.execute("SELECT COUNT(*) FROM cache WHERE clave = 'caduca'").fetchone()[0] == 0
+
+
+def test_reemplazar_una_clave_no_duplica_su_tamaño(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    for _ in range(3):
+        cache.set("clave", b"x" * 1000)
+    assert cache._bytes == cache._sumar_tamaño()
+
+
+def test_sqlite_descuenta_los_caducados_que_borra_get(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.set("efimera", os.urandom(5000), ttl=-1)
+    cache.set("fija", os.urandom(3000))
+
+    assert cache.get("efimera") is None
+    assert cache._bytes == cache._sumar_tamaño()
+
+
+def test_bytes_y_audio_temporal_comparten_clave():
+    audio = os.urandom(10_000)
+    with AudioTemporal.desde_bytes(audio) as temporal:
+        assert clave_cache("stt", audio, "es-ES") == clave_cache("stt", temporal, "es-ES")
+    assert clave_cache("stt", audio, "es-ES") != clave_cache("stt", audio[1:], "es-ES")
+
+
+def test_posicion_y_nombre_comparten_entrada():
+    configurar_cache(MemoryCache())
+    llamadas = []
+
+    class Servicio:
+        @cache_persistente("prueba")
+        def traducir(self, texto, idioma):
+            llamadas.append(texto)
+            return texto.upper()
+
+    try:
+        servicio = Servicio()
+        assert servicio.traducir("hola", "en") == "HOLA"
+        assert servicio.traducir("hola", idioma="en") == "HOLA"
+        assert servicio.traducir(idioma="en", texto="hola") == "HOLA"
+        assert llamadas == ["hola"]
+    finally:
+        configurar_cache(None)
\ No newline at end of file
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from utils.coalescencia import GrupoVuelos
+
+
+def test_si_el_lider_se_cancela_un_seguidor_repite_la_llamada():
+    grupo = GrupoVuelos()
+    llamadas = []
+
+    async def consulta():
+        llamadas.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def escenario():
+        lider = asyncio.create_task(grupo.ejecutar_async("clave", "prueba", consulta))
+        await asyncio.sleep(0.01)
+        seguidores = [asyncio.create_task(grupo.ejecutar_async("clave", "prueba", consulta)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        lider.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lider
+        return await asyncio.gather(*seguidores)
+
+    assert asyncio.run(escenario()) == ["ok", "ok", "ok"]
+    assert len(llamadas) == 2
+    assert grupo.en_vuelo() == 0
+
+
+def test_las_excepciones_normales_se_comparten():
+    grupo = GrupoVuelos()
+    llamadas = []
+
+    async def consulta():
+        llamadas.append(1)
+        await asyncio.sleep(0.02)
+        raise ValueError("fallo")
+
+    async def escenario():
+        tareas = [asyncio.create_task(grupo.ejecutar_async("clave", "prueba", consulta)) for _ in range(3)]
+        return await asyncio.gather(*tareas, return_exceptions=True)
+
+    resultados = asyncio.run(escenario())
+    assert all(isinstance(r, ValueError) for r in resultados)
+    assert len(llamadas) == 1
@@ -0,0 +1,55 @@
+import asyncio
+import socket
+
+import pytest
+
+from services.conversacion import ServidorConversacion, emitir_token, origen_permitido, verificar_token
+
+websockets = pytest.importorskip("websockets")
+from websockets.asyncio.client import connect  # noqa: E402
+from websockets.exceptions import InvalidStatus  # noqa: E402
+
+
+def test_el_token_solo_vale_para_su_sesion():
+    token = emitir_token("sesion-a")
+    assert verificar_token(token, "sesion-a")
+    assert not verificar_token(token, "sesion-b")
+    assert not verificar_token(None, "sesion-a")
+    assert not verificar_token("0." + token.partition(".")[2], "sesion-a")
+
+
+def test_origen_del_mismo_host():
+    assert origen_permitido("http://localhost:8501", "localhost:8766")
+    assert not origen_permitido("https://evil.example", "localhost:8766")
+    assert origen_permitido(None, "localhost:8766")
+
+
+@pytest.fixture(scope="module")
+def puerto():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        libre = s.getsockname()[1]
+    servidor = ServidorConversacion(pipeline=None, puerto=libre)
+    servidor.start()
+    assert servidor.listo.wait(timeout=10)
+    return libre
+
+
+def _handshake(puerto, consulta, origen=None):
+    async def conectar():
+        cabeceras = {"Origin": origen} if origen else None
+        async with connect(f"ws://127.0.0.1:{puerto}/?{consulta}", additional_headers=cabeceras):
+            return 101
+
+    try:
+        return asyncio.run(conectar())
+    except InvalidStatus as e:
+        return e.response.status_code
+
+
+def test_servidor_exige_token_y_origen(puerto):
+    token = emitir_token("s")
+    assert _handshake(puerto, "origen=es-ES&destino=en&voz=v&sesion=s") == 403
+    assert _handshake(puerto, f"sesion=s&token={token}", origen="https://evil.example") == 403
+    assert _handshake(puerto, f"sesion=otra&token={token}", origen="http://127.0.0.1:8501") == 403
+    assert _handshake(puerto, f"sesion=s&token={token}", origen="http://127.0.0.1:8501") == 101
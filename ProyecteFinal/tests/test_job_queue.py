@@ -0,0 +1,187 @@
+import os
+import time
+
+import pytest
+
+from services import job_queue
+from services.job_queue import ColaTrabajos, PENDIENTE, SUBIENDO
+
+
+@pytest.fixture
+def cola(tmp_path):
+    return ColaTrabajos(str(tmp_path / "trabajos.sqlite"))
+
+
+def test_el_audio_se_reclama_entero(cola, monkeypatch):
+    monkeypatch.setattr(job_queue, "BLOQUES_POR_TRANSACCION", 2)
+    audio = os.urandom(job_queue.TAMAÑO_BLOQUE_AUDIO * 5 + 123)
+    trabajo_id = cola.enviar(audio, "a.wav", {"idioma": "es"}, {})
+
+    assert cola.estado(trabajo_id)["estado"] == PENDIENTE
+    trabajo = cola.reclamar()
+    assert trabajo["id"] == trabajo_id
+    assert trabajo["audio_bytes"].leer() == audio
+
+
+def test_una_subida_interrumpida_no_llega_a_los_workers(cola, monkeypatch):
+    def bloques_que_fallan(audio_bytes):
+        yield b"primer bloque"
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(job_queue, "BLOQUES_POR_TRANSACCION", 1)
+    monkeypatch.setattr(job_queue, "_bloques", bloques_que_fallan)
+    with pytest.raises(OSError):
+        cola.enviar(b"audio", "a.wav", {}, {})
+
+    assert cola.reclamar() is None
+    assert cola._conn.execute("SELECT COUNT(*) FROM trabajos_audio").fetchone()[0] == 0
+
+
+def test_reencolar_huerfanos_borra_subidas_abandonadas(cola):
+    cola._conn.execute(
+        """INSERT INTO trabajos (id, clave, estado, creado, actualizado, config_origen, config_destino)
+           VALUES ('viejo', 'c', ?, 0, 0, '{}', '{}')""", (SUBIENDO,)
+    )
+    cola._conn.execute("INSERT INTO trabajos_audio (trabajo_id, orden, datos) VALUES ('viejo', 0, x'00')")
+    cola.reencolar_huerfanos()
+
+    assert cola.estado("viejo") is None
+    assert cola._conn.execute("SELECT COUNT(*) FROM trabajos_audio").fetchone()[0] == 0
+    assert cola.reclamar() is None
+
+
+def test_purgar_terminados_respeta_el_ttl(cola):
+    viejo = cola.enviar(b"viejo", "a.wav", {"n": 1}, {})
+    nuevo = cola.enviar(b"nuevo", "b.wav", {"n": 2}, {})
+    pendiente = cola.enviar(b"pendiente", "c.wav", {"n": 3}, {})
+    for trabajo_id in (viejo, nuevo):
+        cola.reclamar()["audio_bytes"].cerrar()
+        cola.completar(trabajo_id, {"texto_original": "hola", "audio_resultado": b"voz"})
+    cola._conn.execute("UPDATE trabajos SET actualizado = 0 WHERE id IN (?, ?)", (viejo, pendiente))
+
+    assert cola.purgar_terminados(3600) == 1
+    assert cola.estado(viejo) is None
+    assert cola.resultado(nuevo)["audio_resultado"] == b"voz"
+    assert cola.estado(pendiente) is not None
+
+
+def test_un_error_del_worker_conserva_la_configuracion_de_origen(cola):
+    config_origen = {"idioma_stt": "es-ES", "deteccion_automatica": False}
+    trabajo_id = cola.enviar(b"audio", "a.wav", config_origen, {"idioma": "en"})
+    cola.reclamar()["audio_bytes"].cerrar()
+    cola.completar(trabajo_id, {"error": "Error: se cayó la red"})
+
+    resultado = cola.resultado(trabajo_id)
+    assert resultado["error"] == "Error: se cayó la red"
+    assert resultado["config_origen"] == config_origen
+
+
+def test_las_traducciones_multidestino_se_guardan(cola):
+    destinos = [{"idioma": "en", "voz": "en-US-A"}, {"idioma": "fr", "voz": "fr-FR-B"}]
+    trabajo_id = cola.enviar(b"audio", "a.wav", {}, {"destinos": destinos})
+    cola.reclamar()["audio_bytes"].cerrar()
+    cola.completar(trabajo_id, {
+        "texto_original": "hola", "texto_traducido": "hello", "audio_resultado": b"en",
+        "traducciones": [
+            {"idioma": "en", "voz": "en-US-A", "texto": "hello", "audio": b"en", "error": None},
+            {"idioma": "fr", "voz": "fr-FR-B", "texto": None, "audio": None, "error": "sin voz"},
+        ]
+    })
+
+    assert cola.estado(trabajo_id)["traducciones"] == [
+        {"idioma": "en", "voz": "en-US-A", "texto": "hello", "error": None},
+        {"idioma": "fr", "voz": "fr-FR-B", "texto": None, "error": "sin voz"},
+    ]
+    traducciones = cola.resultado(trabajo_id)["traducciones"]
+    assert [t["audio"] for t in traducciones] == [b"en", None]
+
+    cola._conn.execute("UPDATE trabajos SET actualizado = 0 WHERE id = ?", (trabajo_id,))
+    assert cola.purgar_terminados(3600) == 1
+    assert cola._conn.execute("SELECT COUNT(*) FROM trabajos_traducciones").fetchone()[0] == 0
+
+
+def test_una_base_antigua_gana_la_columna_de_traducciones(tmp_path):
+    import sqlite3
+    ruta = str(tmp_path / "antigua.sqlite")
+    sqlite3.connect(ruta).execute(
+        """CREATE TABLE trabajos (id TEXT PRIMARY KEY, clave TEXT NOT NULL, estado TEXT NOT NULL,
+           creado REAL NOT NULL, actualizado REAL NOT NULL, audio_nombre TEXT, audio_bytes BLOB,
+           config_origen TEXT NOT NULL, config_destino TEXT NOT NULL, texto_original TEXT,
+           texto_traducido TEXT, audio_resultado BLOB, error TEXT)"""
+    )
+    cola = ColaTrabajos(ruta)
+    trabajo_id = cola.enviar(b"audio", "a.wav", {}, {})
+    assert cola.estado(trabajo_id)["traducciones"] is None
+
+
+def test_un_trabajo_largo_con_latido_no_se_reencola(cola, monkeypatch):
+    import asyncio
+    from services.job_queue import EN_PROCESO, WorkerTrabajos
+
+    monkeypatch.setattr(job_queue, "JOBS_LATIDO", 0.05)
+
+    class PipelineLenta:
+        def crear_semaforos(self):
+            return {}
+
+        async def procesar_trabajo(self, trabajo, semaforos):
+            await asyncio.sleep(0.3)
+            # A mitad de trabajo, otro worker arranca y busca huérfanos de más de 0.1 s
+            cola.reencolar_huerfanos(0.1)
+            assert cola.estado(trabajo["id"])["estado"] == EN_PROCESO
+            return {"texto_original": "hola"}
+
+    trabajo_id = cola.enviar(b"audio", "a.wav", {}, {})
+    worker = WorkerTrabajos(cola, PipelineLenta(), intervalo=0.05)
+    worker.start()
+    for _ in range(100):
+        if cola.resultado(trabajo_id):
+            break
+        time.sleep(0.05)
+    worker.detener()
+    worker.join(timeout=5)
+
+    assert cola.resultado(trabajo_id)["texto_original"] == "hola"
+    assert cola.estado(trabajo_id)["error"] is None
+
+
+def test_envios_identicos_simultaneos_dan_un_solo_trabajo(cola):
+    from concurrent.futures import ThreadPoolExecutor
+
+    audio = os.urandom(job_queue.TAMAÑO_BLOQUE_AUDIO * 40)
+    with ThreadPoolExecutor(8) as pool:
+        ids = set(pool.map(lambda _: cola.enviar(audio, "a.wav", {"idioma": "es"}, {}), range(8)))
+
+    assert len(ids) == 1
+    assert cola._conn.execute("SELECT COUNT(*) FROM trabajos").fetchone()[0] == 1
+
+
+def test_el_audio_ya_normalizado_no_se_normaliza_otra_vez(cola, monkeypatch):
+    import asyncio
+    from services import pipeline as modulo_pipeline
+    from services.pipeline import PipelineTraduccion
+
+    normalizados = []
+    monkeypatch.setattr(modulo_pipeline, "normalizar_audio", lambda audio: normalizados.append(audio) or audio)
+
+    class Voz:
+        async def transcribir_audio_async(self, audio, idioma):
+            return "hola"
+
+        async def sintetizar_voz_async(self, texto, voz, formato=None):
+            return b"voz"
+
+    class Traductor:
+        async def traducir_texto_async(self, texto, origen, destino):
+            return "hello"
+
+    config_origen = {"deteccion_automatica": False, "idioma_stt": "es-ES", "idioma_traduccion": "es"}
+    pipeline = PipelineTraduccion(Voz(), Traductor())
+    for audio, normalizado in ((b"ya normalizado", True), (b"sin normalizar", False)):
+        cola.enviar(audio, "a.wav", config_origen, {"idioma": "en", "voz": "v"}, normalizado=normalizado)
+        trabajo = cola.reclamar()
+        assert trabajo["normalizado"] is normalizado
+        asyncio.run(pipeline.procesar_trabajo(trabajo, pipeline.crear_semaforos()))
+        trabajo["audio_bytes"].cerrar()
+
+    assert len(normalizados) == 1
\ No newline at end of file
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from services.translation_batcher import TraductorPorLotes
+
+
+class TraductorFalso:
+    def __init__(self, recortar=0):
+        self.recortar = recortar
+        self.lotes = []
+
+    def traducir_lote(self, textos, idioma_origen, idiomas_destino):
+        self.lotes.append(list(textos))
+        resultados = [{destino: texto.upper() for destino in idiomas_destino} for texto in textos]
+        return resultados[:len(resultados) - self.recortar]
+
+
+def test_el_temporizador_de_un_lote_enviado_no_vacia_el_siguiente():
+    servicio = TraductorFalso()
+    lotes = TraductorPorLotes(servicio, max_elementos=2, espera_maxima=0.3)
+
+    lotes.enviar("a", "es", ["en"])
+    time.sleep(0.2)
+    lotes.enviar("b", "es", ["en"])       # lote completo: se envía sin esperar
+    futuro = lotes.enviar("c", "es", ["en"])
+    time.sleep(0.2)                        # vence el temporizador de "a", no el de "c"
+
+    assert not futuro.done()
+    assert futuro.result(timeout=1) == {"en": "C"}
+    assert servicio.lotes == [["a", "b"], ["c"]]
+    lotes.cerrar()
+
+
+def test_si_faltan_traducciones_los_futuros_sobrantes_fallan():
+    lotes = TraductorPorLotes(TraductorFalso(recortar=1), max_elementos=2)
+
+    primero = lotes.enviar("a", "es", ["en"])
+    segundo = lotes.enviar("b", "es", ["en"])
+
+    assert primero.result(timeout=1) == {"en": "A"}
+    with pytest.raises(RuntimeError):
+        segundo.result(timeout=1)
+    lotes.cerrar()
@@ -0,0 +1,42 @@
+import sqlite3
+
+from services.translation_memory import MemoriaTraduccion
+
+
+def test_sin_ignorar_forma_solo_reutiliza_exactas(tmp_path):
+    memoria = MemoriaTraduccion(str(tmp_path / "tm.sqlite"))
+    memoria.guardar([("Hola, ¿qué tal estás?", "Hi, how are you?")], "es", "en")
+
+    assert memoria.buscar(["Hola,  ¿qué tal estás?", "hola ¿qué tal estás?"], "es", "en") == ["Hi, how are you?", None]
+
+
+def test_ignorar_forma_conserva_palabras_y_signo_final(tmp_path):
+    memoria = MemoriaTraduccion(str(tmp_path / "tm.sqlite"), ignorar_forma=True)
+    memoria.guardar([("El paquete ha sido enviado.", "The parcel has been sent."),
+                     ("¿Ha llegado el paquete?", "Has the parcel arrived?")], "es", "en")
+
+    assert memoria.buscar([
+        "el paquete, ha sido enviado.",   # solo comas y mayúsculas
+        "El paquete no ha sido enviado.",  # una negación
+        "El paquete ha sido enviado?",     # otro signo final
+        "Ha llegado el paquete.",
+        "¿ha llegado el paquete?",
+    ], "es", "en") == ["The parcel has been sent.", None, None, None, "Has the parcel arrived?"]
+
+
+def test_migra_memorias_con_indice_lsh(tmp_path):
+    ruta = str(tmp_path / "tm.sqlite")
+    conn = sqlite3.connect(ruta)
+    conn.execute("""CREATE TABLE segmentos (id INTEGER PRIMARY KEY AUTOINCREMENT, par TEXT NOT NULL,
+                    clave TEXT NOT NULL, origen TEXT NOT NULL, destino TEXT NOT NULL, creado REAL NOT NULL,
+                    usos INTEGER NOT NULL DEFAULT 0, UNIQUE (par, clave))""")
+    conn.execute("CREATE TABLE lsh (par TEXT NOT NULL, banda TEXT NOT NULL, segmento_id INTEGER NOT NULL)")
+    conn.execute("INSERT INTO segmentos (par, clave, origen, destino, creado) VALUES ('es>en', 'x', 'Buenos días.', 'Good morning.', 0)")
+    conn.commit()
+    conn.close()
+
+    memoria = MemoriaTraduccion(ruta, ignorar_forma=True)
+
+    assert memoria.buscar(["buenos  Días."], "es", "en") == ["Good morning."]
+    tablas = {fila[0] for fila in memoria._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "lsh" not in tablas
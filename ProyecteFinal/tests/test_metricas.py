@@ -0,0 +1,23 @@
+from utils.metrics import RegistroMetricas, servir_metricas
+
+
+def test_prometheus_declara_el_tipo_una_vez_por_metrica():
+    registro = RegistroMetricas()
+    registro.incrementar("peticiones_total", endpoint="stt")
+    registro.incrementar("peticiones_total", endpoint="tts")
+    registro.observar("etapa_segundos", 0.2, etapa="stt")
+
+    lineas = registro.exportar_prometheus().splitlines()
+
+    assert lineas.count("# TYPE peticiones_total counter") == 1
+    assert lineas.count("# TYPE etapa_segundos histogram") == 1
+    assert lineas.index("# TYPE peticiones_total counter") < lineas.index('peticiones_total{endpoint="stt"} 1')
+
+
+def test_servidor_de_metricas_solo_local_por_defecto():
+    servidor = servir_metricas(0)
+    try:
+        assert servidor.server_address[0] == "127.0.0.1"
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,54 @@
+from services import pipeline as modulo_pipeline
+from services.pipeline import PipelineTraduccion
+from utils.audio_temporal import AudioTemporal
+
+
+class VozFalsa:
+    async def transcribir_audio_async(self, audio_bytes, idioma):
+        if audio_bytes == b"roto":
+            raise ValueError("audio ilegible")
+        return "hola"
+
+    async def sintetizar_voz_async(self, texto, voz, formato=None):
+        return b"voz"
+
+
+class TraductorFalso:
+    async def traducir_texto_async(self, texto, origen, destino):
+        return "hello"
+
+
+def test_un_trabajo_que_falla_no_interrumpe_el_lote():
+    config_origen = {"deteccion_automatica": False, "idioma_stt": "es-ES", "idioma_traduccion": "es"}
+    config_destino = {"idioma": "en", "voz": "en-US-JennyNeural"}
+    trabajos = [
+        {"audio_bytes": audio, "audio_nombre": nombre, "config_origen": config_origen,
+         "config_destino": config_destino}
+        for nombre, audio in [("a.wav", b"bien"), ("b.wav", b"roto"), ("c.wav", b"bien")]
+    ]
+
+    resultados = PipelineTraduccion(VozFalsa(), TraductorFalso(), normalizar=False).procesar_lote(trabajos)
+
+    assert [r["audio_nombre"] for r in resultados] == ["a.wav", "b.wav", "c.wav"]
+    assert resultados[1]["error"] == "Error: audio ilegible"
+    assert resultados[0]["audio_resultado"] == resultados[2]["audio_resultado"] == b"voz"
+
+
+def test_cierra_la_copia_normalizada_pero_no_el_audio_del_llamante(monkeypatch):
+    copias = []
+
+    def normalizar_falso(audio):
+        copias.append(AudioTemporal.desde_bytes(audio.leer(), audio.nombre))
+        return copias[-1]
+
+    monkeypatch.setattr(modulo_pipeline, "normalizar_audio", normalizar_falso)
+    config_origen = {"deteccion_automatica": False, "idioma_stt": "es-ES", "idioma_traduccion": "es"}
+    with AudioTemporal.desde_bytes(b"bien", "a.wav") as original:
+        trabajo = {"audio_bytes": original, "audio_nombre": "a.wav", "config_origen": config_origen,
+                   "config_destino": {"idioma": "en", "voz": "en-US-JennyNeural"}}
+
+        resultado, = PipelineTraduccion(VozFalsa(), TraductorFalso()).procesar_lote([trabajo])
+
+        assert resultado["texto_original"] == "hola"
+        assert copias[0]._fichero.closed
+        assert not original._fichero.closed
\ No newline at end of file
@@ -0,0 +1,64 @@
+import requests
+
+from utils.http_client import HTTPClient
+from utils.rate_limit import Circuito, obtener_circuito
+
+
+class SesionFija:
+    """Sesión HTTP falsa que siempre responde con el mismo código"""
+
+    def __init__(self, codigo):
+        self.codigo = codigo
+        self.peticiones = 0
+
+    def post(self, url, **kwargs):
+        self.peticiones += 1
+        respuesta = requests.Response()
+        respuesta.status_code = self.codigo
+        respuesta._content = b""
+        return respuesta
+
+
+def abrir_circuito(circuito):
+    circuito.fallo()
+    assert circuito.abierto
+
+
+def test_prueba_con_429_libera_el_circuito_semiabierto():
+    endpoint = "prueba-429.example"
+    circuito = obtener_circuito(endpoint)
+    circuito.umbral_fallos, circuito.tiempo_apertura = 1, 0
+    abrir_circuito(circuito)
+
+    cliente = HTTPClient(max_retries=1)
+    cliente.session = SesionFija(429)
+    respuesta = cliente.post_with_retry(f"https://{endpoint}/ruta")
+
+    assert respuesta.status_code == 429
+    assert cliente.session.peticiones == 1
+    # El 429 no es un veredicto: el circuito sigue abierto pero admite otra prueba
+    assert circuito.abierto
+    assert circuito.permitir()
+
+
+def test_prueba_sin_veredicto_solo_libera_la_suya():
+    circuito = Circuito(umbral_fallos=1, tiempo_apertura=0)
+    abrir_circuito(circuito)
+
+    prueba = circuito.solicitar()
+    assert prueba
+    assert circuito.solicitar() is None  # solo una prueba a la vez
+
+    circuito.liberar_prueba(prueba - 1)
+    assert circuito.solicitar() is None
+    circuito.liberar_prueba(prueba)
+    assert circuito.solicitar()
+
+
+def test_prueba_con_exito_cierra_el_circuito():
+    circuito = Circuito(umbral_fallos=1, tiempo_apertura=0)
+    abrir_circuito(circuito)
+    assert circuito.solicitar()
+    circuito.exito()
+    assert not circuito.abierto
+    assert circuito.solicitar() == 0
@@ -0,0 +1,41 @@
+import numpy as np
+
+from utils.segmentador import SegmentadorVoz
+
+FRECUENCIA = 16000
+
+
+def _pcm(muestras):
+    return (np.clip(muestras, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def _voz_con_ruido(ruido_rms, segundos_voz=1.0, segundos_pausa=1.0, repeticiones=3):
+    """Pausa inicial y tonos de voz alternados con pausas, todo sobre ruido blanco"""
+    rng = np.random.default_rng(0)
+    tramos = [np.zeros(int(FRECUENCIA * segundos_pausa))]
+    for _ in range(repeticiones):
+        t = np.arange(int(FRECUENCIA * segundos_voz)) / FRECUENCIA
+        tramos += [0.3 * np.sin(2 * np.pi * 220 * t), np.zeros(int(FRECUENCIA * segundos_pausa))]
+    señal = np.concatenate(tramos)
+    return _pcm(señal + rng.normal(0, ruido_rms, len(señal)))
+
+
+def _segmentar(audio, bloque=3200):
+    segmentador = SegmentadorVoz()
+    enunciados = []
+    for i in range(0, len(audio), bloque):
+        enunciados += segmentador.añadir(audio[i: i + bloque])
+    return enunciados + segmentador.terminar()
+
+
+def test_separa_enunciados_en_silencio():
+    assert len(_segmentar(_voz_con_ruido(0.0005))) == 3
+
+
+def test_aprende_el_piso_con_ruido_por_encima_del_umbral():
+    # ~ -32 dBFS de ruido de fondo: por encima del umbral absoluto de -45 dBFS
+    enunciados = _segmentar(_voz_con_ruido(0.025))
+    assert len(enunciados) == 3
+    for enunciado, inicio in zip(enunciados, (1.0, 3.0, 5.0)):
+        assert abs(enunciado["inicio"] - inicio) < 0.4
+        assert enunciado["fin"] - enunciado["inicio"] < 1.5
@@ -0,0 +1,20 @@
+from services.speech_service import SpeechService
+from utils.texto import agrupar_frases
+
+
+def test_sin_minimo_se_agrupa_hasta_el_maximo():
+    assert agrupar_frases(["Hola.", "Qué tal.", "Bien."], 15) == ["Hola. Qué tal.", "Bien."]
+
+
+def test_con_minimo_una_frase_por_bloque_y_las_cortas_juntas():
+    frases = ["Sí.", "Claro.", "Esta frase ya supera el mínimo.", "Y esta otra también lo supera."]
+    assert agrupar_frases(frases, 250, 20) == [
+        "Sí. Claro. Esta frase ya supera el mínimo.", "Y esta otra también lo supera."
+    ]
+
+
+def test_el_primer_segmento_tts_es_una_frase():
+    texto = "Buenos días a todos los presentes. " * 3 + "Gracias."
+    segmentos = SpeechService.segmentar_texto(texto)
+    assert segmentos[0] == "Buenos días a todos los presentes."
+    assert len(segmentos) == 4
@@ -0,0 +1,493 @@
+import io
+import os
+import wave
+import struct
+import shutil
+import tempfile
+import weakref
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from utils.audio_temporal import AudioTemporal, TAMAÑO_BLOQUE_AUDIO
+from utils.metrics import cronometrar
+
+# Formato que espera el endpoint STT: PCM 16 bits, mono, 16 kHz
+FRECUENCIA_STT = 16000
+
+# Lo que lanzan wave y numpy con un RIFF mal formado (p. ej. RuntimeError con un chunk de tamaño imposible)
+ERRORES_WAV = (RuntimeError, wave.Error, EOFError, ValueError)
+
+
+def es_wav(audio_bytes: bytes) -> bool:
+    return audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE"
+
+
+def es_ogg_opus(audio_bytes: bytes) -> bool:
+    # La cabecera OpusHead va en la primera página Ogg
+    return audio_bytes[:4] == b"OggS" and b"OpusHead" in audio_bytes[:128]
+
+
+def tipo_audio(audio_bytes: bytes) -> Tuple[str, str]:
+    """Tipo MIME y extensión de un audio según su cabecera (MP3 si no se reconoce)"""
+    if audio_bytes[:4] == b"OggS":
+        return "audio/ogg", "ogg"
+    if audio_bytes[:4] == b"\x1aE\xdf\xa3":
+        return "audio/webm", "webm"
+    if es_wav(audio_bytes):
+        return "audio/wav", "wav"
+    return "audio/mpeg", "mp3"
+
+
+def duracion_wav(audio_bytes: bytes) -> Optional[float]:
+    """Duración en segundos de un WAV PCM (bytes o AudioTemporal), o None si no es un WAV legible"""
+    if not es_wav(audio_bytes):
+        return None
+    try:
+        with wave.open(_abrir(audio_bytes), "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except ERRORES_WAV:
+        return None
+
+
+def duracion_ogg_opus(audio_bytes: bytes) -> Optional[float]:
+    """Duración de un Ogg/Opus según la posición (a 48 kHz) de su última página"""
+    ultima = audio_bytes.rfind(b"OggS")
+    if not es_ogg_opus(audio_bytes) or ultima < 0 or len(audio_bytes) < ultima + 14:
+        return None
+    return int.from_bytes(audio_bytes[ultima + 6: ultima + 14], "little") / 48000
+
+
+def _abrir(audio_bytes) -> io.BufferedIOBase:
+    if isinstance(audio_bytes, AudioTemporal):
+        return audio_bytes.abrir()
+    return io.BytesIO(audio_bytes)
+
+
+def leer_wav(audio_bytes: bytes) -> Tuple[tuple, bytes]:
+    """Devuelve los parámetros y los frames PCM crudos de un WAV"""
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+        return wav.getparams(), wav.readframes(wav.getnframes())
+
+
+def leer_cabecera_wav(audio: AudioTemporal) -> Tuple[tuple, int, int]:
+    """
+    Parámetros de un WAV en disco y el rango de bytes [inicio, fin) de sus frames
+
+    Con un RIFF mal formado lanza lo mismo que leer_wav con los bytes (ERRORES_WAV).
+    """
+    lector = audio.abrir()
+    with wave.open(lector, "rb") as wav:
+        params = wav.getparams()
+        inicio = lector.tell()
+    fin = min(len(audio), inicio + params.nframes * params.sampwidth * params.nchannels)
+    return params, inicio, fin
+
+
+def cabecera_wav(num_bytes: int, canales: int, ancho_muestra: int, sample_rate: int) -> bytes:
+    """Cabecera RIFF de 44 bytes para num_bytes de frames PCM (para escribir el WAV por bloques)"""
+    bytes_por_segundo = sample_rate * canales * ancho_muestra
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + num_bytes, b"WAVE", b"fmt ", 16, 1, canales,
+                       sample_rate, bytes_por_segundo, canales * ancho_muestra, ancho_muestra * 8,
+                       b"data", num_bytes)
+
+
+def escribir_wav(frames: bytes, canales: int, ancho_muestra: int, sample_rate: int) -> bytes:
+    """Empaqueta frames PCM crudos en un WAV"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(canales)
+        wav.setsampwidth(ancho_muestra)
+        wav.setframerate(sample_rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def extraer_prefijo_wav(audio_bytes: bytes, segundos: float) -> Tuple[bytes, bool]:
+    """
+    Devuelve los primeros segundos de un WAV y si éstos cubren el audio completo
+
+    Para formatos que no son WAV se devuelve el audio entero. De un
+    AudioTemporal solo se leen la cabecera y el prefijo.
+    """
+    if not es_wav(audio_bytes):
+        return audio_bytes, True
+    if isinstance(audio_bytes, AudioTemporal):
+        params, inicio, fin = leer_cabecera_wav(audio_bytes)
+        num_bytes = int(segundos * params.framerate) * params.sampwidth * params.nchannels
+        if inicio + num_bytes >= fin:
+            return audio_bytes, True
+        return escribir_wav(audio_bytes.leer(inicio, inicio + num_bytes), params.nchannels,
+                            params.sampwidth, params.framerate), False
+    params, frames = leer_wav(audio_bytes)
+    num_frames = int(segundos * params.framerate)
+    if num_frames >= params.nframes:
+        return audio_bytes, True
+    tamaño_frame = params.sampwidth * params.nchannels
+    return escribir_wav(frames[: num_frames * tamaño_frame], params.nchannels,
+                        params.sampwidth, params.framerate), False
+
+
+def pcm_a_float_mono(frames: bytes, ancho_muestra: int, canales: int) -> np.ndarray:
+    """Convierte PCM entero (8/16/24/32 bits) a float32 mono en [-1, 1]"""
+    if ancho_muestra == 1:
+        muestras = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif ancho_muestra == 2:
+        muestras = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif ancho_muestra == 3:
+        bytes_24 = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        enteros = bytes_24[:, 0] | (bytes_24[:, 1] << 8) | (bytes_24[:, 2] << 16)
+        enteros = np.where(enteros & 0x800000, enteros - 0x1000000, enteros)
+        muestras = enteros.astype(np.float32) / 8388608.0
+    elif ancho_muestra == 4:
+        muestras = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Ancho de muestra no soportado: {ancho_muestra}")
+
+    if canales > 1:
+        muestras = muestras[: len(muestras) // canales * canales].reshape(-1, canales).mean(axis=1)
+    return muestras
+
+
+def energia_por_ventana(muestras: np.ndarray, tamaño_ventana: int) -> np.ndarray:
+    """RMS de cada ventana consecutiva (VAD por energía)"""
+    num_ventanas = len(muestras) // tamaño_ventana
+    if num_ventanas == 0:
+        return np.zeros(0, dtype=np.float32)
+    ventanas = muestras[: num_ventanas * tamaño_ventana].reshape(num_ventanas, tamaño_ventana)
+    return np.sqrt(np.mean(ventanas * ventanas, axis=1))
+
+
+def energia_wav_por_bloques(audio: AudioTemporal, inicio: int, fin: int, ancho_muestra: int,
+                            canales: int, tamaño_ventana: int) -> np.ndarray:
+    """energia_por_ventana de los frames PCM en [inicio, fin) leyendo un bloque cada vez"""
+    bytes_ventana = tamaño_ventana * ancho_muestra * canales
+    tamaño_bloque = max(1, TAMAÑO_BLOQUE_AUDIO // bytes_ventana) * bytes_ventana
+    energias = [
+        energia_por_ventana(pcm_a_float_mono(bloque, ancho_muestra, canales), tamaño_ventana)
+        for bloque in audio.bloques(inicio, fin, tamaño_bloque)
+    ]
+    return np.concatenate(energias) if energias else np.zeros(0, dtype=np.float32)
+
+
+def puntos_de_corte(energia: np.ndarray, ventanas_objetivo: int, ventanas_maximas: int) -> List[int]:
+    """
+    Elige índices de ventana donde cortar, buscando el tramo más silencioso
+
+    Cada fragmento dura como mínimo la mitad del objetivo y como máximo
+    ventanas_maximas; dentro de ese rango se corta en la ventana de menor energía.
+    """
+    cortes = []
+    inicio = 0
+    total = len(energia)
+    minimo = max(1, ventanas_objetivo // 2)
+    while total - inicio > ventanas_maximas:
+        tramo = energia[inicio + minimo: inicio + ventanas_maximas]
+        corte = inicio + minimo + int(np.argmin(tramo))
+        cortes.append(corte)
+        inicio = corte
+    return cortes
+
+
+def dividir_wav_por_silencios(audio_bytes: bytes, duracion_maxima: float = 55.0,
+                              duracion_objetivo: float = 20.0, ventana_ms: int = 30) -> List[bytes]:
+    """
+    Divide un WAV largo en fragmentos WAV cortados en silencios
+
+    Args:
+        audio_bytes: WAV PCM de entrada
+        duracion_maxima: Duración máxima de cada fragmento (segundos)
+        duracion_objetivo: Duración orientativa de cada fragmento (segundos)
+        ventana_ms: Tamaño de ventana del detector de actividad de voz
+
+    Returns:
+        Lista de WAVs con los mismos parámetros que la entrada, en orden
+    """
+    params, frames = leer_wav(audio_bytes)
+    tamaño_frame = params.sampwidth * params.nchannels
+    tamaño_ventana = max(1, params.framerate * ventana_ms // 1000)
+
+    muestras = pcm_a_float_mono(frames, params.sampwidth, params.nchannels)
+    energia = energia_por_ventana(muestras, tamaño_ventana)
+    limites = _limites_fragmentos(energia, tamaño_ventana, len(frames) // tamaño_frame,
+                                  duracion_maxima, duracion_objetivo, ventana_ms)
+
+    fragmentos = []
+    for inicio, fin in zip(limites, limites[1:]):
+        fragmentos.append(escribir_wav(
+            frames[inicio * tamaño_frame: fin * tamaño_frame],
+            params.nchannels, params.sampwidth, params.framerate
+        ))
+    return fragmentos
+
+
+def fragmentos_wav_por_silencios(audio_bytes, duracion_maxima: float = 55.0,
+                                 duracion_objetivo: float = 20.0, ventana_ms: int = 30) -> Iterator[bytes]:
+    """
+    Como dividir_wav_por_silencios, pero genera los fragmentos según se piden
+
+    Con un AudioTemporal la energía se calcula por bloques y cada fragmento se
+    lee del fichero al pedirlo: en memoria solo están los fragmentos en uso.
+    """
+    if not isinstance(audio_bytes, AudioTemporal):
+        yield from dividir_wav_por_silencios(audio_bytes, duracion_maxima, duracion_objetivo, ventana_ms)
+        return
+
+    params, inicio, fin = leer_cabecera_wav(audio_bytes)
+    tamaño_frame = params.sampwidth * params.nchannels
+    tamaño_ventana = max(1, params.framerate * ventana_ms // 1000)
+    energia = energia_wav_por_bloques(audio_bytes, inicio, fin, params.sampwidth, params.nchannels,
+                                      tamaño_ventana)
+    limites = _limites_fragmentos(energia, tamaño_ventana, (fin - inicio) // tamaño_frame,
+                                  duracion_maxima, duracion_objetivo, ventana_ms)
+
+    for desde, hasta in zip(limites, limites[1:]):
+        yield escribir_wav(
+            audio_bytes.leer(inicio + desde * tamaño_frame, inicio + hasta * tamaño_frame),
+            params.nchannels, params.sampwidth, params.framerate
+        )
+
+
+def _limites_fragmentos(energia: np.ndarray, tamaño_ventana: int, num_frames: int,
+                        duracion_maxima: float, duracion_objetivo: float, ventana_ms: int) -> List[int]:
+    """Frames donde empieza y acaba cada fragmento: [0, corte1, ..., num_frames]"""
+    cortes = puntos_de_corte(
+        energia,
+        int(duracion_objetivo * 1000 / ventana_ms),
+        int(duracion_maxima * 1000 / ventana_ms)
+    )
+    return [0] + [c * tamaño_ventana for c in cortes] + [num_frames]
+
+
+
+def decodificar_audio(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Decodifica WAV/WEBM/MP3/OGG a muestras float32 mono y su frecuencia
+
+    Los WAV PCM se leen directamente; el resto se decodifica con ffmpeg.
+    """
+    if not es_wav(audio_bytes):
+        audio_bytes = _decodificar_con_ffmpeg(audio_bytes)
+    params, frames = leer_wav(audio_bytes)
+    return pcm_a_float_mono(frames, params.sampwidth, params.nchannels), params.framerate
+
+
+def _decodificar_con_ffmpeg(audio_bytes: bytes) -> bytes:
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg no está instalado: no se pueden decodificar formatos distintos de WAV")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        entrada = os.path.join(directorio, "entrada")
+        salida = os.path.join(directorio, "salida.wav")
+        with open(entrada, "wb") as f:
+            f.write(audio_bytes)
+        subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", entrada,
+             "-acodec", "pcm_s16le", salida],
+            check=True
+        )
+        with open(salida, "rb") as f:
+            return f.read()
+
+
+def codificar_opus(audio_bytes: bytes, bitrate: str = "24k") -> Optional[bytes]:
+    """
+    Comprime un audio a Ogg/Opus con ffmpeg (perfil de voz)
+
+    A 24 kbit/s un minuto ocupa ~180 KB frente a ~1.9 MB en WAV PCM a 16 kHz.
+    Un AudioTemporal se comprime por bloques y devuelve otro AudioTemporal.
+    Devuelve None si ffmpeg no está disponible o falla, para enviar el original.
+    """
+    if shutil.which("ffmpeg") is None:
+        return None
+    argumentos = ["-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+                  # Complejidad media: casi el mismo tamaño que la máxima con ~40 % menos CPU
+                  "-compression_level", "5", "-f", "ogg"]
+    try:
+        if isinstance(audio_bytes, AudioTemporal):
+            return _ffmpeg_por_bloques(audio_bytes, argumentos) or None
+        proceso = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", *argumentos, "pipe:1"],
+            input=audio_bytes, capture_output=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"⚠️  No se pudo comprimir el audio a Opus: {e}. Se envía sin comprimir")
+        return None
+    return proceso.stdout or None
+
+
+def _ffmpeg_por_bloques(audio: AudioTemporal, argumentos: List[str]) -> AudioTemporal:
+    """
+    Pasa un AudioTemporal por ffmpeg (pipe:0 → pipe:1) sin tenerlo entero en memoria
+
+    Un hilo escribe la entrada bloque a bloque mientras la salida se vuelca a
+    otro AudioTemporal; los pipes limitan lo que hay en vuelo entre ambos.
+    """
+    proceso = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", *argumentos, "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    def alimentar():
+        try:
+            for bloque in audio.bloques():
+                proceso.stdin.write(bloque)
+            proceso.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg dejó de leer: el error llega con su código de salida
+
+    hilo = threading.Thread(target=alimentar, daemon=True, name="ffmpeg-entrada")
+    hilo.start()
+    try:
+        salida = AudioTemporal.desde_fichero(proceso.stdout, audio.nombre)
+    finally:
+        hilo.join()
+        errores = proceso.stderr.read()
+        proceso.wait()
+    if proceso.returncode != 0:
+        salida.cerrar()
+        raise subprocess.CalledProcessError(proceso.returncode, "ffmpeg", stderr=errores)
+    return salida
+
+
+def remuestrear(muestras: np.ndarray, origen: int, destino: int = FRECUENCIA_STT) -> np.ndarray:
+    """Cambia la frecuencia de muestreo (filtro paso bajo + interpolación lineal)"""
+    if origen == destino or len(muestras) == 0:
+        return muestras
+
+    if destino < origen:
+        # Filtro antialiasing: sinc enventanada con corte en la nueva Nyquist
+        corte = destino / origen / 2
+        n = np.arange(-32, 33)
+        filtro = 2 * corte * np.sinc(2 * corte * n) * np.hamming(len(n))
+        muestras = np.convolve(muestras, filtro / filtro.sum(), mode="same")
+
+    num_salida = int(round(len(muestras) * destino / origen))
+    posiciones = np.arange(num_salida) * (origen / destino)
+    return np.interp(posiciones, np.arange(len(muestras)), muestras).astype(np.float32)
+
+
+def recortar_silencios(muestras: np.ndarray, sample_rate: int, umbral_db: float = -40.0,
+                       margen_ms: int = 200, ventana_ms: int = 30) -> np.ndarray:
+    """Elimina el silencio inicial y final (relativo al pico de energía)"""
+    tamaño_ventana = max(1, sample_rate * ventana_ms // 1000)
+    energia = energia_por_ventana(muestras, tamaño_ventana)
+    inicio, fin = limites_sin_silencio(energia, tamaño_ventana, len(muestras), sample_rate, umbral_db, margen_ms)
+    return muestras[inicio:fin]
+
+
+def limites_sin_silencio(energia: np.ndarray, tamaño_ventana: int, num_muestras: int, sample_rate: int,
+                         umbral_db: float = -40.0, margen_ms: int = 200) -> Tuple[int, int]:
+    """Muestras [inicio, fin) que quedan al quitar el silencio inicial y final"""
+    if len(energia) == 0 or energia.max() == 0:
+        return 0, num_muestras
+
+    activas = np.flatnonzero(energia >= energia.max() * 10 ** (umbral_db / 20))
+    margen = sample_rate * margen_ms // 1000
+    inicio = max(0, activas[0] * tamaño_ventana - margen)
+    fin = min(num_muestras, (activas[-1] + 1) * tamaño_ventana + margen)
+    return int(inicio), int(fin)
+
+
+def float_a_pcm16(muestras: np.ndarray) -> bytes:
+    return (np.clip(muestras, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+@cronometrar("preproceso")
+def normalizar_audio(audio_bytes: bytes) -> bytes:
+    """
+    Prepara el audio para STT: decodifica, pasa a mono 16 kHz y recorta silencios
+
+    Un AudioTemporal se procesa por bloques y el resultado es otro AudioTemporal.
+
+    Returns:
+        WAV PCM 16 bits mono a 16 kHz (o el audio original si no se puede decodificar)
+    """
+    if isinstance(audio_bytes, AudioTemporal):
+        return _normalizar_audio_temporal(audio_bytes)
+    return _normalizar_bytes(audio_bytes)
+
+
+def _normalizar_bytes(audio_bytes: bytes) -> bytes:
+    try:
+        muestras, sample_rate = decodificar_audio(audio_bytes)
+    except ERRORES_WAV + (subprocess.CalledProcessError,) as e:
+        print(f"⚠️  No se pudo normalizar el audio: {e}. Se envía sin procesar")
+        return audio_bytes
+
+    muestras = remuestrear(muestras, sample_rate, FRECUENCIA_STT)
+    muestras = recortar_silencios(muestras, FRECUENCIA_STT)
+    return escribir_wav(float_a_pcm16(muestras), 1, 2, FRECUENCIA_STT)
+
+
+def _normalizar_audio_temporal(audio: AudioTemporal) -> AudioTemporal:
+    """
+    normalizar_audio sin cargar el audio: ffmpeg convierte a PCM por pipes,
+    la energía se mide bloque a bloque y el WAV recortado se copia por bloques
+    """
+    pcm = None
+    try:
+        params, inicio, fin = leer_cabecera_wav(audio) if es_wav(audio) else (None, 0, 0)
+        if params and (params.nchannels, params.sampwidth, params.framerate) == (1, 2, FRECUENCIA_STT):
+            pcm = audio
+        elif shutil.which("ffmpeg") is None:
+            # Sin ffmpeg solo se pueden convertir los WAV, y en memoria
+            return AudioTemporal.desde_bytes(_normalizar_bytes(audio.leer()), audio.nombre)
+        else:
+            pcm = _ffmpeg_por_bloques(audio, ["-ac", "1", "-ar", str(FRECUENCIA_STT),
+                                              "-acodec", "pcm_s16le", "-f", "s16le"])
+            inicio, fin = 0, len(pcm)
+
+        tamaño_ventana = FRECUENCIA_STT * 30 // 1000
+        energia = energia_wav_por_bloques(pcm, inicio, fin, 2, 1, tamaño_ventana)
+        desde, hasta = limites_sin_silencio(energia, tamaño_ventana, (fin - inicio) // 2, FRECUENCIA_STT)
+    except ERRORES_WAV + (subprocess.CalledProcessError, OSError) as e:
+        # Mismos errores que _normalizar_bytes, más los de E/S del temporal
+        if pcm is not None and pcm is not audio:
+            pcm.cerrar()
+        print(f"⚠️  No se pudo normalizar el audio: {e}. Se envía sin procesar")
+        return audio
+
+    salida = AudioTemporal(audio.nombre)
+    salida.escribir(cabecera_wav((hasta - desde) * 2, 1, 2, FRECUENCIA_STT))
+    for bloque in pcm.bloques(inicio + desde * 2, inicio + hasta * 2):
+        salida.escribir(bloque)
+    if pcm is not audio:
+        pcm.cerrar()
+    return salida.terminar()
+
+
+# Se crea al importar (los hilos no arrancan hasta el primer submit): sin carreras entre sesiones
+_pool_preproceso = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="preproceso-audio")
+# Normalización en curso o terminada de cada AudioTemporal, para no cerrarlo mientras se lee
+_normalizaciones: "weakref.WeakKeyDictionary[AudioTemporal, Future]" = weakref.WeakKeyDictionary()
+
+
+def normalizar_en_segundo_plano(audio_bytes: bytes) -> Future:
+    """Encola normalizar_audio en el pool de preproceso y devuelve un Future"""
+    futuro = _pool_preproceso.submit(normalizar_audio, audio_bytes)
+    if isinstance(audio_bytes, AudioTemporal):
+        _normalizaciones[audio_bytes] = futuro
+    return futuro
+
+
+def liberar_audio(audio: AudioTemporal):
+    """
+    Cierra un audio que ya no se usa, cuando su normalización deja de leerlo
+
+    Si no se pudo normalizar, el resultado de la normalización es el propio
+    audio (y puede seguir en una caché): entonces no se cierra y lo libera el
+    recolector.
+    """
+    futuro = _normalizaciones.pop(audio, None)
+    if futuro is None:
+        audio.cerrar()
+        return
+
+    def cerrar(terminado: Future):
+        if terminado.exception() is not None or terminado.result() is not audio:
+            audio.cerrar()
+    futuro.add_done_callback(cerrar)
@@ -0,0 +1,165 @@
+import io
+import os
+import hashlib
+import tempfile
+import functools
+import threading
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from utils.metrics import metricas, BUCKETS_BYTES
+
+# Hasta este tamaño el audio se queda en memoria; por encima se vuelca a un fichero temporal
+AUDIO_MAX_MEMORIA = int(os.environ.get("AUDIO_MAX_MEMORIA", str(4 * 1024 * 1024)))
+# Directorio de los temporales (por defecto el del sistema); mejor en disco que en tmpfs
+AUDIO_TMP_DIR = os.environ.get("AUDIO_TMP_DIR") or None
+# Bloque con el que se copia, se recorre y se sube el audio
+TAMAÑO_BLOQUE_AUDIO = int(os.environ.get("AUDIO_BLOQUE_BYTES", str(256 * 1024)))
+
+
+class AudioTemporal:
+    """
+    Audio guardado en un fichero temporal en lugar de en un objeto bytes
+
+    Se escribe una sola vez por bloques, calculando la huella SHA-256 sobre la
+    marcha, y a partir de terminar() es de solo lectura. Cada etapa lo recorre
+    de bloque en bloque (bloques(), abrir()), así que un audio de cientos de MB
+    no se copia entero en memoria por cada sesión ni por cada etapa.
+
+    Los audios de hasta AUDIO_MAX_MEMORIA bytes no llegan a tocar disco.
+    Admite len() y cortes (audio[:12]) para inspeccionar la cabecera con las
+    mismas funciones que los bytes.
+    """
+
+    def __init__(self, nombre: str = "audio"):
+        self.nombre = nombre
+        self._fichero = tempfile.SpooledTemporaryFile(max_size=AUDIO_MAX_MEMORIA, dir=AUDIO_TMP_DIR)
+        self._sha256 = hashlib.sha256()
+        self._huella: Optional[str] = None
+        self._tamaño = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_fichero(cls, origen: BinaryIO, nombre: str = "audio") -> "AudioTemporal":
+        """Copia un fichero abierto (p. ej. una subida de Streamlit) bloque a bloque"""
+        return cls.desde_bloques(iter(functools.partial(origen.read, TAMAÑO_BLOQUE_AUDIO), b""), nombre)
+
+    @classmethod
+    def desde_bytes(cls, datos: bytes, nombre: str = "audio") -> "AudioTemporal":
+        return cls.desde_bloques([datos], nombre)
+
+    @classmethod
+    def desde_bloques(cls, bloques: Iterable[bytes], nombre: str = "audio") -> "AudioTemporal":
+        audio = cls(nombre)
+        try:
+            for bloque in bloques:
+                audio.escribir(bloque)
+        except BaseException:
+            audio.cerrar()
+            raise
+        return audio.terminar()
+
+    def escribir(self, bloque: bytes):
+        if self._huella is not None:
+            raise ValueError("El audio ya está terminado y es de solo lectura")
+        self._fichero.write(bloque)
+        self._sha256.update(bloque)
+        self._tamaño += len(bloque)
+
+    def terminar(self) -> "AudioTemporal":
+        """Cierra la escritura; desde aquí el contenido no cambia"""
+        if self._huella is None:
+            self._huella = self._sha256.hexdigest()
+            metricas.observar("audio_temporal_bytes", self._tamaño, buckets=BUCKETS_BYTES,
+                              almacen="disco" if self.en_disco else "memoria")
+        return self
+
+    @property
+    def huella(self) -> str:
+        """SHA-256 del contenido: identifica el audio en cachés sin volver a leerlo"""
+        if self._huella is None:
+            raise ValueError("El audio aún se está escribiendo")
+        return self._huella
+
+    @property
+    def en_disco(self) -> bool:
+        return self._tamaño > AUDIO_MAX_MEMORIA
+
+    def leer(self, inicio: int = 0, fin: Optional[int] = None) -> bytes:
+        """Bytes de [inicio, fin); las lecturas de varios hilos no se pisan la posición"""
+        fin = self._tamaño if fin is None else min(fin, self._tamaño)
+        if fin <= inicio:
+            return b""
+        with self._lock:
+            self._fichero.seek(inicio)
+            return self._fichero.read(fin - inicio)
+
+    def bloques(self, inicio: int = 0, fin: Optional[int] = None,
+                tamaño_bloque: int = TAMAÑO_BLOQUE_AUDIO) -> Iterator[bytes]:
+        """Recorre [inicio, fin) en bloques de tamaño_bloque bytes"""
+        fin = self._tamaño if fin is None else min(fin, self._tamaño)
+        posicion = inicio
+        while posicion < fin:
+            bloque = self.leer(posicion, min(posicion + tamaño_bloque, fin))
+            if not bloque:
+                return
+            posicion += len(bloque)
+            yield bloque
+
+    def abrir(self) -> io.BufferedReader:
+        """Lector con su propia posición (para wave, requests...); no hace falta cerrarlo"""
+        return io.BufferedReader(_LectorAudio(self), buffer_size=TAMAÑO_BLOQUE_AUDIO)
+
+    def cerrar(self):
+        self._fichero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def __len__(self):
+        return self._tamaño
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio, fin, paso = indice.indices(self._tamaño)
+            return self.leer(inicio, fin) if paso == 1 else self.leer()[indice]
+        if indice < 0:
+            indice += self._tamaño
+        if not 0 <= indice < self._tamaño:
+            raise IndexError("Índice fuera del audio")
+        return self.leer(indice, indice + 1)[0]
+
+    def __repr__(self):
+        almacen = "disco" if self.en_disco else "memoria"
+        return f"AudioTemporal({self.nombre!r}, {self._tamaño} bytes en {almacen})"
+
+
+class _LectorAudio(io.RawIOBase):
+    """Vista de solo lectura y con posición propia sobre un AudioTemporal"""
+
+    def __init__(self, audio: AudioTemporal):
+        super().__init__()
+        self._audio = audio
+        self._posicion = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        datos = self._audio.leer(self._posicion, self._posicion + len(buffer))
+        buffer[:len(datos)] = datos
+        self._posicion += len(datos)
+        return len(datos)
+
+    def seek(self, desplazamiento, desde=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._posicion, io.SEEK_END: len(self._audio)}[desde]
+        self._posicion = max(0, base + desplazamiento)
+        return self._posicion
+
+    def tell(self):
+        return self._posicion
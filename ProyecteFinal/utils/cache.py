@@ -0,0 +1,337 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import asyncio
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from utils.audio_temporal import AudioTemporal
+from utils.coalescencia import vuelos
+from utils.metrics import metricas
+
+# Configuración por variables de entorno
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")  # sqlite | memoria | ninguno
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(".cache", "traductor_cache.sqlite"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_TTL = int(os.environ.get("CACHE_TTL", str(7 * 24 * 3600)))
+# Cada cuántas escrituras se borran los caducados y se recalcula el tamaño (con varios procesos)
+CACHE_EXPULSION_CADA = int(os.environ.get("CACHE_EXPULSION_CADA", "100"))
+
+_NO_ENCONTRADO = object()
+
+
+def clave_cache(espacio: str, *partes) -> str:
+    """
+    Genera una clave SHA-256 a partir del contenido (bytes de audio, texto, idioma, voz...)
+
+    El audio entra por su SHA-256: un AudioTemporal por su huella, calculada al
+    escribirlo sin releer el audio, y unos bytes por el mismo digest, de modo
+    que el mismo audio da la misma clave llegue por una vía o por la otra.
+    """
+    h = hashlib.sha256(espacio.encode("utf-8"))
+    for parte in partes:
+        if isinstance(parte, (bytes, bytearray, memoryview)):
+            datos = hashlib.sha256(parte).hexdigest().encode("ascii")
+        elif isinstance(parte, AudioTemporal):
+            datos = parte.huella.encode("ascii")
+        else:
+            datos = repr(parte).encode("utf-8")
+        # Prefijo con la longitud para que ("ab", "c") y ("a", "bc") no colisionen
+        h.update(len(datos).to_bytes(8, "big"))
+        h.update(datos)
+    return h.hexdigest()
+
+
+class CacheBackend:
+    """Interfaz común de los backends de caché"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave: str, default=None):
+        raise NotImplementedError
+
+    def set(self, clave: str, valor: Any, ttl: Optional[int] = None):
+        raise NotImplementedError
+
+    def estadisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+
+class SinCache(CacheBackend):
+    """Backend nulo: nunca guarda nada"""
+
+    def get(self, clave, default=None):
+        self.misses += 1
+        return default
+
+    def set(self, clave, valor, ttl=None):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """Caché LRU en memoria acotada por tamaño en bytes y con TTL"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: int = CACHE_TTL):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()  # clave -> (expira, tamaño, blob)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.time():
+                if entrada is not None:
+                    self._eliminar(clave)
+                self.misses += 1
+                return default
+            self._datos.move_to_end(clave)
+            self.hits += 1
+        return pickle.loads(entrada[2])
+
+    def set(self, clave, valor, ttl=None):
+        blob = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._datos:
+                self._eliminar(clave)
+            self._datos[clave] = (time.time() + (ttl or self.ttl), len(blob), blob)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes:
+                self._eliminar(next(iter(self._datos)))
+
+    def _eliminar(self, clave):
+        _, tamaño, _ = self._datos.pop(clave)
+        self._bytes -= tamaño
+
+    def estadisticas(self):
+        stats = super().estadisticas()
+        stats.update({"entradas": len(self._datos), "bytes": self._bytes})
+        return stats
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Caché persistente en SQLite, compartible entre procesos y réplicas
+
+    Sobrevive a reinicios y, montando el fichero en un volumen común, se
+    comparte entre contenedores. La expulsión es LRU por último acceso.
+
+    El tamaño total se lleva en memoria, de modo que un set no recorre la
+    tabla: solo se expulsa al superar max_bytes o cada CACHE_EXPULSION_CADA
+    escrituras, y entonces se vuelve a sumar desde SQLite para contar lo que
+    hayan escrito otros procesos.
+    """
+
+    def __init__(self, ruta: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES, ttl: int = CACHE_TTL):
+        super().__init__()
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                clave TEXT PRIMARY KEY,
+                valor BLOB NOT NULL,
+                tamaño INTEGER NOT NULL,
+                expira REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_acceso ON cache (ultimo_acceso)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expira ON cache (expira)")
+        self._bytes = self._sumar_tamaño()
+        self._escrituras = 0
+
+    def get(self, clave, default=None):
+        ahora = time.time()
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT valor, expira, tamaño FROM cache WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None or fila[1] < ahora:
+                if fila is not None:
+                    borradas = self._conn.execute("DELETE FROM cache WHERE clave = ?", (clave,)).rowcount
+                    # Otro proceso pudo borrarla antes: solo se descuenta lo que se borra aquí
+                    self._bytes -= fila[2] if borradas else 0
+                self.misses += 1
+                return default
+            self._conn.execute("UPDATE cache SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+            self.hits += 1
+        return pickle.loads(fila[0])
+
+    def set(self, clave, valor, ttl=None):
+        blob = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        ahora = time.time()
+        with self._lock:
+            anterior = self._conn.execute("SELECT tamaño FROM cache WHERE clave = ?", (clave,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (clave, valor, tamaño, expira, ultimo_acceso) VALUES (?, ?, ?, ?, ?)",
+                (clave, sqlite3.Binary(blob), len(blob), ahora + (ttl or self.ttl), ahora)
+            )
+            self._bytes += len(blob) - (anterior[0] if anterior else 0)
+            self._escrituras += 1
+            if self._bytes > self.max_bytes or self._escrituras >= CACHE_EXPULSION_CADA:
+                self._expulsar(ahora)
+
+    def _sumar_tamaño(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(tamaño), 0) FROM cache").fetchone()[0]
+
+    def _expulsar(self, ahora):
+        """Elimina caducados y, si se supera el tamaño máximo, los menos usados"""
+        self._escrituras = 0
+        self._conn.execute("DELETE FROM cache WHERE expira < ?", (ahora,))
+        self._bytes = self._sumar_tamaño()
+        if self._bytes <= self.max_bytes:
+            return
+        sobrante = self._bytes - self.max_bytes
+        liberado = 0
+        claves = []
+        for clave, tamaño in self._conn.execute("SELECT clave, tamaño FROM cache ORDER BY ultimo_acceso"):
+            claves.append((clave,))
+            liberado += tamaño
+            if liberado >= sobrante:
+                break
+        self._conn.executemany("DELETE FROM cache WHERE clave = ?", claves)
+        self._bytes -= liberado
+
+    def estadisticas(self):
+        stats = super().estadisticas()
+        with self._lock:
+            entradas, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamaño), 0) FROM cache"
+            ).fetchone()
+        stats.update({"entradas": entradas, "bytes": total})
+        return stats
+
+
+_cache_global: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache() -> CacheBackend:
+    """Devuelve el backend de caché del proceso según CACHE_BACKEND"""
+    global _cache_global
+    if _cache_global is None:
+        with _cache_lock:
+            if _cache_global is None:
+                if CACHE_BACKEND == "memoria":
+                    _cache_global = MemoryCache()
+                elif CACHE_BACKEND == "ninguno":
+                    _cache_global = SinCache()
+                else:
+                    _cache_global = SQLiteCache()
+    return _cache_global
+
+
+def configurar_cache(backend: CacheBackend):
+    """Sustituye el backend global (p. ej. en workers o pruebas)"""
+    global _cache_global
+    _cache_global = backend
+
+
+def _resultado_valido(resultado) -> bool:
+    """No se cachean errores: None, (None, 0) ni textos 'Error...'"""
+    if resultado is None:
+        return False
+    if isinstance(resultado, str) and resultado.startswith("Error"):
+        return False
+    if isinstance(resultado, tuple) and resultado and resultado[0] is None:
+        return False
+    return True
+
+
+def cache_persistente(espacio: str, ttl: Optional[int] = None,
+                      cachear_si: Callable[[Any], bool] = _resultado_valido):
+    """
+    Decorador para métodos de servicio: cachea el resultado por contenido
+
+    La clave se calcula con los argumentos (sin self) en el orden de la firma,
+    así que da igual pasarlos por posición o por nombre, y la versión síncrona
+    y la asíncrona de un mismo método comparten entradas si usan el mismo
+    espacio y los mismos nombres de parámetro.
+
+    Si llegan llamadas idénticas mientras la primera sigue en curso, esperan
+    su resultado (o su error) en lugar de repetir la petición (single-flight).
+    """
+    def decorador(func):
+        # Clave de vuelo por función: un método que llama a otro del mismo
+        # espacio con los mismos argumentos no debe esperarse a sí mismo
+        prefijo_vuelo = f"{func.__module__}.{func.__qualname__}:"
+        firma = inspect.signature(func)
+
+        def clave_argumentos(self, args, kwargs):
+            enlazados = firma.bind(self, *args, **kwargs)
+            enlazados.apply_defaults()
+            return clave_cache(espacio, *list(enlazados.arguments.values())[1:])
+
+        if asyncio.iscoroutinefunction(func):
+            async def calcular_async(self, cache, clave, *args, **kwargs):
+                # Otro líder pudo terminar entre el fallo de caché y este punto
+                valor = cache.get(clave, _NO_ENCONTRADO)
+                if valor is not _NO_ENCONTRADO:
+                    return valor
+                valor = await func(self, *args, **kwargs)
+                if cachear_si(valor):
+                    cache.set(clave, valor, ttl)
+                return valor
+
+            @functools.wraps(func)
+            async def envoltorio_async(self, *args, **kwargs):
+                cache = obtener_cache()
+                clave = clave_argumentos(self, args, kwargs)
+                valor = cache.get(clave, _NO_ENCONTRADO)
+                if valor is not _NO_ENCONTRADO:
+                    metricas.incrementar("cache_consultas_total", espacio=espacio, resultado="hit")
+                    return valor
+                metricas.incrementar("cache_consultas_total", espacio=espacio, resultado="miss")
+                return await vuelos.ejecutar_async(
+                    prefijo_vuelo + clave, espacio, calcular_async, self, cache, clave, *args, **kwargs
+                )
+            return envoltorio_async
+
+        def calcular(self, cache, clave, *args, **kwargs):
+            valor = cache.get(clave, _NO_ENCONTRADO)
+            if valor is not _NO_ENCONTRADO:
+                return valor
+            valor = func(self, *args, **kwargs)
+            if cachear_si(valor):
+                cache.set(clave, valor, ttl)
+            return valor
+
+        @functools.wraps(func)
+        def envoltorio(self, *args, **kwargs):
+            cache = obtener_cache()
+            clave = clave_argumentos(self, args, kwargs)
+            valor = cache.get(clave, _NO_ENCONTRADO)
+            if valor is not _NO_ENCONTRADO:
+                metricas.incrementar("cache_consultas_total", espacio=espacio, resultado="hit")
+                return valor
+            metricas.incrementar("cache_consultas_total", espacio=espacio, resultado="miss")
+            return vuelos.ejecutar(prefijo_vuelo + clave, espacio, calcular, self, cache, clave, *args, **kwargs)
+        return envoltorio
+    return decorador
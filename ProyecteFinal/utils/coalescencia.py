@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+from utils.metrics import metricas
+
+
+class _LiderInterrumpido(Exception):
+    """El líder se canceló o se interrumpió sin resultado: quien espera vuelve a intentarlo"""
+
+
+class GrupoVuelos:
+    """
+    Coalescencia de peticiones idénticas en vuelo (single-flight)
+
+    La primera llamada con una clave (líder) hace el trabajo; las que llegan
+    con la misma clave mientras tanto esperan su resultado, o su excepción,
+    en lugar de lanzar otra petición. Sirve tanto para hilos como para
+    corrutinas de distintos event loops, porque el punto de encuentro es un
+    concurrent.futures.Future.
+
+    Solo se comparten las excepciones normales. Si el líder se cancela
+    (CancelledError) o se interrumpe con otra BaseException, eso es asunto
+    suyo: la clave se libera y el primer seguidor que vuelve se convierte en
+    el nuevo líder y repite la llamada.
+    """
+
+    def __init__(self):
+        self._en_vuelo: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def unirse(self, clave: str) -> Tuple[Future, bool]:
+        """Devuelve el Future de la clave y si quien llama es el líder"""
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            if futuro is not None:
+                return futuro, False
+            futuro = self._en_vuelo[clave] = Future()
+            return futuro, True
+
+    def terminar(self, clave: str, futuro: Future, valor=None, error: BaseException = None):
+        """El líder publica el resultado (o el error) a todos los que esperan"""
+        with self._lock:
+            self._en_vuelo.pop(clave, None)
+        if error is not None:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(valor)
+
+    def ejecutar(self, clave: str, espacio: str, func, *args, **kwargs):
+        while True:
+            futuro, lider = self.unirse(clave)
+            if lider:
+                break
+            metricas.incrementar("coalescencia_total", espacio=espacio, resultado="compartido")
+            try:
+                return futuro.result()
+            except _LiderInterrumpido:
+                metricas.incrementar("coalescencia_total", espacio=espacio, resultado="reintento")
+
+        metricas.incrementar("coalescencia_total", espacio=espacio, resultado="lider")
+        try:
+            valor = func(*args, **kwargs)
+        except Exception as e:
+            self.terminar(clave, futuro, error=e)
+            raise
+        except BaseException:
+            self.terminar(clave, futuro, error=_LiderInterrumpido())
+            raise
+        self.terminar(clave, futuro, valor)
+        return valor
+
+    async def ejecutar_async(self, clave: str, espacio: str, func, *args, **kwargs):
+        while True:
+            futuro, lider = self.unirse(clave)
+            if lider:
+                break
+            metricas.incrementar("coalescencia_total", espacio=espacio, resultado="compartido")
+            try:
+                # shield: si se cancela quien espera, no se cancela el resultado compartido
+                return await asyncio.shield(asyncio.wrap_future(futuro))
+            except _LiderInterrumpido:
+                metricas.incrementar("coalescencia_total", espacio=espacio, resultado="reintento")
+
+        metricas.incrementar("coalescencia_total", espacio=espacio, resultado="lider")
+        try:
+            valor = await func(*args, **kwargs)
+        except Exception as e:
+            self.terminar(clave, futuro, error=e)
+            raise
+        except BaseException:
+            self.terminar(clave, futuro, error=_LiderInterrumpido())
+            raise
+        self.terminar(clave, futuro, valor)
+        return valor
+
+    def en_vuelo(self) -> int:
+        with self._lock:
+            return len(self._en_vuelo)
+
+
+# Grupo global del proceso (lo usa cache_persistente)
+vuelos = GrupoVuelos()
@@ -0,0 +1,28 @@
+import os
+from typing import Callable, List, Optional
+
+# Fuentes de configuración adicionales a las variables de entorno. El núcleo
+# no depende de Streamlit: la interfaz registra st.secrets al arrancar.
+_fuentes: List[Callable[[str], Optional[str]]] = []
+
+
+def registrar_fuente_config(fuente: Callable[[str], Optional[str]]):
+    """Añade una fuente de claves que se consulta después de las variables de entorno"""
+    if fuente not in _fuentes:
+        _fuentes.append(fuente)
+
+
+def obtener_config(nombre: str, default: Optional[str] = None) -> Optional[str]:
+    """Lee una clave de configuración: entorno primero, luego las fuentes registradas"""
+    valor = os.environ.get(nombre)
+    if valor:
+        return valor
+    for fuente in _fuentes:
+        try:
+            valor = fuente(nombre)
+        except Exception:
+            # p. ej. st.secrets sin secrets.toml
+            valor = None
+        if valor:
+            return valor
+    return default
@@ -1,17 +1,111 @@
+import os
 import time
+import random
+import asyncio
+import threading
+import functools
 import requests
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from utils.audio_temporal import AudioTemporal
+from utils.metrics import metricas, BUCKETS_BYTES
+from utils.rate_limit import leer_retry_after, obtener_circuito, obtener_limitador
+
+# Hilos para las peticiones asíncronas. El executor por defecto de asyncio
+# (cpu_count + 4 hilos) limitaba las peticiones en vuelo en máquinas pequeñas.
+HTTP_MAX_HILOS = int(os.environ.get("HTTP_MAX_HILOS", "64"))
+
+# Tamaño del pool por host (configurable por variables de entorno). Nunca por
+# debajo de HTTP_MAX_HILOS: con pool_block=False las conexiones que no caben en
+# el pool se cierran al terminar y cada hilo de más pagaría un handshake nuevo.
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = max(int(os.environ.get("HTTP_POOL_MAXSIZE", "0")), HTTP_MAX_HILOS)
+
+_executor_http = ThreadPoolExecutor(max_workers=HTTP_MAX_HILOS, thread_name_prefix="http")
+
+# Sesiones compartidas por todo el proceso, una por configuración de pool
+_sesiones: Dict[Tuple[int, int], requests.Session] = {}
+_sesiones_lock = threading.Lock()
+
+
+def obtener_sesion(pool_connections: int = POOL_CONNECTIONS,
+                   pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+    """
+    Devuelve la sesión HTTP compartida del proceso (keep-alive + pool de conexiones)
+
+    Todas las instancias de HTTPClient con la misma configuración reutilizan
+    las mismas conexiones TCP/TLS, evitando un handshake por petición.
+    """
+    clave = (pool_connections, pool_maxsize)
+    sesion = _sesiones.get(clave)
+    if sesion is not None:
+        return sesion
+
+    with _sesiones_lock:
+        sesion = _sesiones.get(clave)
+        if sesion is None:
+            sesion = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,  # hosts distintos en caché
+                pool_maxsize=pool_maxsize,          # conexiones vivas por host
+                pool_block=False
+            )
+            sesion.mount("https://", adapter)
+            sesion.mount("http://", adapter)
+            sesion.headers.update({"Connection": "keep-alive"})
+            _sesiones[clave] = sesion
+    return sesion
+
+
+def nombre_endpoint(url: str) -> str:
+    """Etiqueta corta del servicio destino para las métricas"""
+    partes = urlparse(url)
+    host = partes.hostname or ""
+    if ".stt." in host:
+        return "stt"
+    if ".tts." in host:
+        return "tts"
+    if "translator" in host:
+        return "translator"
+    # Endpoints personalizados (p. ej. el servidor simulado de benchmarks): por ruta
+    if partes.path.startswith("/speech/recognition"):
+        return "stt"
+    if partes.path == "/cognitiveservices/v1":
+        return "tts"
+    if partes.path in ("/translate", "/detect"):
+        return "translator"
+    return host
+
+
+def cerrar_sesiones():
+    """Cierra todas las sesiones compartidas (útil al apagar workers)"""
+    with _sesiones_lock:
+        for sesion in _sesiones.values():
+            sesion.close()
+        _sesiones.clear()
+
 
 class HTTPClient:
-    """Cliente HTTP robusto con reintentos y backoff exponencial"""
+    """
+    Cliente HTTP robusto con reintentos, backoff exponencial y conexiones reutilizables
+
+    Todas las instancias comparten, por endpoint (STT, TTS, Translator), un
+    limitador de tasa adaptativo y un circuit breaker, de modo que las sesiones
+    concurrentes no martillean el servicio al unísono cuando éste limita.
+    """
     
-    def __init__(self, max_retries: int = 3, base_backoff: float = 1.5, timeout: int = 30):
+    def __init__(self, max_retries: int = 3, base_backoff: float = 1.5, timeout: int = 30,
+                 pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE):
         self.max_retries = max_retries
         self.base_backoff = base_backoff
         self.timeout = timeout
+        self.session = obtener_sesion(pool_connections, pool_maxsize)
     
     def post_with_retry(self, url: str, *, headers=None, params=None, data=None, json=None, 
-                       retry_on: Tuple[int, ...] = (429, 500, 502, 503, 504)) -> Optional[requests.Response]:
+                       retry_on: Tuple[int, ...] = (429, 500, 502, 503, 504),
+                       deadline: Optional[float] = None) -> Optional[requests.Response]:
         """
         Realiza petición POST con reintentos automáticos
         
@@ -19,48 +113,211 @@ class HTTPClient:
             url: URL destino
             headers: Headers de la petición
             params: Parámetros URL
-            data: Datos del cuerpo
+            data: Datos del cuerpo (un AudioTemporal se envía por bloques desde su fichero)
             json: Datos JSON
             retry_on: Códigos de estado para reintentar
+            deadline: Tiempo total máximo en segundos (incluidas esperas), None sin límite
             
         Returns:
             Response object o None si falla después de todos los reintentos
         """
         last_response = None
+        endpoint = nombre_endpoint(url)
+        limite = time.monotonic() + deadline if deadline else None
         
-        for attempt in range(self.max_retries):
-            try:
-                response = requests.post(
-                    url, 
-                    headers=headers, 
-                    params=params, 
-                    data=data, 
-                    json=json, 
-                    timeout=self.timeout
-                )
-                
-                # Éxito - no reintentar
-                if response.status_code < 400:
-                    return response
+        with metricas.medir("http_peticion_segundos", endpoint=endpoint):
+            for attempt in range(self.max_retries):
+                espera, prueba = self._espera_antes_de_intento(endpoint, limite)
+                if espera is None:
+                    break
+                try:
+                    time.sleep(espera)
+                    last_response, terminado = self._intento(
+                        url, attempt, retry_on, timeout=self._timeout_restante(limite),
+                        headers=headers, params=params, data=data, json=json
+                    )
+                finally:
+                    self._liberar_prueba(endpoint, prueba)
+                if terminado:
+                    return last_response
                 
-                # Error del cliente (excepto 429) - no reintentar
-                if 400 <= response.status_code < 500 and response.status_code != 429:
-                    return response
+                # Backoff exponencial con jitter, o lo que indique Retry-After
+                if attempt == self.max_retries - 1:
+                    break
+                espera = self._espera_reintento(attempt, last_response, limite)
+                if espera is None:
+                    break
+                metricas.incrementar("http_reintentos_total", endpoint=endpoint)
+                time.sleep(espera)
+        
+        metricas.incrementar("http_agotados_total", endpoint=endpoint)
+        print(f"❌ Todos los {self.max_retries} reintentos fallaron")
+        return last_response
+    
+    async def post_with_retry_async(self, url: str, *, headers=None, params=None, data=None, json=None,
+                                    retry_on: Tuple[int, ...] = (429, 500, 502, 503, 504),
+                                    deadline: Optional[float] = None) -> Optional[requests.Response]:
+        """
+        Versión asíncrona de post_with_retry
+        
+        Cada intento se ejecuta en un hilo sobre la sesión compartida y las
+        esperas de backoff no bloquean el event loop, de modo que un mismo
+        proceso puede mantener muchas peticiones en vuelo.
+        """
+        last_response = None
+        endpoint = nombre_endpoint(url)
+        limite = time.monotonic() + deadline if deadline else None
+        
+        with metricas.medir("http_peticion_segundos", endpoint=endpoint):
+            for attempt in range(self.max_retries):
+                espera, prueba = self._espera_antes_de_intento(endpoint, limite)
+                if espera is None:
+                    break
+                try:
+                    await asyncio.sleep(espera)
+                    last_response, terminado = await asyncio.get_running_loop().run_in_executor(
+                        _executor_http, functools.partial(
+                            self._intento, url, attempt, retry_on, timeout=self._timeout_restante(limite),
+                            headers=headers, params=params, data=data, json=json
+                        )
+                    )
+                finally:
+                    self._liberar_prueba(endpoint, prueba)
+                if terminado:
+                    return last_response
                 
-                # Error del servidor o 429 - reintentar
-                if response.status_code in retry_on:
-                    last_response = response
-                    print(f"⚠️  Intento {attempt + 1}/{self.max_retries} falló con código {response.status_code}. Reintentando...")
-                else:
-                    return response
-                    
-            except requests.RequestException as e:
-                last_response = e
-                print(f"⚠️  Intento {attempt + 1}/{self.max_retries} falló con excepción: {e}. Reintentando...")
-            
-            # Backoff exponencial: 1.5^0=1s, 1.5^1=1.5s, 1.5^2=2.25s...
-            wait_time = self.base_backoff ** attempt
-            time.sleep(wait_time)
+                if attempt == self.max_retries - 1:
+                    break
+                espera = self._espera_reintento(attempt, last_response, limite)
+                if espera is None:
+                    break
+                metricas.incrementar("http_reintentos_total", endpoint=endpoint)
+                await asyncio.sleep(espera)
         
+        metricas.incrementar("http_agotados_total", endpoint=endpoint)
         print(f"❌ Todos los {self.max_retries} reintentos fallaron")
-        return last_response
\ No newline at end of file
+        return last_response
+    
+    def _espera_antes_de_intento(self, endpoint: str, limite: Optional[float]) -> Tuple[Optional[float], int]:
+        """
+        Consulta el circuit breaker y reserva un token del limitador
+        
+        Devuelve (segundos a esperar, id de prueba del circuito semiabierto o 0).
+        Los segundos son None si no se debe intentar (circuito abierto o el
+        deadline no da para esperar el turno); en ese caso la prueba ya está liberada.
+        """
+        prueba = obtener_circuito(endpoint).solicitar()
+        if prueba is None:
+            metricas.incrementar("http_circuito_abierto_total", endpoint=endpoint)
+            print(f"🔌 Circuito abierto para {endpoint}: se omite la petición")
+            return None, 0
+        
+        try:
+            limitador = obtener_limitador(endpoint)
+            espera = limitador.reservar()
+            if limite is not None and time.monotonic() + espera >= limite:
+                limitador.devolver()
+                self._liberar_prueba(endpoint, prueba)
+                return None, 0
+        except BaseException:
+            self._liberar_prueba(endpoint, prueba)
+            raise
+        if espera > 0:
+            metricas.observar("http_espera_limitador_segundos", espera, endpoint=endpoint)
+        return espera, prueba
+    
+    @staticmethod
+    def _liberar_prueba(endpoint: str, prueba: int):
+        """
+        Libera la prueba del circuito semiabierto si el intento acabó sin veredicto
+        
+        Un 429, un deadline agotado o una excepción no cierran ni reabren el
+        circuito; sin liberarla, ninguna otra petición volvería a probar.
+        """
+        if prueba:
+            obtener_circuito(endpoint).liberar_prueba(prueba)
+    
+    def _espera_reintento(self, attempt: int, response, limite: Optional[float]) -> Optional[float]:
+        """Tiempo hasta el siguiente intento, o None si supera el deadline"""
+        retry_after = leer_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        if retry_after is not None:
+            espera = retry_after
+        else:
+            # Backoff exponencial: 1.5^0=1s, 1.5^1=1.5s, 1.5^2=2.25s... con jitter del 50%
+            base = self.base_backoff ** attempt
+            espera = base / 2 + random.uniform(0, base / 2)
+        
+        if limite is not None and time.monotonic() + espera >= limite:
+            return None
+        return espera
+    
+    def _timeout_restante(self, limite: Optional[float]) -> float:
+        if limite is None:
+            return self.timeout
+        return max(0.1, min(self.timeout, limite - time.monotonic()))
+    
+    def _intento(self, url: str, attempt: int, retry_on: Tuple[int, ...], *, timeout: Optional[float] = None,
+                 headers=None, params=None, data=None, json=None):
+        """Ejecuta un único intento. Devuelve (respuesta, terminado)"""
+        endpoint = nombre_endpoint(url)
+        if isinstance(data, (bytes, bytearray, AudioTemporal)):
+            metricas.observar("http_peticion_bytes", len(data), buckets=BUCKETS_BYTES, endpoint=endpoint)
+        if isinstance(data, AudioTemporal):
+            # Un lector nuevo por intento: cada reintento vuelve a enviar desde el principio
+            data = data.abrir()
+        
+        inicio = time.perf_counter()
+        try:
+            response = self.session.post(
+                url, 
+                headers=headers, 
+                params=params, 
+                data=data, 
+                json=json, 
+                timeout=timeout or self.timeout
+            )
+            
+            metricas.observar("http_intento_segundos", time.perf_counter() - inicio,
+                              endpoint=endpoint, codigo=response.status_code)
+            metricas.observar("http_respuesta_bytes", len(response.content), buckets=BUCKETS_BYTES,
+                              endpoint=endpoint)
+            self._registrar_resultado(endpoint, response)
+            
+            # Éxito - no reintentar
+            if response.status_code < 400:
+                return response, True
+            
+            # Error del cliente (excepto 429) - no reintentar
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                return response, True
+            
+            # Error del servidor o 429 - reintentar
+            if response.status_code in retry_on:
+                print(f"⚠️  Intento {attempt + 1}/{self.max_retries} falló con código {response.status_code}. Reintentando...")
+                return response, False
+            return response, True
+                
+        except requests.RequestException as e:
+            metricas.observar("http_intento_segundos", time.perf_counter() - inicio,
+                              endpoint=endpoint, codigo=type(e).__name__)
+            self._registrar_resultado(endpoint, None)
+            print(f"⚠️  Intento {attempt + 1}/{self.max_retries} falló con excepción: {e}. Reintentando...")
+            return None, False
+    
+    @staticmethod
+    def _registrar_resultado(endpoint: str, response):
+        """Actualiza el limitador y el circuit breaker compartidos del endpoint"""
+        circuito = obtener_circuito(endpoint)
+        limitador = obtener_limitador(endpoint)
+        
+        if response is None or response.status_code >= 500:
+            circuito.fallo()
+        elif response.status_code == 429:
+            # Throttling: reducir la tasa de todo el proceso y respetar Retry-After
+            limitador.penalizar()
+            retry_after = leer_retry_after(response.headers.get("Retry-After"))
+            if retry_after:
+                limitador.pausar(retry_after)
+        else:
+            circuito.exito()
+            limitador.recompensar()
\ No newline at end of file
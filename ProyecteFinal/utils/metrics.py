@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import asyncio
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# Límites superiores de los buckets (segundos y bytes)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_BYTES = tuple(2 ** n for n in range(8, 30, 2))  # 256 B ... 256 MB
+
+# Interfaz del servidor de métricas: solo local salvo que se pida otra (p. ej. 0.0.0.0)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos (formato Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.conteos = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.conteos[bisect.bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def percentil(self, p: float) -> Optional[float]:
+        """Estimación del percentil interpolando linealmente dentro del bucket"""
+        if self.total == 0:
+            return None
+        objetivo = p * self.total
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            if acumulado + conteo >= objetivo and conteo:
+                inferior = self.buckets[i - 1] if i > 0 else 0.0
+                superior = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return inferior + (superior - inferior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+        return self.buckets[-1]
+
+
+class RegistroMetricas:
+    """Registro de contadores e histogramas con etiquetas, seguro entre hilos"""
+
+    def __init__(self):
+        self._contadores: Dict[Tuple[str, tuple], float] = {}
+        self._histogramas: Dict[Tuple[str, tuple], Histograma] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        clave = (nombre, _normalizar_etiquetas(etiquetas))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre: str, valor: float, buckets=BUCKETS_LATENCIA, **etiquetas):
+        clave = (nombre, _normalizar_etiquetas(etiquetas))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = Histograma(buckets)
+            histograma.observar(valor)
+
+    @contextmanager
+    def medir(self, nombre: str, **etiquetas):
+        """Mide la duración de un bloque en segundos"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def snapshot(self) -> dict:
+        """Instantánea en formato JSON con percentiles estimados"""
+        with self._lock:
+            contadores = [
+                {"nombre": nombre, "etiquetas": dict(etiquetas), "valor": valor}
+                for (nombre, etiquetas), valor in sorted(self._contadores.items())
+            ]
+            histogramas = [
+                {
+                    "nombre": nombre,
+                    "etiquetas": dict(etiquetas),
+                    "total": h.total,
+                    "suma": h.suma,
+                    "p50": h.percentil(0.50),
+                    "p95": h.percentil(0.95),
+                    "p99": h.percentil(0.99)
+                }
+                for (nombre, etiquetas), h in sorted(self._histogramas.items())
+            ]
+        return {"contadores": contadores, "histogramas": histogramas}
+
+    def exportar_prometheus(self) -> str:
+        """Exposición en formato de texto de Prometheus"""
+        lineas = []
+        with self._lock:
+            anterior = None
+            for (nombre, etiquetas), valor in sorted(self._contadores.items()):
+                if nombre != anterior:
+                    lineas.append(f"# TYPE {nombre} counter")
+                    anterior = nombre
+                lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas)} {valor}")
+            for (nombre, etiquetas), h in sorted(self._histogramas.items()):
+                if nombre != anterior:
+                    lineas.append(f"# TYPE {nombre} histogram")
+                    anterior = nombre
+                acumulado = 0
+                for limite, conteo in zip(h.buckets + ("+Inf",), h.conteos):
+                    acumulado += conteo
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas + (('le', limite),))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas)} {h.suma}")
+                lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas)} {h.total}")
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+
+def _normalizar_etiquetas(etiquetas) -> tuple:
+    return tuple(sorted((clave, str(valor)) for clave, valor in etiquetas.items()))
+
+
+def _formatear_etiquetas(etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    pares = ",".join(f'{clave}="{valor}"' for clave, valor in etiquetas)
+    return "{" + pares + "}"
+
+
+# Registro global del proceso
+metricas = RegistroMetricas()
+
+
+def cronometrar(etapa: str):
+    """Decorador: registra la latencia de una etapa en etapa_segundos{etapa=...}"""
+    def decorador(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def envoltorio_async(*args, **kwargs):
+                with metricas.medir("etapa_segundos", etapa=etapa):
+                    return await func(*args, **kwargs)
+            return envoltorio_async
+
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            with metricas.medir("etapa_segundos", etapa=etapa):
+                return func(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            cuerpo = json.dumps(metricas.snapshot()).encode("utf-8")
+            tipo = "application/json"
+        elif self.path.startswith("/metrics"):
+            cuerpo = metricas.exportar_prometheus().encode("utf-8")
+            tipo = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir_metricas(puerto: int, host: Optional[str] = None) -> ThreadingHTTPServer:
+    """
+    Expone /metrics (Prometheus) y /metrics.json en un hilo aparte
+
+    Por defecto escucha en METRICS_HOST (127.0.0.1): para que un Prometheus
+    de otra máquina o contenedor lo lea hay que abrirlo expresamente.
+    """
+    servidor = ThreadingHTTPServer((host or METRICS_HOST, puerto), _ManejadorMetricas)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="servidor-metricas").start()
+    return servidor
@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Peticiones por segundo permitidas por endpoint (configurables por entorno)
+TASAS_POR_DEFECTO = {
+    "stt": float(os.environ.get("RATE_LIMIT_STT", "20")),
+    "tts": float(os.environ.get("RATE_LIMIT_TTS", "20")),
+    "translator": float(os.environ.get("RATE_LIMIT_TRANSLATOR", "50"))
+}
+TASA_GENERICA = 50.0
+
+UMBRAL_FALLOS_CIRCUITO = int(os.environ.get("CIRCUIT_FAILURES", "5"))
+TIEMPO_APERTURA_CIRCUITO = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+
+
+class LimitadorTokens:
+    """
+    Token bucket adaptativo compartido por todas las sesiones del proceso
+
+    La tasa baja a la mitad con cada 429 y se recupera poco a poco con los
+    éxitos (AIMD). Un Retry-After pausa el bucket para todos los llamantes.
+    """
+
+    def __init__(self, tasa: float, capacidad: Optional[float] = None):
+        self.tasa_maxima = tasa
+        self.tasa_minima = max(tasa * 0.05, 0.1)
+        self.tasa = tasa
+        self.capacidad = capacidad or max(1.0, tasa)
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def reservar(self) -> float:
+        """Reserva un token y devuelve cuántos segundos hay que esperar para usarlo"""
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._tokens -= 1
+            espera_tokens = -self._tokens / self.tasa if self._tokens < 0 else 0.0
+            return max(espera_tokens, self._pausa_hasta - ahora)
+
+    def devolver(self):
+        """Devuelve un token reservado que no se llegó a usar"""
+        with self._lock:
+            self._tokens = min(self.capacidad, self._tokens + 1)
+
+    def pausar(self, segundos: float):
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+
+    def penalizar(self):
+        with self._lock:
+            self.tasa = max(self.tasa_minima, self.tasa / 2)
+
+    def recompensar(self):
+        with self._lock:
+            self.tasa = min(self.tasa_maxima, self.tasa + self.tasa_maxima * 0.05)
+
+
+class Circuito:
+    """
+    Circuit breaker: tras varios fallos seguidos deja de llamar al backend
+
+    Cerrado → abierto tras umbral_fallos fallos consecutivos. Pasado
+    tiempo_apertura se permite una única petición de prueba (semiabierto);
+    si sale bien se cierra, si no vuelve a abrirse. Si termina sin veredicto
+    (429, deadline, excepción) se libera con liberar_prueba para que otra
+    petición pueda volver a probar.
+    """
+
+    def __init__(self, umbral_fallos: int = UMBRAL_FALLOS_CIRCUITO,
+                 tiempo_apertura: float = TIEMPO_APERTURA_CIRCUITO):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._id_prueba = 0
+        self._lock = threading.Lock()
+
+    @property
+    def abierto(self) -> bool:
+        return self._fallos >= self.umbral_fallos
+
+    def permitir(self) -> bool:
+        return self.solicitar() is not None
+
+    def solicitar(self) -> Optional[int]:
+        """
+        None si no se permite la petición, 0 si se permite con normalidad y,
+        con el circuito semiabierto, el id (> 0) de la única prueba permitida
+        """
+        with self._lock:
+            if not self.abierto:
+                return 0
+            if time.monotonic() < self._abierto_hasta or self._prueba_en_curso:
+                return None
+            self._prueba_en_curso = True
+            self._id_prueba += 1
+            return self._id_prueba
+
+    def liberar_prueba(self, id_prueba: int):
+        """Termina la prueba sin cerrar ni reabrir el circuito (no hace nada si ya terminó)"""
+        with self._lock:
+            if self._prueba_en_curso and id_prueba == self._id_prueba:
+                self._prueba_en_curso = False
+
+    def exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self.abierto:
+                self._abierto_hasta = time.monotonic() + self.tiempo_apertura
+
+
+_limitadores: Dict[str, LimitadorTokens] = {}
+_circuitos: Dict[str, Circuito] = {}
+_registro_lock = threading.Lock()
+
+
+def obtener_limitador(endpoint: str) -> LimitadorTokens:
+    with _registro_lock:
+        if endpoint not in _limitadores:
+            _limitadores[endpoint] = LimitadorTokens(TASAS_POR_DEFECTO.get(endpoint, TASA_GENERICA))
+        return _limitadores[endpoint]
+
+
+def obtener_circuito(endpoint: str) -> Circuito:
+    with _registro_lock:
+        if endpoint not in _circuitos:
+            _circuitos[endpoint] = Circuito()
+        return _circuitos[endpoint]
+
+
+def leer_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Interpreta la cabecera Retry-After (segundos o fecha HTTP)"""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
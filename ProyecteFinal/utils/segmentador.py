@@ -0,0 +1,143 @@
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+from utils.audio import FRECUENCIA_STT, escribir_wav, pcm_a_float_mono
+
+
+class SegmentadorVoz:
+    """
+    Detector de actividad de voz incremental para audio en directo
+
+    Recibe bloques PCM 16 bits mono de cualquier tamaño y devuelve cada
+    enunciado (WAV) en cuanto termina, es decir, tras silencio_fin_ms de
+    silencio. El umbral se adapta al ruido de fondo: una ventana es voz si su
+    energía supera el piso de ruido en factor_ruido veces y el umbral absoluto.
+    El piso se aprende de los primeros calibracion_ms sea cual sea su energía
+    (con ruido por encima de umbral_db nunca habría ventanas "de silencio"),
+    baja en cuanto llega una ventana más tranquila y sube despacio.
+
+    La memoria está acotada: el prerollo guarda solo los últimos prerollo_ms
+    de silencio y un enunciado que llega a duracion_maxima se corta aunque el
+    hablante no haya hecho pausa.
+    """
+
+    def __init__(self, sample_rate: int = FRECUENCIA_STT, ventana_ms: int = 30,
+                 umbral_db: float = -45.0, factor_ruido: float = 3.0,
+                 inicio_ms: int = 90, silencio_fin_ms: int = 300, prerollo_ms: int = 200,
+                 duracion_minima: float = 0.3, duracion_maxima: float = 15.0, calibracion_ms: int = 300):
+        self.sample_rate = sample_rate
+        self.tamaño_ventana = sample_rate * ventana_ms // 1000
+        self.bytes_ventana = self.tamaño_ventana * 2
+        self.umbral = 10 ** (umbral_db / 20)
+        self.factor_ruido = factor_ruido
+        self.ventanas_inicio = max(1, inicio_ms // ventana_ms)
+        self.ventanas_fin = max(1, silencio_fin_ms // ventana_ms)
+        self.ventanas_minimas = int(duracion_minima * 1000 / ventana_ms)
+        self.ventanas_maximas = int(duracion_maxima * 1000 / ventana_ms)
+        self.ventanas_calibracion = calibracion_ms // ventana_ms
+
+        self.piso_ruido: Optional[float] = None
+        self._pendiente = bytearray()
+        self._prerollo = deque(maxlen=max(1, prerollo_ms // ventana_ms) + self.ventanas_inicio)
+        self._enunciado = bytearray()
+        self._en_voz = False
+        self._consecutivas = 0
+        self._silencio = 0
+        self._ventana_actual = 0
+        self._ventana_inicio = 0
+        self._ultima_voz = 0
+
+    @property
+    def posicion(self) -> float:
+        """Segundos de audio recibidos hasta ahora"""
+        return self._ventana_actual * self.tamaño_ventana / self.sample_rate
+
+    def añadir(self, bloque: bytes) -> List[dict]:
+        """
+        Procesa un bloque de audio y devuelve los enunciados que terminan en él
+
+        Cada enunciado es un dict con el WAV ("audio") y su "inicio" y "fin"
+        (fin de la voz, sin el silencio final) en segundos desde el comienzo.
+        """
+        self._pendiente += bloque
+        completas = len(self._pendiente) // self.bytes_ventana
+        if completas == 0:
+            return []
+
+        datos = bytes(self._pendiente[: completas * self.bytes_ventana])
+        del self._pendiente[: completas * self.bytes_ventana]
+        muestras = pcm_a_float_mono(datos, 2, 1).reshape(completas, self.tamaño_ventana)
+        energias = np.sqrt(np.mean(muestras * muestras, axis=1))
+
+        enunciados = []
+        for i, energia in enumerate(energias):
+            ventana = datos[i * self.bytes_ventana: (i + 1) * self.bytes_ventana]
+            enunciado = self._procesar_ventana(ventana, float(energia))
+            if enunciado:
+                enunciados.append(enunciado)
+        return enunciados
+
+    def terminar(self) -> List[dict]:
+        """Fin del flujo: devuelve el enunciado en curso, si lo hay"""
+        self._pendiente.clear()
+        if not self._en_voz:
+            return []
+        enunciado = self._cerrar()
+        return [enunciado] if enunciado else []
+
+    def _procesar_ventana(self, ventana: bytes, energia: float) -> Optional[dict]:
+        self._ventana_actual += 1
+        if self._ventana_actual <= self.ventanas_calibracion:
+            # Calibración: el mínimo de las primeras ventanas, aunque superen el umbral absoluto
+            self.piso_ruido = energia if self.piso_ruido is None else min(self.piso_ruido, energia)
+            self._prerollo.append(ventana)
+            return None
+        es_voz = energia > self.umbral and (self.piso_ruido is None or energia > self.piso_ruido * self.factor_ruido)
+
+        if not self._en_voz:
+            # El piso de ruido solo se actualiza fuera de la voz: baja de golpe, sube con una media móvil lenta
+            if not es_voz:
+                if self.piso_ruido is None or energia < self.piso_ruido:
+                    self.piso_ruido = energia
+                else:
+                    self.piso_ruido = 0.95 * self.piso_ruido + 0.05 * energia
+            self._prerollo.append(ventana)
+            self._consecutivas = self._consecutivas + 1 if es_voz else 0
+            if self._consecutivas >= self.ventanas_inicio:
+                self._en_voz = True
+                self._silencio = 0
+                self._ventana_inicio = self._ventana_actual - len(self._prerollo)
+                self._ultima_voz = self._ventana_actual
+                for anterior in self._prerollo:
+                    self._enunciado += anterior
+                self._prerollo.clear()
+            return None
+
+        self._enunciado += ventana
+        if es_voz:
+            self._silencio = 0
+            self._ultima_voz = self._ventana_actual
+        else:
+            self._silencio += 1
+
+        if self._silencio >= self.ventanas_fin or self._ventana_actual - self._ventana_inicio >= self.ventanas_maximas:
+            return self._cerrar()
+        return None
+
+    def _cerrar(self) -> Optional[dict]:
+        """Emite el enunciado en curso (o lo descarta si es un chasquido) y vuelve a escuchar"""
+        ventanas_voz = self._ultima_voz - self._ventana_inicio
+        audio = bytes(self._enunciado)
+        segundos = self.tamaño_ventana / self.sample_rate
+        enunciado = {
+            "audio": escribir_wav(audio, 1, 2, self.sample_rate),
+            "inicio": round(self._ventana_inicio * segundos, 3),
+            "fin": round(self._ultima_voz * segundos, 3)
+        }
+        self._enunciado = bytearray()
+        self._en_voz = False
+        self._consecutivas = 0
+        self._silencio = 0
+        return enunciado if ventanas_voz >= self.ventanas_minimas else None
@@ -0,0 +1,27 @@
+import re
+from typing import List
+
+_PALABRAS = re.compile(r"\w+")
+_PUNTUACION_FINAL = re.compile(r"[^\w\s]*$")
+
+
+def palabras(texto: str) -> List[str]:
+    """Palabras en minúsculas y en orden (con tildes y cifras; sin puntuación)"""
+    return _PALABRAS.findall(texto.lower())
+
+
+def puntuacion_final(texto: str) -> str:
+    """Signos con los que acaba el texto ("?", "...", "" si acaba en palabra)"""
+    return _PUNTUACION_FINAL.search(texto.rstrip()).group()
+
+
+def forma_canonica(texto: str) -> str:
+    """
+    Texto sin mayúsculas, espacios ni puntuación interna, pero con la final
+
+    Dos frases con la misma forma canónica solo se distinguen en comas,
+    mayúsculas o espacios. Las palabras (una negación, una cifra, una tilde)
+    y el signo final ("¿Ha llegado?" frente a "Ha llegado.") se conservan
+    porque cambian el sentido.
+    """
+    return " ".join(palabras(texto)) + puntuacion_final(texto)
@@ -0,0 +1,51 @@
+import re
+from typing import List
+
+# Fin de frase: . ! ? … y sus equivalentes japoneses, seguidos de espacio o fin de texto
+_FIN_DE_FRASE = re.compile(r"(?<=[.!?…。！？])\s+|(?<=[。！？])")
+
+
+def dividir_en_frases(texto: str) -> List[str]:
+    """Divide un texto en frases conservando la puntuación"""
+    return [frase.strip() for frase in _FIN_DE_FRASE.split(texto) if frase and frase.strip()]
+
+
+def agrupar_frases(frases: List[str], max_caracteres: int = 400, min_caracteres: int = 0) -> List[str]:
+    """
+    Agrupa frases consecutivas en bloques de como máximo max_caracteres
+
+    Una frase más larga que el máximo se corta por espacios para no superar
+    el límite de tamaño de la petición. Con min_caracteres cada bloque se
+    cierra en el primer fin de frase que alcanza ese mínimo: una frase por
+    bloque, salvo las muy cortas ("Sí."), que se juntan con la siguiente.
+    """
+    bloques = []
+    actual = ""
+    for frase in frases:
+        for trozo in _cortar_frase_larga(frase, max_caracteres):
+            if actual and len(actual) + 1 + len(trozo) > max_caracteres:
+                bloques.append(actual)
+                actual = trozo
+            else:
+                actual = f"{actual} {trozo}" if actual else trozo
+        if min_caracteres and len(actual) >= min_caracteres:
+            bloques.append(actual)
+            actual = ""
+    if actual:
+        bloques.append(actual)
+    return bloques
+
+
+def _cortar_frase_larga(frase: str, max_caracteres: int) -> List[str]:
+    if len(frase) <= max_caracteres:
+        return [frase]
+    trozos = []
+    while len(frase) > max_caracteres:
+        corte = frase.rfind(" ", 0, max_caracteres)
+        if corte <= 0:
+            corte = max_caracteres
+        trozos.append(frase[:corte].strip())
+        frase = frase[corte:].strip()
+    if frase:
+        trozos.append(frase)
+    return trozos